@@ -17,7 +17,6 @@ from keystone import exception
 from keystone.common import controller
 from keystone.common import dependency
 from keystone.contrib.oauth2 import core as oauth2_core
-from keystone.contrib.oauth2 import validator
 from keystone.i18n import _
 from keystone.openstack.common import log
 
@@ -43,8 +42,7 @@ class OAuth2(auth.AuthMethodHandler):
         uri = controller.V3Controller.base_url(context, context['path'])
         http_method = 'POST'
         required_scopes = ['all_info']
-        request_validator = validator.OAuth2Validator()
-        server = oauth2_core.Server(request_validator)
+        server = oauth2_core.get_server()
         body = {
             'access_token':access_token_id
         }
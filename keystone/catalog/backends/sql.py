@@ -18,6 +18,7 @@ import sqlalchemy
 
 from keystone import catalog
 from keystone.catalog import core
+from keystone.common import cache
 from keystone.common import sql
 from keystone import config
 from keystone import exception
@@ -25,6 +26,25 @@ from keystone import exception
 
 CONF = config.CONF
 
+# Stand-ins for the values that differ from one token to the next. They are
+# formatted into the endpoint URLs and then turned back into placeholders.
+_TOKEN_VALUES = ('tenant_id', 'user_id')
+_MARKERS = dict((name, '\x00%s\x00' % name) for name in _TOKEN_VALUES)
+
+
+def _compile_url(url, substitutions):
+    """Formats an endpoint URL with everything but the tenant and user ids.
+
+    :param dict substitutions: the configuration values and the markers
+    :returns: a format string which only takes ``tenant_id`` and ``user_id``
+    :raises: keystone.exception.MalformedEndpoint
+
+    """
+    template = core.format_url(url, substitutions).replace('%', '%%')
+    for name, marker in six.iteritems(_MARKERS):
+        template = template.replace(marker, '%%(%s)s' % name)
+    return template
+
 
 class Region(sql.ModelBase, sql.DictBase):
     __tablename__ = 'region'
@@ -192,12 +212,14 @@ class Catalog(catalog.Driver):
             ref = self._get_service(session, service_id)
             session.query(Endpoint).filter_by(service_id=service_id).delete()
             session.delete(ref)
+        self._invalidate_catalog()
 
     def create_service(self, service_id, service_ref):
         session = sql.get_session()
         with session.begin():
             service = Service.from_dict(service_ref)
             session.add(service)
+        self._invalidate_catalog()
         return service.to_dict()
 
     def update_service(self, service_id, service_ref):
@@ -211,6 +233,7 @@ class Catalog(catalog.Driver):
                 if attr != 'id':
                     setattr(ref, attr, getattr(new_service, attr))
             ref.extra = new_service.extra
+        self._invalidate_catalog()
         return ref.to_dict()
 
     # Endpoints
@@ -226,6 +249,7 @@ class Catalog(catalog.Driver):
 
         with session.begin():
             session.add(new_endpoint)
+        self._invalidate_catalog()
         return new_endpoint.to_dict()
 
     def delete_endpoint(self, endpoint_id):
@@ -233,6 +257,7 @@ class Catalog(catalog.Driver):
         with session.begin():
             ref = self._get_endpoint(session, endpoint_id)
             session.delete(ref)
+        self._invalidate_catalog()
 
     def _get_endpoint(self, session, endpoint_id):
         try:
@@ -267,46 +292,21 @@ class Catalog(catalog.Driver):
                 if attr != 'id':
                     setattr(ref, attr, getattr(new_endpoint, attr))
             ref.extra = new_endpoint.extra
+        self._invalidate_catalog()
         return ref.to_dict()
 
-    def get_catalog(self, user_id, tenant_id, metadata=None):
-        substitutions = dict(six.iteritems(CONF))
-        substitutions.update({'tenant_id': tenant_id, 'user_id': user_id})
+    @cache.on_arguments(should_cache_fn=core.SHOULD_CACHE,
+                        expiration_time=core.EXPIRATION_TIME)
+    def _get_catalog_snapshot(self):
+        """Returns the enabled services with their enabled endpoints.
 
-        session = sql.get_session()
-        t = True  # variable for singleton for PEP8, E712.
-        endpoints = (session.query(Endpoint).
-                     options(sql.joinedload(Endpoint.service)).
-                     filter(Endpoint.enabled == t).all())
-
-        catalog = {}
-
-        for endpoint in endpoints:
-            if not endpoint.service['enabled']:
-                continue
-            try:
-                url = core.format_url(endpoint['url'], substitutions)
-            except exception.MalformedEndpoint:
-                continue  # this failure is already logged in format_url()
-
-            region = endpoint['region_id']
-            service_type = endpoint.service['type']
-            default_service = {
-                'id': endpoint['id'],
-                'name': endpoint.service['name'],
-                'publicURL': ''
-            }
-            catalog.setdefault(region, {})
-            catalog[region].setdefault(service_type, default_service)
-            interface_url = '%sURL' % endpoint['interface']
-            catalog[region][service_type][interface_url] = url
+        The endpoint URLs are precompiled with :func:`_compile_url`, so that
+        building the catalog of a token only has to fill in the tenant and
+        user ids. The snapshot is cached until the catalog changes.
 
-        return catalog
-
-    def get_v3_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(six.iteritems(CONF))
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        """
+        substitutions = dict(six.iteritems(CONF))
+        substitutions.update(_MARKERS)
 
         session = sql.get_session()
         t = True  # variable for singleton for PEP8, E712.
@@ -314,25 +314,61 @@ class Catalog(catalog.Driver):
                     options(sql.joinedload(Service.endpoints)).
                     all())
 
-        def make_v3_endpoints(endpoints):
-            for endpoint in (ep.to_dict() for ep in endpoints if ep.enabled):
+        snapshot = []
+        for svc in services:
+            endpoints = []
+            for endpoint in (ep.to_dict() for ep in svc.endpoints
+                             if ep.enabled):
                 del endpoint['service_id']
                 del endpoint['legacy_endpoint_id']
                 del endpoint['enabled']
                 endpoint['region'] = endpoint['region_id']
                 try:
-                    endpoint['url'] = core.format_url(endpoint['url'], d)
+                    endpoint['url'] = _compile_url(endpoint['url'],
+                                                   substitutions)
                 except exception.MalformedEndpoint:
                     continue  # this failure is already logged in format_url()
+                endpoints.append(endpoint)
+            snapshot.append({'endpoints': endpoints, 'id': svc.id,
+                             'type': svc.type,
+                             'name': svc.extra.get('name')})
+        return snapshot
+
+    def _invalidate_catalog(self):
+        self._get_catalog_snapshot.invalidate(self)
+
+    def get_catalog(self, user_id, tenant_id, metadata=None):
+        values = {'tenant_id': tenant_id, 'user_id': user_id}
+        catalog = {}
+
+        for service in self._get_catalog_snapshot():
+            for endpoint in service['endpoints']:
+                region = endpoint['region_id']
+                default_service = {
+                    'id': endpoint['id'],
+                    'name': service['name'],
+                    'publicURL': ''
+                }
+                catalog.setdefault(region, {})
+                catalog[region].setdefault(service['type'], default_service)
+                interface_url = '%sURL' % endpoint['interface']
+                catalog[region][service['type']][interface_url] = (
+                    endpoint['url'] % values)
 
-                yield endpoint
+        return catalog
+
+    def get_v3_catalog(self, user_id, tenant_id, metadata=None):
+        values = {'tenant_id': tenant_id, 'user_id': user_id}
 
         def make_v3_service(svc):
-            eps = list(make_v3_endpoints(svc.endpoints))
-            service = {'endpoints': eps, 'id': svc.id, 'type': svc.type}
-            name = svc.extra.get('name')
-            if name:
-                service['name'] = name
+            eps = []
+            for endpoint in svc['endpoints']:
+                endpoint = endpoint.copy()
+                endpoint['url'] = endpoint['url'] % values
+                eps.append(endpoint)
+            service = {'endpoints': eps, 'id': svc['id'], 'type': svc['type']}
+            if svc['name']:
+                service['name'] = svc['name']
             return service
 
-        return [make_v3_service(svc) for svc in services]
+        return [make_v3_service(svc) for svc in self._get_catalog_snapshot()]
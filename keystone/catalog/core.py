@@ -16,6 +16,7 @@
 """Main entry point into the Catalog service."""
 
 import abc
+import uuid
 
 import six
 
@@ -138,7 +139,9 @@ class Manager(manager.Manager):
     @notifications.created(_SERVICE, public=False)
     def create_service(self, service_id, service_ref):
         service_ref.setdefault('enabled', True)
-        return self.driver.create_service(service_id, service_ref)
+        ret = self.driver.create_service(service_id, service_ref)
+        self.get_catalog_generation.invalidate(self)
+        return ret
 
     @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
                         expiration_time=EXPIRATION_TIME)
@@ -150,7 +153,9 @@ class Manager(manager.Manager):
 
     @notifications.updated(_SERVICE, public=False)
     def update_service(self, service_id, service_ref):
-        return self.driver.update_service(service_id, service_ref)
+        ret = self.driver.update_service(service_id, service_ref)
+        self.get_catalog_generation.invalidate(self)
+        return ret
 
     @notifications.deleted(_SERVICE, public=False)
     def delete_service(self, service_id):
@@ -158,6 +163,7 @@ class Manager(manager.Manager):
             endpoints = self.list_endpoints()
             ret = self.driver.delete_service(service_id)
             self.get_service.invalidate(self, service_id)
+            self.get_catalog_generation.invalidate(self)
             for endpoint in endpoints:
                 if endpoint['service_id'] == service_id:
                     self.get_endpoint.invalidate(self, endpoint['id'])
@@ -172,7 +178,9 @@ class Manager(manager.Manager):
     @notifications.created(_ENDPOINT, public=False)
     def create_endpoint(self, endpoint_id, endpoint_ref):
         try:
-            return self.driver.create_endpoint(endpoint_id, endpoint_ref)
+            ret = self.driver.create_endpoint(endpoint_id, endpoint_ref)
+            self.get_catalog_generation.invalidate(self)
+            return ret
         except exception.RegionNotFound:
             raise exception.ValidationError(attribute='endpoint region_id',
                                             target='region table')
@@ -182,13 +190,16 @@ class Manager(manager.Manager):
 
     @notifications.updated(_ENDPOINT, public=False)
     def update_endpoint(self, endpoint_id, endpoint_ref):
-        return self.driver.update_endpoint(endpoint_id, endpoint_ref)
+        ret = self.driver.update_endpoint(endpoint_id, endpoint_ref)
+        self.get_catalog_generation.invalidate(self)
+        return ret
 
     @notifications.deleted(_ENDPOINT, public=False)
     def delete_endpoint(self, endpoint_id):
         try:
             ret = self.driver.delete_endpoint(endpoint_id)
             self.get_endpoint.invalidate(self, endpoint_id)
+            self.get_catalog_generation.invalidate(self)
             return ret
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
@@ -205,6 +216,16 @@ class Manager(manager.Manager):
     def list_endpoints(self, hints=None):
         return self.driver.list_endpoints(hints or driver_hints.Hints())
 
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def get_catalog_generation(self):
+        """Returns an id that changes whenever services or endpoints change.
+
+        Caches built from the services and endpoints can be keyed by it.
+
+        """
+        return uuid.uuid4().hex
+
     def get_catalog(self, user_id, tenant_id, metadata=None):
         try:
             return self.driver.get_catalog(user_id, tenant_id, metadata)
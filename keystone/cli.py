@@ -25,6 +25,8 @@ from keystone.common import sql
 from keystone.common.sql import migration_helpers
 from keystone.common import utils
 from keystone import config
+from keystone.contrib import oauth2
+from keystone.contrib import revoke
 from keystone.i18n import _
 from keystone import identity
 from keystone.openstack.common import log
@@ -181,6 +183,28 @@ class TokenFlush(BaseApp):
         token_manager.driver.flush_expired_tokens()
 
 
+class OAuth2Flush(BaseApp):
+    """Flush expired OAuth2 access tokens and authorization codes."""
+
+    name = 'oauth2_flush'
+
+    @classmethod
+    def main(cls):
+        oauth2_manager = oauth2.Manager()
+        oauth2_manager.driver.flush_expired_tokens()
+
+
+class RevokeFlush(BaseApp):
+    """Flush expired revocation events from the backend."""
+
+    name = 'revoke_flush'
+
+    @classmethod
+    def main(cls):
+        revoke_manager = revoke.Manager()
+        revoke_manager.driver.prune_expired_events()
+
+
 class MappingPurge(BaseApp):
     """Purge the mapping table."""
 
@@ -278,7 +302,9 @@ CMDS = [
     DbSync,
     DbVersion,
     MappingPurge,
+    OAuth2Flush,
     PKISetup,
+    RevokeFlush,
     SamlIdentityProviderMetadata,
     SSLSetup,
     TokenFlush,
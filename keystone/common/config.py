@@ -109,6 +109,12 @@ FILE_OPTIONS = {
         cfg.IntOpt('crypt_strength', default=40000,
                    help='The value passed as the keyword "rounds" to '
                         'passlib\'s encrypt method.'),
+        cfg.IntOpt('password_hash_processes', default=0,
+                   help='Number of worker processes used to hash and '
+                        'verify passwords, so that the work does not '
+                        'block other requests. Set it to 0 to do it in the '
+                        'process handling the request, or to a negative '
+                        'value to start one worker per CPU.'),
         cfg.BoolOpt('tcp_keepalive', default=False,
                     help='Set this to true if you want to enable '
                          'TCP_KEEPALIVE on server sockets, i.e. sockets used '
@@ -173,6 +179,19 @@ FILE_OPTIONS = {
         cfg.IntOpt('max_password_length', default=4096,
                    help='Maximum supported length for user passwords; '
                         'decrease to improve performance.'),
+        cfg.BoolOpt('cache_verified_passwords', default=False,
+                    help='Remember the passwords that were verified '
+                         'recently, in the memory of each process, so that '
+                         'users authenticating again with the same password '
+                         'are not hashed again. Only an HMAC of the '
+                         'password is kept, under a key that is never '
+                         'written anywhere.'),
+        cfg.IntOpt('verified_password_cache_time', default=60,
+                   help='Number of seconds a verified password is '
+                        'remembered.'),
+        cfg.IntOpt('verified_password_cache_size', default=10000,
+                   help='Maximum number of users whose password is '
+                        'remembered.'),
         cfg.IntOpt('list_limit',
                    help='Maximum number of entities that will be returned in '
                         'an identity collection.'),
@@ -210,6 +229,12 @@ FILE_OPTIONS = {
                          'this means that the only time you can set this '
                          'value to False is when configuring a fresh '
                          'installation.'),
+        cfg.IntOpt('public_id_cache_size', default=0,
+                   help='Number of public IDs each process keeps in '
+                        'memory, the least recently used ones are '
+                        'forgotten first. 0 disables the cache. Restart '
+                        'keystone after purging mappings with '
+                        'keystone-manage.'),
     ],
     'trust': [
         cfg.BoolOpt('enabled', default=True,
@@ -284,6 +309,42 @@ FILE_OPTIONS = {
         cfg.BoolOpt('caching', default=True,
                     help='Toggle for revocation event caching. This has no '
                          'effect unless global caching is enabled.'),
+        cfg.IntOpt('prune_interval', default=0,
+                   help='Interval (in seconds) at which keystone-all removes '
+                        'expired revocation events from the backend. 0 '
+                        'disables the timer, in which case "keystone-manage '
+                        'revoke_flush" should be run periodically.'),
+    ],
+    'roles': [
+        cfg.BoolOpt('caching', default=True,
+                    help='Toggle for OS-ROLES caching. This has no effect '
+                         'unless global caching is enabled.'),
+        cfg.IntOpt('cache_time',
+                   help='Time to cache OS-ROLES data such as access token '
+                        'information and internal permissions (in seconds). '
+                        'This has no effect unless global and roles caching '
+                        'are enabled.'),
+        cfg.BoolOpt('background_cascade_delete', default=False,
+                    help='Remove the roles, permissions and assignments that '
+                         'belong to a deleted application, user or '
+                         'organization in a background worker instead of '
+                         'during the delete request. Progress is reported '
+                         'in the log.'),
+    ],
+    'scim': [
+        cfg.BoolOpt('count_total', default=True,
+                    help='Count the matching resources to report '
+                         'totalResults in SCIM list responses. When '
+                         'disabled, totalResults only covers the resources '
+                         'up to and including the returned page.'),
+        cfg.BoolOpt('caching', default=True,
+                    help='Toggle for caching SCIM totalResults. This has no '
+                         'effect unless global caching is enabled.'),
+        cfg.IntOpt('cache_time', default=60,
+                   help='Time to cache the totalResults of SCIM list '
+                        'responses (in seconds). Totals may be stale up to '
+                        'this long. This has no effect unless global and '
+                        'scim caching are enabled.'),
     ],
     'cache': [
         cfg.StrOpt('config_prefix', default='cache.keystone',
@@ -423,6 +484,11 @@ FILE_OPTIONS = {
                             'CN=www.example.com'),
                    help='Certificate subject (auto generated certificate) for '
                         'token signing.'),
+        cfg.BoolOpt('in_process', default=True,
+                    help='Sign PKI and PKIZ tokens in process with a '
+                         'certificate and RSA key loaded once, instead of '
+                         'running openssl for every token. Requires the '
+                         'cryptography library, otherwise openssl is used.'),
     ],
     'assignment': [
         # assignment has no default for backward compatibility reasons.
@@ -455,6 +521,29 @@ FILE_OPTIONS = {
         cfg.IntOpt('access_token_duration', default=86400,
                    help='Duration (in seconds) for the OAuth Access Token.'),
     ],
+    'oauth2': [
+        cfg.BoolOpt('caching', default=True,
+                    help='Toggle for OAuth2 caching. This has no effect '
+                         'unless global caching is enabled.'),
+        cfg.IntOpt('cache_time',
+                   help='Time to cache OAuth2 consumers and the access '
+                        'tokens used to validate bearer token requests (in '
+                        'seconds). '
+                        'Tokens are never accepted past their own '
+                        'expiration. This has no effect unless global and '
+                        'oauth2 caching are enabled.'),
+        cfg.IntOpt('negative_cache_time', default=10,
+                   help='Time to remember that an OAuth2 access token does '
+                        'not exist (in seconds). This has no effect unless '
+                        'global and oauth2 caching are enabled.'),
+        cfg.IntOpt('refresh_token_max_age', default=0,
+                   help='Time a refresh token can be used after its access '
+                        'token expired (in seconds). Older ones are '
+                        'rejected and removed by keystone-manage '
+                        'oauth2_flush. Set to 0 to keep refresh tokens '
+                        'forever, which also keeps their expired access '
+                        'tokens in the database.'),
+    ],
     'federation': [
         cfg.StrOpt('driver',
                    default='keystone.contrib.federation.'
@@ -468,6 +557,11 @@ FILE_OPTIONS = {
         cfg.StrOpt('driver',
                    default='keystone.policy.backends.sql.Policy',
                    help='Policy backend driver.'),
+        cfg.BoolOpt('compile_rules', default=True,
+                    help='Compile the rules of the policy file into Python '
+                         'functions when they are loaded, instead of '
+                         'interpreting the parsed rules on every '
+                         'enforcement.'),
         cfg.IntOpt('list_limit',
                    help='Maximum number of entities that will be returned '
                         'in a policy collection.'),
@@ -480,6 +574,14 @@ FILE_OPTIONS = {
         cfg.BoolOpt('return_all_endpoints_if_no_filter', default=True,
                     help='Toggle to return all active endpoints if no filter '
                          'exists.'),
+        cfg.BoolOpt('caching', default=True,
+                    help='Toggle for caching the endpoints of each project. '
+                         'This has no effect unless global caching is '
+                         'enabled.'),
+        cfg.IntOpt('cache_time',
+                   help='Time to cache the endpoints of each project (in '
+                        'seconds). This has no effect unless global and '
+                        'endpoint filter caching are enabled.'),
     ],
     'endpoint_policy': [
         cfg.StrOpt('driver',
@@ -765,6 +867,19 @@ FILE_OPTIONS = {
                    help='End user auth connection pool size.'),
         cfg.IntOpt('auth_pool_connection_lifetime', default=60,
                    help='End user auth connection lifetime in seconds.'),
+        cfg.BoolOpt('entity_cache', default=False,
+                    help='Keep the users and groups read from LDAP in '
+                         'memory for a while. The cache belongs to each '
+                         'process, changes made directly in the directory '
+                         'or through another keystone process are not seen '
+                         'until the cached entries expire. Authentication '
+                         'always reads the user from the directory.'),
+        cfg.IntOpt('entity_cache_time', default=60,
+                   help='Time in seconds the entries read from LDAP are '
+                        'cached.'),
+        cfg.IntOpt('entity_cache_size', default=10000,
+                   help='Maximum number of entries cached for each kind '
+                        'of LDAP object.'),
     ],
     'auth': [
         cfg.ListOpt('methods', default=_DEFAULT_AUTH_METHODS,
@@ -886,6 +1001,12 @@ FILE_OPTIONS = {
                    default=_KEYFILE,
                    help='Path of the keyfile for SAML signing. Note, the path '
                         'cannot contain a comma.'),
+        cfg.BoolOpt('in_process_signing', default=True,
+                    help='Sign SAML assertions in process with a certificate '
+                         'and RSA key loaded once, instead of running '
+                         'xmlsec1 for every assertion. Requires the '
+                         'cryptography and lxml libraries, otherwise xmlsec1 '
+                         'is used.'),
         cfg.StrOpt('idp_entity_id',
                    help='Entity ID value for unique Identity Provider '
                         'identification. Usually FQDN is set with a suffix. '
@@ -28,7 +28,9 @@ class Hints(object):
 
     A Hint object contains filters, which is a list of dicts that can be
     accessed publicly. Also it contains a dict called limit, which will
-    indicate the amount of data we want to limit our listing to.
+    indicate the amount of data we want to limit our listing to, and an
+    optional dict called pagination, which describes the page of results
+    requested (see ``set_pagination``).
 
     Each filter term consists of:
 
@@ -43,6 +45,7 @@ class Hints(object):
     """
     def __init__(self):
         self.limit = None
+        self.pagination = None
         self.filters = list()
 
     def add_filter(self, name, value, comparator='equals',
@@ -63,3 +66,25 @@ class Hints(object):
     def set_limit(self, limit, truncated=False):
         """Set a limit to indicate the list should be truncated."""
         self.limit = {'limit': limit, 'type': 'limit', 'truncated': truncated}
+
+    def set_pagination(self, limit=None, offset=None, marker=None,
+                       count_total=False, total_expiration_time=None):
+        """Request a single page of the list.
+
+        A page either starts ``offset`` entries into the list or, for keyset
+        pagination, right after the entity whose primary key is ``marker``.
+        The total number of matching entities is only calculated when
+        ``count_total`` is set; if ``total_expiration_time`` is also given,
+        the driver may return a cached total that is up to that many seconds
+        old.
+
+        A driver that honors the pagination sets ``paginated`` to True and,
+        if requested, stores the number of matching entities in ``total``.
+        Otherwise both are left untouched for the caller to handle.
+
+        """
+        self.pagination = {'limit': limit, 'offset': offset,
+                           'marker': marker, 'count_total': count_total,
+                           'total_expiration_time': total_expiration_time,
+                           'paginated': False, 'total': None,
+                           'type': 'pagination'}
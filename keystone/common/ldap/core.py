@@ -18,6 +18,8 @@ import functools
 import os.path
 import re
 import sys
+import threading
+import time
 import weakref
 
 import ldap
@@ -50,6 +52,10 @@ LDAP_TLS_CERTS = {'never': ldap.OPT_X_TLS_NEVER,
 # indicate that no attributes should be returned besides the DN.
 DN_ONLY = ['1.1']
 
+# Number of ids looked up with a single OR filter, small enough for the
+# filter to stay well within the limits of LDAP servers.
+LDAP_IDS_PER_SEARCH = 100
+
 _utf8_encoder = codecs.getencoder('utf-8')
 
 
@@ -311,6 +317,23 @@ def is_dn_equal(dn1, dn2):
     return True
 
 
+def _dn_key(dn):
+    """Returns a key that is the same for DNs that are equal.
+
+    The DNs are compared like is_dn_equal does, so the limitations of that
+    function apply here.
+
+    """
+    try:
+        dn = ldap.dn.str2dn(utf8_encode(dn))
+    except ldap.DECODING_ERROR:
+        return prep_case_insensitive(utf8_decode(dn))
+    return tuple(tuple(sorted((attr_type.lower(),
+                               prep_case_insensitive(utf8_decode(val)))
+                              for attr_type, val, dummy in rdn))
+                 for rdn in dn)
+
+
 def dn_startswith(descendant_dn, dn):
     """Returns True if and only if the descendant_dn is under the dn.
 
@@ -925,7 +948,8 @@ class KeystoneLDAPHandler(LDAPHandler):
         return self.conn.add_s(dn_utf8, ldap_attrs_utf8)
 
     def search_s(self, base, scope,
-                 filterstr='(objectClass=*)', attrlist=None, attrsonly=0):
+                 filterstr='(objectClass=*)', attrlist=None, attrsonly=0,
+                 sizelimit=0):
         # NOTE(morganfainberg): Remove "None" singletons from this list, which
         # allows us to set mapped attributes to "None" as defaults in config.
         # Without this filtering, the ldap query would raise a TypeError since
@@ -933,11 +957,12 @@ class KeystoneLDAPHandler(LDAPHandler):
         if attrlist is not None:
             attrlist = [attr for attr in attrlist if attr is not None]
         LOG.debug('LDAP search: base=%s scope=%s filterstr=%s '
-                  'attrs=%s attrsonly=%s',
-                  base, scope, filterstr, attrlist, attrsonly)
+                  'attrs=%s attrsonly=%s sizelimit=%s',
+                  base, scope, filterstr, attrlist, attrsonly, sizelimit)
         if self.page_size:
             ldap_result = self._paged_search_s(base, scope,
-                                               filterstr, attrlist)
+                                               filterstr, attrlist,
+                                               sizelimit)
         else:
             base_utf8 = utf8_encode(base)
             filterstr_utf8 = utf8_encode(filterstr)
@@ -945,9 +970,15 @@ class KeystoneLDAPHandler(LDAPHandler):
                 attrlist_utf8 = None
             else:
                 attrlist_utf8 = map(utf8_encode, attrlist)
-            ldap_result = self.conn.search_s(base_utf8, scope,
-                                             filterstr_utf8,
-                                             attrlist_utf8, attrsonly)
+            if sizelimit:
+                ldap_result = self._limited_search_s(base_utf8, scope,
+                                                     filterstr_utf8,
+                                                     attrlist_utf8, attrsonly,
+                                                     sizelimit)
+            else:
+                ldap_result = self.conn.search_s(base_utf8, scope,
+                                                 filterstr_utf8,
+                                                 attrlist_utf8, attrsonly)
 
         py_result = convert_ldap_result(ldap_result)
 
@@ -969,9 +1000,31 @@ class KeystoneLDAPHandler(LDAPHandler):
                                     serverctrls, clientctrls,
                                     timeout, sizelimit)
 
-    def _paged_search_s(self, base, scope, filterstr, attrlist=None):
+    def _limited_search_s(self, base, scope, filterstr, attrlist, attrsonly,
+                          sizelimit):
+        """Returns at most sizelimit entries, counted by the server."""
+        res = []
+        msgid = self.conn.search_ext(base, scope, filterstr, attrlist,
+                                     attrsonly, sizelimit=sizelimit)
+        try:
+            while True:
+                rtype, rdata, rmsgid, serverctrls = self.conn.result3(
+                    msgid, all=0)
+                if rtype == ldap.RES_SEARCH_RESULT:
+                    break
+                res.extend(rdata)
+        except ldap.SIZELIMIT_EXCEEDED:
+            # the server sent the first sizelimit entries and then stopped
+            pass
+        return res
+
+    def _paged_search_s(self, base, scope, filterstr, attrlist=None,
+                        sizelimit=0):
         res = []
         use_old_paging_api = False
+        page_size = self.page_size
+        if sizelimit:
+            page_size = min(page_size, sizelimit)
         # The API for the simple paged results control changed between
         # python-ldap 2.3 and 2.4.  We need to detect the capabilities
         # of the python-ldap version we are using.
@@ -980,12 +1033,12 @@ class KeystoneLDAPHandler(LDAPHandler):
             lc = ldap.controls.SimplePagedResultsControl(
                 controlType=ldap.LDAP_CONTROL_PAGE_OID,
                 criticality=True,
-                controlValue=(self.page_size, ''))
+                controlValue=(page_size, ''))
             page_ctrl_oid = ldap.LDAP_CONTROL_PAGE_OID
         else:
             lc = ldap.controls.libldap.SimplePagedResultsControl(
                 criticality=True,
-                size=self.page_size,
+                size=page_size,
                 cookie='')
             page_ctrl_oid = ldap.controls.SimplePagedResultsControl.controlType
 
@@ -1009,11 +1062,19 @@ class KeystoneLDAPHandler(LDAPHandler):
             res.extend(rdata)
             pctrls = [c for c in serverctrls
                       if c.controlType == page_ctrl_oid]
+            if sizelimit and len(res) >= sizelimit:
+                # the remaining pages are not needed, don't ask for them
+                del res[sizelimit:]
+                if pctrls:
+                    self._abandon_paged_search(
+                        base_utf8, scope, filterstr_utf8, attrlist_utf8,
+                        lc, pctrls[0], use_old_paging_api)
+                break
             if pctrls:
                 # LDAP server supports pagination
                 if use_old_paging_api:
                     est, cookie = pctrls[0].controlValue
-                    lc.controlValue = (self.page_size, cookie)
+                    lc.controlValue = (page_size, cookie)
                 else:
                     cookie = lc.cookie = pctrls[0].cookie
 
@@ -1036,6 +1097,27 @@ class KeystoneLDAPHandler(LDAPHandler):
                 break
         return res
 
+    def _abandon_paged_search(self, base_utf8, scope, filterstr_utf8,
+                              attrlist_utf8, lc, pctrl, use_old_paging_api):
+        # NOTE(garcianavalon) the server keeps the state of a paged search
+        # until the last page is read. A request with a page size of 0 and
+        # the current cookie releases it (RFC 2696), so it doesn't linger
+        # on pooled connections.
+        if use_old_paging_api:
+            est, cookie = pctrl.controlValue
+            lc.controlValue = (0, cookie)
+        else:
+            cookie = lc.cookie = pctrl.cookie
+            lc.size = 0
+        if not cookie:
+            return
+        msgid = self.conn.search_ext(base_utf8,
+                                     scope,
+                                     filterstr_utf8,
+                                     attrlist_utf8,
+                                     serverctrls=[lc])
+        self.conn.result3(msgid)
+
     def result3(self, msgid=ldap.RES_ANY, all=1, timeout=None,
                 resp_ctrl_classes=None):
         ldap_result = self.conn.result3(msgid, all, timeout, resp_ctrl_classes)
@@ -1114,6 +1196,95 @@ def filter_entity(entity_ref):
     return entity_ref
 
 
+class EntityCache(object):
+    """Keeps the LDAP entries read by a BaseLdap for a while.
+
+    The entries are kept as returned by the search, already decoded, and
+    are indexed by id, DN and name. Like LDAP, the indexes don't care about
+    case. Local changes invalidate the entries, changes made directly in
+    the directory are seen once the entries expire.
+
+    """
+
+    def __init__(self, cache_time, size):
+        self.cache_time = cache_time
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._ids_by_dn = {}
+        self._ids_by_name = {}
+
+    def get(self, object_id):
+        """Returns the entry of object_id, or None if it isn't cached."""
+        item = self._entries.get(six.text_type(object_id).lower())
+        if item is None or item[0] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[1]
+
+    def get_id_by_name(self, name):
+        object_id = self._ids_by_name.get(six.text_type(name).lower())
+        if object_id is None or object_id not in self._entries:
+            return None
+        return object_id
+
+    def add(self, object_id, entry):
+        key = six.text_type(object_id).lower()
+        now = time.time()
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.size:
+                for expired in [k for k, item in six.iteritems(self._entries)
+                                if item[0] <= now]:
+                    self._remove(expired)
+                if len(self._entries) >= self.size:
+                    self._clear()
+            self._remove(key)
+            self._entries[key] = (now + self.cache_time, entry, set())
+            self._ids_by_dn[_dn_key(entry[0])] = key
+
+    def add_name(self, name, object_id):
+        key = six.text_type(object_id).lower()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                name = six.text_type(name).lower()
+                self._ids_by_name[name] = key
+                item[2].add(name)
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self._ids_by_dn.pop(_dn_key(item[1][0]), None)
+            for name in item[2]:
+                self._ids_by_name.pop(name, None)
+
+    def _clear(self):
+        self._entries.clear()
+        self._ids_by_dn.clear()
+        self._ids_by_name.clear()
+
+    def invalidate(self, object_id):
+        with self._lock:
+            self._remove(six.text_type(object_id).lower())
+
+    def invalidate_dn(self, dn):
+        with self._lock:
+            key = self._ids_by_dn.get(_dn_key(dn))
+            if key is not None:
+                self._remove(key)
+
+    def stats(self):
+        """Returns the hits, misses, hit rate and size of the cache."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'size': len(self._entries)}
+
+
 class BaseLdap(object):
     DEFAULT_SUFFIX = "dc=example,dc=com"
     DEFAULT_OU = None
@@ -1216,6 +1387,12 @@ class BaseLdap(object):
         self.subtree_delete_enabled = getattr(conf.ldap,
                                               'allow_subtree_delete')
 
+        self._attribute_list = None
+        self.entity_cache = None
+        if conf.ldap.entity_cache:
+            self.entity_cache = EntityCache(conf.ldap.entity_cache_time,
+                                            conf.ldap.entity_cache_size)
+
     def _not_found(self, object_id):
         if self.NotFound is None:
             return exception.NotFound(target=object_id)
@@ -1430,11 +1607,32 @@ class BaseLdap(object):
 
         if 'groupOfNames' in object_classes and self.use_dumb_member:
             attrs.append(('member', [self.dumb_member]))
+        self._invalidate(values['id'])
         with self.get_connection() as conn:
             conn.add_s(self._id_to_dn(values['id']), attrs)
         return values
 
+    def _get_attribute_list(self):
+        """Returns the LDAP attributes read for every object."""
+        if self._attribute_list is None:
+            self._attribute_list = list(set(([self.id_attr] +
+                                             self.attribute_mapping.values() +
+                                             self.extra_attr_mapping.keys())))
+        return self._attribute_list
+
+    def _invalidate(self, object_id):
+        if self.entity_cache is not None:
+            self.entity_cache.invalidate(object_id)
+
     def _ldap_get(self, object_id, ldap_filter=None):
+        # NOTE(garcianavalon) only the lookups with the configured filter
+        # are cached, the others are one-off searches.
+        cache = self.entity_cache if ldap_filter is None else None
+        if cache is not None:
+            res = cache.get(object_id)
+            if res is not None:
+                return res
+
         query = (u'(&(%(id_attr)s=%(id)s)'
                  u'%(filter)s'
                  u'(objectClass=%(object_class)s))'
@@ -1445,33 +1643,108 @@ class BaseLdap(object):
                     'object_class': self.object_class})
         with self.get_connection() as conn:
             try:
-                attrs = list(set(([self.id_attr] +
-                                  self.attribute_mapping.values() +
-                                  self.extra_attr_mapping.keys())))
                 res = conn.search_s(self.tree_dn,
                                     self.LDAP_SCOPE,
                                     query,
-                                    attrs)
+                                    self._get_attribute_list())
             except ldap.NO_SUCH_OBJECT:
                 return None
         try:
-            return res[0]
+            res = res[0]
         except IndexError:
             return None
+        if cache is not None:
+            cache.add(object_id, res)
+        return res
+
+    def _filter_term(self, filter_):
+        """Returns the LDAP filter (RFC 4515) for a driver hints filter.
+
+        Returns None for the filters that can't be expressed in LDAP.
+
+        """
+        if filter_['name'] == 'id':
+            ldap_attr = self.id_attr
+        else:
+            ldap_attr = self.attribute_mapping.get(filter_['name'])
+        if not ldap_attr or filter_['name'] in self.attribute_ignore:
+            return None
+        if filter_['name'] == 'enabled':
+            # NOTE(garcianavalon) depending on the configuration the enabled
+            # attribute is masked, inverted or emulated with a group, so it is
+            # left to the controller.
+            return None
+
+        value = ldap.filter.escape_filter_chars(
+            six.text_type(filter_['value']))
+        comparator = filter_['comparator']
+        if comparator == 'equals':
+            pattern = u'(%s=%s)'
+        elif comparator == 'startswith':
+            pattern = u'(%s=%s*)'
+        elif comparator == 'endswith':
+            pattern = u'(%s=*%s)'
+        elif comparator == 'contains':
+            pattern = u'(%s=*%s*)'
+        else:
+            return None
+        return pattern % (ldap_attr, value)
+
+    def filter_query(self, hints, query=None):
+        """Adds the filters of the hints to an LDAP query.
+
+        :param hints: contains the list of filters, which may be None,
+                      indicating that there are no filters to be applied.
+                      Any filters satisfied here will be removed so that
+                      the caller will know if any filters remain.
+        :param query: LDAP query to add the filters to
 
-    def _ldap_get_all(self, ldap_filter=None):
+        :returns: the query, updated with the filters
+
+        """
+        query = query or u''
+        if hints is None:
+            return query
+
+        terms = []
+        for filter_ in list(hints.filters):
+            term = self._filter_term(filter_)
+            if term is None:
+                continue
+            terms.append(term)
+            # NOTE(garcianavalon) most LDAP attributes are matched regardless
+            # of case, so a case sensitive filter still narrows the search
+            # but is left for the controller to finish.
+            if not filter_['case_sensitive']:
+                hints.filters.remove(filter_)
+
+        if terms:
+            query = u'(&%s%s)' % (query, u''.join(terms))
+        return query
+
+    def _sizelimit(self, hints):
+        """Returns how many entries a search needs to satisfy the hints.
+
+        One more entry than the limit is asked for, so the controller can
+        tell that the list was truncated.
+
+        """
+        if hints is None or not hints.limit or hints.filters:
+            return 0
+        return hints.limit['limit'] + 1
+
+    def _ldap_get_all(self, ldap_filter=None, hints=None):
         query = u'(&%s(objectClass=%s))' % (ldap_filter or
                                             self.ldap_filter or
                                             '', self.object_class)
+        query = self.filter_query(hints, query)
         with self.get_connection() as conn:
             try:
-                attrs = list(set(([self.id_attr] +
-                                  self.attribute_mapping.values() +
-                                  self.extra_attr_mapping.keys())))
                 return conn.search_s(self.tree_dn,
                                      self.LDAP_SCOPE,
                                      query,
-                                     attrs)
+                                     self._get_attribute_list(),
+                                     sizelimit=self._sizelimit(hints))
             except ldap.NO_SUCH_OBJECT:
                 return []
 
@@ -1498,18 +1771,47 @@ class BaseLdap(object):
             return self._ldap_res_to_model(res)
 
     def get_by_name(self, name, ldap_filter=None):
+        if self.entity_cache is not None:
+            object_id = self.entity_cache.get_id_by_name(name)
+            if object_id is not None:
+                try:
+                    return self.get(object_id)
+                except exception.NotFound:
+                    pass
+
         query = (u'(%s=%s)' % (self.attribute_mapping['name'],
                                ldap.filter.escape_filter_chars(
                                    six.text_type(name))))
         res = self.get_all(query)
         try:
-            return res[0]
+            ref = res[0]
         except IndexError:
             raise self._not_found(name)
+        if self.entity_cache is not None:
+            self.entity_cache.add_name(name, ref['id'])
+        return ref
 
-    def get_all(self, ldap_filter=None):
+    def get_all(self, ldap_filter=None, hints=None):
         return [self._ldap_res_to_model(x)
-                for x in self._ldap_get_all(ldap_filter)]
+                for x in self._ldap_get_all(ldap_filter, hints)]
+
+    def get_all_by_ids(self, object_ids):
+        """Returns the objects with the given ids, in a few searches.
+
+        The ids are looked up ``LDAP_IDS_PER_SEARCH`` at a time with an OR
+        filter, and objects that are not found are left out.
+
+        """
+        refs = []
+        for start in range(0, len(object_ids), LDAP_IDS_PER_SEARCH):
+            terms = [u'(%s=%s)' % (self.id_attr,
+                                   ldap.filter.escape_filter_chars(
+                                       six.text_type(object_id)))
+                     for object_id in
+                     object_ids[start:start + LDAP_IDS_PER_SEARCH]]
+            query = u'(&(|%s)%s)' % (u''.join(terms), self.ldap_filter or '')
+            refs.extend(self.get_all(query))
+        return refs
 
     def update(self, object_id, values, old_obj=None):
         if old_obj is None:
@@ -1556,6 +1858,7 @@ class BaseLdap(object):
                 modlist.append((op, self.attribute_mapping.get(k, k), [v]))
 
         if modlist:
+            self._invalidate(object_id)
             with self.get_connection() as conn:
                 try:
                     conn.modify_s(self._id_to_dn(object_id), modlist)
@@ -1565,6 +1868,7 @@ class BaseLdap(object):
         return self.get(object_id)
 
     def delete(self, object_id):
+        self._invalidate(object_id)
         with self.get_connection() as conn:
             try:
                 conn.delete_s(self._id_to_dn(object_id))
@@ -1575,6 +1879,7 @@ class BaseLdap(object):
         tree_delete_control = ldap.controls.LDAPControl(CONTROL_TREEDELETE,
                                                         0,
                                                         None)
+        self._invalidate(object_id)
         with self.get_connection() as conn:
             try:
                 conn.delete_ext_s(self._id_to_dn(object_id),
@@ -1618,6 +1923,8 @@ class BaseLdap(object):
         :raises: exception.Conflict: If the user was already a member.
                  self.NotFound: If the group entry didn't exist.
         """
+        if self.entity_cache is not None:
+            self.entity_cache.invalidate_dn(member_list_dn)
         with self.get_connection() as conn:
             try:
                 mod = (ldap.MOD_ADD, self.member_attribute, member_dn)
@@ -1641,6 +1948,8 @@ class BaseLdap(object):
         :raises: self.NotFound: If the group entry didn't exist.
                  ldap.NO_SUCH_ATTRIBUTE: If the user wasn't a member.
         """
+        if self.entity_cache is not None:
+            self.entity_cache.invalidate_dn(member_list_dn)
         with self.get_connection() as conn:
             try:
                 mod = (ldap.MOD_DELETE, self.member_attribute, member_dn)
@@ -1773,17 +2082,17 @@ class EnabledEmuMixIn(BaseLdap):
             ref['enabled'] = self._get_enabled(object_id)
         return ref
 
-    def get_all(self, ldap_filter=None):
+    def get_all(self, ldap_filter=None, hints=None):
         if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
             # had to copy BaseLdap.get_all here to ldap_filter by DN
             tenant_list = [self._ldap_res_to_model(x)
-                           for x in self._ldap_get_all(ldap_filter)
+                           for x in self._ldap_get_all(ldap_filter, hints)
                            if x[0] != self.enabled_emulation_dn]
             for tenant_ref in tenant_list:
                 tenant_ref['enabled'] = self._get_enabled(tenant_ref['id'])
             return tenant_list
         else:
-            return super(EnabledEmuMixIn, self).get_all(ldap_filter)
+            return super(EnabledEmuMixIn, self).get_all(ldap_filter, hints)
 
     def update(self, object_id, values, old_obj=None):
         if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
@@ -0,0 +1,167 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""A pool of worker processes for CPU bound work like password hashing.
+
+Hashing a password with tens of thousands of rounds holds the interpreter
+for tens of milliseconds. Under eventlet that stalls every other request
+of the process, so the work is sent to a worker process instead and the
+calling greenthread waits for the answer in one of eventlet's native
+threads (``eventlet.tpool``), which leaves the hub free to keep serving.
+
+Outside of eventlet the caller simply blocks on the worker.
+
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+
+from six.moves import queue
+
+from keystone.common import config
+from keystone.i18n import _LW
+from keystone.openstack.common import log
+
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _serve(conn):
+    """Runs the functions received on the connection until it is closed."""
+    while True:
+        try:
+            func, args = conn.recv()
+        except (EOFError, IOError, KeyboardInterrupt):
+            return
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+def _green():
+    """Tells whether the threads of this process are greenthreads."""
+    eventlet = sys.modules.get('eventlet')
+    if eventlet is None:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched('thread')
+
+
+def _native_queue_module():
+    # NOTE(garcianavalon) the idle workers are taken from eventlet's native
+    # threads, which must not touch green locks.
+    if _green():
+        from eventlet import patcher
+        return patcher.original(queue.__name__)
+    return queue
+
+
+class ProcessPool(object):
+    """Runs functions in a fixed number of worker processes.
+
+    The functions and their arguments must be picklable, so they have to
+    be defined at the top level of a module.
+
+    """
+
+    def __init__(self, size):
+        self.pid = os.getpid()
+        self._idle = _native_queue_module().Queue()
+        self._processes = []
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_serve, args=(child_conn,),
+                                          name='keystone-process-pool')
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        self._processes.append(process)
+        return conn
+
+    def _call(self, func, args):
+        conn = self._idle.get()
+        try:
+            conn.send((func, args))
+            succeeded, result = conn.recv()
+        except (EOFError, IOError, OSError) as e:
+            LOG.warning(_LW('Lost a worker process (%s), starting a new '
+                            'one'), e)
+            conn.close()
+            self._processes = [p for p in self._processes if p.is_alive()]
+            conn = self._start_worker()
+            return func(*args)
+        finally:
+            self._idle.put(conn)
+        if not succeeded:
+            raise result
+        return result
+
+    def execute(self, func, *args):
+        """Returns ``func(*args)``, computed by one of the workers."""
+        if _green():
+            from eventlet import tpool
+            return tpool.execute(self._call, func, args)
+        return self._call(func, args)
+
+    def terminate(self):
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+
+def _get_pool():
+    global _POOL
+
+    if not CONF.password_hash_processes:
+        return None
+    pool = _POOL
+    # NOTE(garcianavalon) workers started before keystone forked belong to
+    # the parent, each process starts its own.
+    if pool is None or pool.pid != os.getpid():
+        with _POOL_LOCK:
+            pool = _POOL
+            if pool is None or pool.pid != os.getpid():
+                size = CONF.password_hash_processes
+                if size < 0:
+                    size = multiprocessing.cpu_count()
+                pool = ProcessPool(size)
+                _POOL = pool
+    return pool
+
+
+def execute(func, *args):
+    """Returns ``func(*args)``, computed in the pool if it is enabled."""
+    pool = _get_pool()
+    if pool is None:
+        return func(*args)
+    return pool.execute(func, *args)
+
+
+def reset():
+    """Stops the workers of this process."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL.pid == os.getpid():
+            _POOL.terminate()
+        _POOL = None
@@ -0,0 +1,207 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""In-process CMS signing of PKI and PKIZ tokens.
+
+keystoneclient signs every token with an ``openssl cms`` subprocess. The
+signer here loads the certificate and key once and builds the same CMS
+SignedData document (SHA-256, no signed attributes, no certificates) in
+process, so the token ids are byte for byte the ones openssl produces.
+
+The openssl subprocess is still used when the cryptography library is not
+installed, when the signing key is not an RSA key, or when the data holds
+carriage returns, which openssl's MIME canonicalization treats specially.
+
+"""
+
+import base64
+import binascii
+import os
+import threading
+import zlib
+
+from keystoneclient.common import cms
+import six
+
+try:
+    from cryptography import exceptions as crypto_exceptions
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography import x509
+except ImportError:
+    x509 = None
+
+from keystone import config
+from keystone.i18n import _LW
+from keystone.openstack.common import log
+
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+# DER encodings of the identifiers used in the SignedData document.
+_OID_SIGNED_DATA = b'\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02'
+_OID_DATA = b'\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x07\x01'
+_SHA256 = b'\x30\x0b\x06\x09\x60\x86\x48\x01\x65\x03\x04\x02\x01'
+_RSA_ENCRYPTION = (b'\x30\x0d\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x01\x01'
+                   b'\x05\x00')
+_VERSION_1 = b'\x02\x01\x01'
+
+_SEQUENCE = 0x30
+_SET = 0x31
+_OCTET_STRING = 0x04
+_EXPLICIT_0 = 0xa0
+
+_PEM_HEADER = b'-----BEGIN CMS-----\n'
+_PEM_FOOTER = b'\n-----END CMS-----\n'
+
+_SIGNERS = {}
+_SIGNERS_LOCK = threading.Lock()
+
+
+def _der(tag, content):
+    length = len(content)
+    if length < 0x80:
+        return six.int2byte(tag) + six.int2byte(length) + content
+    length_bytes = b''
+    while length:
+        length_bytes = six.int2byte(length & 0xff) + length_bytes
+        length >>= 8
+    return (six.int2byte(tag) + six.int2byte(0x80 | len(length_bytes)) +
+            length_bytes + content)
+
+
+def _der_bounds(data, offset):
+    """Returns where the content of the DER element at offset starts and
+    where the element ends.
+    """
+    length = six.indexbytes(data, offset + 1)
+    start = offset + 2
+    if length & 0x80:
+        count = length & 0x7f
+        length = int(binascii.hexlify(data[start:start + count]), 16)
+        start += count
+    return start, start + length
+
+
+class Signer(object):
+    """Signs data with a certificate and RSA key loaded once."""
+
+    def __init__(self, certfile, keyfile):
+        backend = default_backend()
+        with open(certfile, 'rb') as f:
+            cert = x509.load_pem_x509_certificate(f.read(), backend)
+        with open(keyfile, 'rb') as f:
+            self._key = serialization.load_pem_private_key(f.read(), None,
+                                                           backend)
+        if not isinstance(self._key, rsa.RSAPrivateKey):
+            raise ValueError('only RSA signing keys are supported')
+
+        # The signer is identified by the issuer and serial number exactly as
+        # they are encoded in the certificate.
+        tbs = cert.tbs_certificate_bytes
+        offset = _der_bounds(tbs, 0)[0]
+        if six.indexbytes(tbs, offset) == _EXPLICIT_0:
+            offset = _der_bounds(tbs, offset)[1]
+        serial_end = _der_bounds(tbs, offset)[1]
+        serial = tbs[offset:serial_end]
+        # the signature algorithm sits between the serial and the issuer
+        issuer_start = _der_bounds(tbs, serial_end)[1]
+        issuer = tbs[issuer_start:_der_bounds(tbs, issuer_start)[1]]
+        self._signer_id = _der(_SEQUENCE, issuer + serial)
+
+    def sign(self, data):
+        """Returns the PEM encoded CMS SignedData document for data."""
+        signature = self._key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+        signer_info = _der(_SEQUENCE,
+                           _VERSION_1 + self._signer_id + _SHA256 +
+                           _RSA_ENCRYPTION +
+                           _der(_OCTET_STRING, signature))
+        signed_data = _der(_SEQUENCE,
+                           _VERSION_1 +
+                           _der(_SET, _SHA256) +
+                           _der(_SEQUENCE,
+                                _OID_DATA +
+                                _der(_EXPLICIT_0,
+                                     _der(_OCTET_STRING, data))) +
+                           _der(_SET, signer_info))
+        document = _der(_SEQUENCE,
+                        _OID_SIGNED_DATA + _der(_EXPLICIT_0, signed_data))
+        encoded = base64.b64encode(document)
+        lines = [encoded[i:i + 64] for i in range(0, len(encoded), 64)]
+        return _PEM_HEADER + b'\n'.join(lines) + _PEM_FOOTER
+
+
+def _get_signer(certfile, keyfile):
+    if not CONF.signing.in_process or x509 is None:
+        return None
+    try:
+        stamp = (os.stat(certfile).st_mtime, os.stat(keyfile).st_mtime)
+    except OSError:
+        # NOTE(garcianavalon) let openssl report the missing files.
+        return None
+
+    key = (certfile, keyfile)
+    entry = _SIGNERS.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    with _SIGNERS_LOCK:
+        entry = _SIGNERS.get(key)
+        if entry is None or entry[0] != stamp:
+            try:
+                signer = Signer(certfile, keyfile)
+            except (IOError, ValueError, TypeError,
+                    crypto_exceptions.UnsupportedAlgorithm) as e:
+                # NOTE(garcianavalon) TypeError is raised for encrypted keys.
+                LOG.warning(_LW('Unable to sign tokens in process, falling '
+                                'back to openssl: %s'), e)
+                signer = None
+            entry = (stamp, signer)
+            _SIGNERS[key] = entry
+    return entry[1]
+
+
+def reset():
+    """Forgets the loaded certificates and keys."""
+    with _SIGNERS_LOCK:
+        _SIGNERS.clear()
+
+
+def cms_sign_data(text, certfile, keyfile):
+    """Returns the PEM encoded CMS document, like ``openssl cms -sign``."""
+    if isinstance(text, six.text_type):
+        data = text.encode('utf-8')
+    else:
+        data = text
+    signer = _get_signer(certfile, keyfile)
+    if signer is None or b'\r' in data:
+        return cms.cms_sign_data(text, certfile, keyfile, cms.PKIZ_CMS_FORM)
+    # NOTE(garcianavalon) openssl signs text in MIME canonical form.
+    return signer.sign(data.replace(b'\n', b'\r\n'))
+
+
+def cms_sign_token(text, certfile, keyfile):
+    """Same as keystoneclient's ``cms.cms_sign_token``."""
+    return cms.cms_to_token(
+        cms_sign_data(text, certfile, keyfile).decode('utf-8'))
+
+
+def pkiz_sign(text, certfile, keyfile, compression_level=6):
+    """Same as keystoneclient's ``cms.pkiz_sign``."""
+    signed = cms_sign_data(text, certfile, keyfile)
+    compressed = zlib.compress(signed, compression_level)
+    return cms.PKIZ_PREFIX + base64.urlsafe_b64encode(
+        compressed).decode('utf-8')
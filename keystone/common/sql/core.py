@@ -33,6 +33,7 @@ from sqlalchemy.ext import declarative
 from sqlalchemy.orm.attributes import flag_modified, InstrumentedAttribute
 from sqlalchemy import types as sql_types
 
+from keystone.common import cache
 from keystone.common import utils
 from keystone import exception
 from keystone.i18n import _
@@ -340,25 +341,82 @@ def _limit(query, hints):
     :returns updated query
 
     """
-    # NOTE(henry-nash): If we were to implement pagination, then we
-    # we would expand this method to support pagination and limiting.
-
     # If we satisfied all the filters, set an upper limit if supplied
     if hints.limit:
         query = query.limit(hints.limit['limit'])
     return query
 
 
+def _count_total(model, query, hints, filters):
+    """Counts the entities matched by a query.
+
+    :param model: table model
+    :param query: query whose results are counted
+    :param hints: contains the pagination details.
+    :param filters: the filters that were applied to the query, used to
+                    build the cache key of approximate totals.
+
+    :returns: number of matching entities
+
+    """
+    expiration_time = hints.pagination['total_expiration_time']
+    if not expiration_time or not CONF.cache.enabled:
+        return query.count()
+
+    # NOTE(garcianavalon) an approximate total is good enough for paging
+    # through large tables and saves a full scan on every page.
+    key = 'sql_total:%s:%r' % (
+        model.__tablename__,
+        sorted(sorted(filter_.items()) for filter_ in filters))
+    return cache.REGION.get_or_create(key, query.count,
+                                      expiration_time=expiration_time)
+
+
+def _paginate(model, query, hints, filters):
+    """Applies pagination to a query.
+
+    Offset pagination skips ``offset`` rows, keyset pagination seeks past
+    the ``marker`` primary key instead, which stays cheap however deep the
+    page is. The total is only counted when it was asked for.
+
+    :param model: table model
+    :param query: query to apply pagination to
+    :param hints: contains the pagination and limit details.
+    :param filters: the filters that were applied to the query.
+
+    :returns: updated query
+
+    """
+    pagination = hints.pagination
+    if pagination['count_total']:
+        pagination['total'] = _count_total(model, query, hints, filters)
+
+    query = query.order_by(model.id)
+    if pagination['marker'] is not None:
+        query = query.filter(model.id > pagination['marker'])
+    elif pagination['offset']:
+        query = query.offset(pagination['offset'])
+
+    limit = pagination['limit']
+    if hints.limit and (limit is None or hints.limit['limit'] < limit):
+        limit = hints.limit['limit']
+    if limit is not None:
+        query = query.limit(limit)
+
+    pagination['paginated'] = True
+    return query
+
+
 def filter_limit_query(model, query, hints):
-    """Applies filtering and limit to a query.
+    """Applies filtering, pagination and limit to a query.
 
     :param model: table model
     :param query: query to apply filters to
-    :param hints: contains the list of filters and limit details.  This may
-                  be None, indicating that there are no filters or limits
-                  to be applied. If it's not None, then any filters
-                  satisfied here will be removed so that the caller will
-                  know if any filters remain.
+    :param hints: contains the list of filters, pagination and limit
+                  details.  This may be None, indicating that there are no
+                  filters or limits to be applied. If it's not None, then
+                  any filters satisfied here will be removed so that the
+                  caller will know if any filters remain.
 
     :returns: updated query
 
@@ -366,6 +424,8 @@ def filter_limit_query(model, query, hints):
     if hints is None:
         return query
 
+    filters = list(hints.filters)
+
     # First try and satisfy any filters
     query = _filter(model, query, hints)
 
@@ -376,10 +436,11 @@ def filter_limit_query(model, query, hints):
     # unsatisfied filters, we have to leave any limiting to the controller
     # as well.
 
-    if not hints.filters:
-        return _limit(query, hints)
-    else:
+    if hints.filters:
         return query
+    if hints.pagination:
+        return _paginate(model, query, hints, filters)
+    return _limit(query, hints)
 
 
 def handle_conflicts(conflict_type='object'):
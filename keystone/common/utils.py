@@ -30,6 +30,7 @@ import six
 from six import moves
 
 from keystone.common import config
+from keystone.common import process_pool
 from keystone import exception
 from keystone.i18n import _
 from keystone.openstack.common import log
@@ -47,14 +48,17 @@ def flatten_dict(d, parent_key=''):
     dictionary, with dotted notation for each key.
 
     """
-    items = []
-    for k, v in d.items():
-        new_key = parent_key + '.' + k if parent_key else k
+    flat = {}
+    _flatten_dict_into(flat, d, parent_key + '.' if parent_key else '')
+    return flat
+
+
+def _flatten_dict_into(flat, d, prefix):
+    for k, v in six.iteritems(d):
         if isinstance(v, collections.MutableMapping):
-            items.extend(flatten_dict(v, new_key).items())
+            _flatten_dict_into(flat, v, prefix + k + '.')
         else:
-            items.append((new_key, v))
-    return dict(items)
+            flat[prefix + k] = v
 
 
 def read_cached_file(filename, cache_info, reload_func=None):
@@ -124,11 +128,19 @@ def hash_user_password(user):
     return dict(user, password=hash_password(password))
 
 
+def _encrypt_password(password_utf8, rounds):
+    return passlib.hash.sha512_crypt.encrypt(password_utf8, rounds=rounds)
+
+
+def _verify_password(password_utf8, hashed):
+    return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
+
+
 def hash_password(password):
     """Hash a password. Hard."""
     password_utf8 = verify_length_and_trunc_password(password).encode('utf-8')
-    return passlib.hash.sha512_crypt.encrypt(
-        password_utf8, rounds=CONF.crypt_strength)
+    return process_pool.execute(_encrypt_password, password_utf8,
+                                CONF.crypt_strength)
 
 
 def check_password(password, hashed):
@@ -141,7 +153,7 @@ def check_password(password, hashed):
     if password is None or hashed is None:
         return False
     password_utf8 = verify_length_and_trunc_password(password).encode('utf-8')
-    return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
+    return process_pool.execute(_verify_password, password_utf8, hashed)
 
 
 def attr_as_boolean(val_attr):
@@ -67,6 +67,7 @@ class EndpointFilterV3Controller(_ControllerBase):
             notifications.ACTIONS.deleted, 'endpoint',
             self._on_project_or_endpoint_delete)
 
+    @notifications.deferrable
     def _on_project_or_endpoint_delete(self, service, resource_type, operation,
                                        payload):
         project_or_endpoint_id = payload['resource_info']
@@ -227,6 +228,7 @@ class ProjectEndpointGroupV3Controller(_ControllerBase):
             notifications.ACTIONS.deleted, 'project',
             self._on_project_delete)
 
+    @notifications.deferrable
     def _on_project_delete(self, service, resource_type,
                            operation, payload):
         project_id = payload['resource_info']
@@ -13,9 +13,11 @@
 # under the License.
 
 import abc
+import uuid
 
 import six
 
+from keystone.common import cache
 from keystone.common import dependency
 from keystone.common import extension
 from keystone.common import manager
@@ -26,6 +28,9 @@ from keystone.openstack.common import log
 
 CONF = config.CONF
 LOG = log.getLogger(__name__)
+SHOULD_CACHE = cache.should_cache_fn('endpoint_filter')
+
+EXPIRATION_TIME = lambda: CONF.endpoint_filter.cache_time
 
 extension_data = {
     'name': 'OpenStack Keystone Endpoint Filter API',
@@ -60,40 +65,113 @@ class Manager(manager.Manager):
     def __init__(self):
         super(Manager, self).__init__(CONF.endpoint_filter.driver)
 
-    def list_filtered_endpoints_for_project(self, project_id):
-        refs = self.driver.list_endpoints_for_project(project_id)
-        filtered_endpoints = {
-            ref['endpoint_id']: self.catalog_api.get_endpoint(
-                ref['endpoint_id']) for ref in refs}
-
-        all_endpoints = self.catalog_api.list_endpoints()
-        group_project_associations = (
-            self.driver.list_endpoint_groups_for_project(project_id))
-
-        all_filters = []
-        for association in group_project_associations:
-            endpoint_group = self.driver.get_endpoint_group(
-                association.endpoint_group_id)
-            all_filters.append(endpoint_group['filters'])
-
-        def _apply_filters(filters, endpoint):
-            is_candidate = True
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _get_filter_generation(self):
+        return uuid.uuid4().hex
+
+    def _invalidate_filters(self):
+        self._get_filter_generation.invalidate(self)
+
+    def add_endpoint_to_project(self, endpoint_id, project_id):
+        self.driver.add_endpoint_to_project(endpoint_id, project_id)
+        self._invalidate_filters()
+
+    def remove_endpoint_from_project(self, endpoint_id, project_id):
+        self.driver.remove_endpoint_from_project(endpoint_id, project_id)
+        self._invalidate_filters()
+
+    def delete_association_by_endpoint(self, endpoint_id):
+        self.driver.delete_association_by_endpoint(endpoint_id)
+        self._invalidate_filters()
+
+    def delete_association_by_project(self, project_id):
+        self.driver.delete_association_by_project(project_id)
+        self._invalidate_filters()
+
+    def update_endpoint_group(self, endpoint_group_id, endpoint_group):
+        ret = self.driver.update_endpoint_group(endpoint_group_id,
+                                                endpoint_group)
+        self._invalidate_filters()
+        return ret
+
+    def delete_endpoint_group(self, endpoint_group_id):
+        self.driver.delete_endpoint_group(endpoint_group_id)
+        self._invalidate_filters()
+
+    def add_endpoint_group_to_project(self, endpoint_group_id, project_id):
+        self.driver.add_endpoint_group_to_project(endpoint_group_id,
+                                                  project_id)
+        self._invalidate_filters()
+
+    def remove_endpoint_group_from_project(self, endpoint_group_id,
+                                           project_id):
+        self.driver.remove_endpoint_group_from_project(endpoint_group_id,
+                                                       project_id)
+        self._invalidate_filters()
+
+    def delete_endpoint_group_association_by_project(self, project_id):
+        self.driver.delete_endpoint_group_association_by_project(project_id)
+        self._invalidate_filters()
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _list_endpoint_ids_for_endpoint_group(self, endpoint_group_id,
+                                              filter_generation,
+                                              catalog_generation):
+        """Returns the ids of the endpoints matched by an endpoint group.
+
+        The generations are only part of the cache key, so that the result
+        is computed again after the group or the endpoints change.
+
+        """
+        filters = self.driver.get_endpoint_group(endpoint_group_id)['filters']
+        endpoint_ids = []
+        for endpoint in self.catalog_api.list_endpoints():
             for key, value in six.iteritems(filters):
                 if endpoint[key] != value:
-                    is_candidate = False
                     break
-            return is_candidate
+            else:
+                endpoint_ids.append(endpoint['id'])
+        return endpoint_ids
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _list_endpoint_ids_for_project(self, project_id, filter_generation,
+                                       catalog_generation):
+        endpoint_ids = set(ref.endpoint_id for ref in
+                           self.driver.list_endpoints_for_project(project_id))
 
         # NOTE(wanghong) the final result is the union of the results filtered
         # by associated endpoint_group
-        for endpoint in all_endpoints:
-            for filters in all_filters:
-                if (_apply_filters(filters, endpoint) and
-                        endpoint['id'] not in filtered_endpoints):
-                    filtered_endpoints[endpoint['id']] = endpoint
-                    break
+        for association in self.driver.list_endpoint_groups_for_project(
+                project_id):
+            endpoint_ids.update(self._list_endpoint_ids_for_endpoint_group(
+                association.endpoint_group_id, filter_generation,
+                catalog_generation))
+        return sorted(endpoint_ids)
+
+    def list_endpoint_ids_for_project(self, project_id):
+        """Returns the ids of the endpoints a project is restricted to.
+
+        Those are the endpoints associated with the project directly and
+        the ones matched by the endpoint groups associated with it. The
+        result is cached until an association, an endpoint group or the
+        catalog changes.
+
+        """
+        return self._list_endpoint_ids_for_project(
+            project_id, self._get_filter_generation(),
+            self.catalog_api.get_catalog_generation())
+
+    def list_filtered_endpoints_for_project(self, project_id):
+        endpoint_ids = self.list_endpoint_ids_for_project(project_id)
+        if not endpoint_ids:
+            return []
+        endpoint_ids = set(endpoint_ids)
+        return [endpoint for endpoint in self.catalog_api.list_endpoints()
+                if endpoint['id'] in endpoint_ids]
 
-        return [v for v in six.itervalues(filtered_endpoints)]
 
 @six.add_metaclass(abc.ABCMeta)
 class Driver(object):
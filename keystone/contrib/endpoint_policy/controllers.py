@@ -33,18 +33,22 @@ class EndpointPolicyV3Controller(controller.V3Controller):
         notifications.register_event_callback(
             'deleted', 'policy', self._on_policy_delete)
 
+    @notifications.deferrable
     def _on_endpoint_delete(self, service, resource_type, operation, payload):
         self.endpoint_policy_api.delete_association_by_endpoint(
             payload['resource_info'])
 
+    @notifications.deferrable
     def _on_service_delete(self, service, resource_type, operation, payload):
         self.endpoint_policy_api.delete_association_by_service(
             payload['resource_info'])
 
+    @notifications.deferrable
     def _on_region_delete(self, service, resource_type, operation, payload):
         self.endpoint_policy_api.delete_association_by_region(
             payload['resource_info'])
 
+    @notifications.deferrable
     def _on_policy_delete(self, service, resource_type, operation, payload):
         self.endpoint_policy_api.delete_association_by_polcy(
             payload['resource_info'])
@@ -10,9 +10,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import base64
+import copy
 import datetime
+import hashlib
 import os
 import subprocess
+import threading
 import uuid
 
 from oslo.utils import timeutils
@@ -23,9 +27,21 @@ from saml2 import samlp
 from saml2 import sigver
 import xmldsig
 
+try:
+    from cryptography import exceptions as crypto_exceptions
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography import x509
+    from lxml import etree
+except ImportError:
+    etree = None
+
 from keystone.common import config
 from keystone import exception
-from keystone.i18n import _, _LE
+from keystone.i18n import _, _LE, _LW
 from keystone.openstack.common import fileutils
 from keystone.openstack.common import log
 
@@ -33,6 +49,9 @@ from keystone.openstack.common import log
 LOG = log.getLogger(__name__)
 CONF = config.CONF
 
+_XML_SIGNERS = {}
+_XML_SIGNERS_LOCK = threading.Lock()
+
 
 class SAMLGenerator(object):
     """A class to generate SAML assertions."""
@@ -366,9 +385,163 @@ class SAMLGenerator(object):
         return signature
 
 
+def _dsig(tag):
+    return '{%s}%s' % (xmldsig.NAMESPACE, tag)
+
+
+def _base64_lines(data):
+    encoded = base64.b64encode(data)
+    return '\n'.join(encoded[i:i + 64] for i in range(0, len(encoded), 64))
+
+
+def _c14n(element):
+    return etree.tostring(element, method='c14n', exclusive=True,
+                          with_comments=False)
+
+
+class XMLSigner(object):
+    """Signs SAML assertions with a certificate and RSA key loaded once.
+
+    The signature template built by SAMLGenerator is filled in the same way
+    ``xmlsec1 --sign`` does it: the assertion is digested without its
+    enveloped signature after exclusive canonicalization, and the
+    canonicalized SignedInfo is signed with RSA-SHA1.
+
+    """
+
+    def __init__(self, certfile, keyfile):
+        backend = default_backend()
+        with open(certfile, 'rb') as f:
+            cert = x509.load_pem_x509_certificate(f.read(), backend)
+        with open(keyfile, 'rb') as f:
+            self._key = serialization.load_pem_private_key(f.read(), None,
+                                                           backend)
+        if not isinstance(self._key, rsa.RSAPrivateKey):
+            raise ValueError('only RSA signing keys are supported')
+        self._certificate = _base64_lines(
+            cert.public_bytes(serialization.Encoding.DER))
+
+    def sign(self, xml):
+        """Returns the serialized assertion with its signature filled in.
+
+        :raises: ValueError if the signature template isn't one this signer
+                 knows how to fill.
+
+        """
+        root = etree.fromstring(xml, etree.XMLParser(resolve_entities=False))
+        signature = root.find(_dsig('Signature'))
+        if signature is None:
+            raise ValueError('the assertion has no signature template')
+        signed_info = signature.find(_dsig('SignedInfo'))
+        reference = signed_info.find(_dsig('Reference'))
+        transforms = [transform.get('Algorithm') for transform in
+                      reference.iterfind('%s/%s' % (_dsig('Transforms'),
+                                                    _dsig('Transform')))]
+        x509_data = signature.find('%s/%s' % (_dsig('KeyInfo'),
+                                              _dsig('X509Data')))
+        if (reference.get('URI') != '#' + root.get('ID') or
+                transforms != [xmldsig.TRANSFORM_ENVELOPED,
+                               xmldsig.ALG_EXC_C14N] or
+                signed_info.find(_dsig('CanonicalizationMethod')).get(
+                    'Algorithm') != xmldsig.ALG_EXC_C14N or
+                signed_info.find(_dsig('SignatureMethod')).get(
+                    'Algorithm') != xmldsig.SIG_RSA_SHA1 or
+                reference.find(_dsig('DigestMethod')).get(
+                    'Algorithm') != xmldsig.DIGEST_SHA1 or
+                x509_data is None):
+            raise ValueError('unsupported signature template')
+
+        for child in list(x509_data):
+            x509_data.remove(child)
+        etree.SubElement(x509_data,
+                         _dsig('X509Certificate')).text = self._certificate
+
+        # NOTE(garcianavalon) the enveloped signature transform drops the
+        # Signature element but keeps the text around it.
+        unsigned = copy.deepcopy(root)
+        unsigned_signature = unsigned.find(_dsig('Signature'))
+        previous = unsigned_signature.getprevious()
+        if previous is None:
+            unsigned.text = (unsigned.text or '') + (
+                unsigned_signature.tail or '')
+        else:
+            previous.tail = (previous.tail or '') + (
+                unsigned_signature.tail or '')
+        unsigned.remove(unsigned_signature)
+        reference.find(_dsig('DigestValue')).text = base64.b64encode(
+            hashlib.sha1(_c14n(unsigned)).digest())
+
+        signature_value = self._key.sign(_c14n(signed_info),
+                                         padding.PKCS1v15(), hashes.SHA1())
+        signature.find(_dsig('SignatureValue')).text = _base64_lines(
+            signature_value)
+        return etree.tostring(root)
+
+
+def _get_xml_signer():
+    if not CONF.saml.in_process_signing or etree is None:
+        return None
+    certfile = CONF.saml.certfile
+    keyfile = CONF.saml.keyfile
+    try:
+        stamp = (os.stat(certfile).st_mtime, os.stat(keyfile).st_mtime)
+    except OSError:
+        # NOTE(garcianavalon) let xmlsec1 report the missing files.
+        return None
+
+    key = (certfile, keyfile)
+    entry = _XML_SIGNERS.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    with _XML_SIGNERS_LOCK:
+        entry = _XML_SIGNERS.get(key)
+        if entry is None or entry[0] != stamp:
+            try:
+                signer = XMLSigner(certfile, keyfile)
+            except (IOError, ValueError, TypeError,
+                    crypto_exceptions.UnsupportedAlgorithm) as e:
+                # NOTE(garcianavalon) TypeError is raised for encrypted keys.
+                LOG.warning(_LW('Unable to sign SAML assertions in process, '
+                                'falling back to xmlsec1: %s'), e)
+                signer = None
+            entry = (stamp, signer)
+            _XML_SIGNERS[key] = entry
+    return entry[1]
+
+
+def _serialize_assertion(assertion):
+    # NOTE(gyee): need to make the namespace prefixes explicit so
+    # they won't get reassigned when we wrap the assertion into
+    # SAML2 response
+    return assertion.to_string(nspair={'saml': saml2.NAMESPACE,
+                                       'xmldsig': xmldsig.NAMESPACE})
+
+
 def _sign_assertion(assertion):
     """Sign a SAML assertion.
 
+    The assertion is signed in process with the key and certificate of
+    the CONF, loaded once per process. ``xmlsec1`` is used instead when
+    in process signing is disabled or isn't possible.
+
+    :return: XML <Assertion> object
+
+    """
+    signer = _get_xml_signer()
+    if signer is not None:
+        try:
+            signed = signer.sign(_serialize_assertion(assertion))
+        except ValueError as e:
+            LOG.debug('Signing the assertion with xmlsec1: %s', e)
+        else:
+            return saml2.create_class_from_xml_string(saml.Assertion, signed)
+    return _sign_assertion_with_xmlsec1(assertion)
+
+
+def _sign_assertion_with_xmlsec1(assertion):
+    """Sign a SAML assertion with ``xmlsec1``.
+
     This method utilizes ``xmlsec1`` binary and signs SAML assertions in a
     separate process. ``xmlsec1`` cannot read input data from stdin so the
     prepared assertion needs to be serialized and stored in a temporary
@@ -398,12 +571,8 @@ def _sign_assertion(assertion):
                     '--id-attr:ID', 'Assertion']
 
     try:
-        # NOTE(gyee): need to make the namespace prefixes explicit so
-        # they won't get reassigned when we wrap the assertion into
-        # SAML2 response
-        file_path = fileutils.write_to_tempfile(assertion.to_string(
-            nspair={'saml': saml2.NAMESPACE,
-                    'xmldsig': xmldsig.NAMESPACE}))
+        file_path = fileutils.write_to_tempfile(
+            _serialize_assertion(assertion))
         command_list.append(file_path)
         process = subprocess.Popen(command_list,
                                    stdin=subprocess.PIPE,
@@ -25,8 +25,10 @@ from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import driver_hints
 from keystone.common import wsgi
+from keystone import exception
 from keystone.identity.controllers import UserV3, GroupV3
 from keystone.assignment.controllers import ProjectV3
+from keystone.i18n import _
 from keystone.openstack.common import log
 from keystone.openstack.common import versionutils
 import converter as conv
@@ -36,31 +38,70 @@ CONF = config.CONF
 LOG = log.getLogger(__name__)
 
 
+def _get_int_param(query_string, name):
+    try:
+        value = query_string[name]
+    except KeyError:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = -1
+    if value < 0:
+        raise exception.ValidationError(
+            message=_('%s must be a non-negative integer.') % name)
+    return value
+
+
 def pagination(context, hints=None):
-    """Enhance Hints with SCIM pagination info (limit and offset)"""
+    """Enhance Hints with SCIM pagination info (limit, offset and marker)
+
+    Besides ``count`` and ``startIndex``, a ``marker`` with the id of the
+    last resource of the previous page may be given to seek to the next
+    page instead of skipping ``startIndex`` resources.
+    """
     q = context['query_string']
     if hints is None:
         hints = driver_hints.Hints()
-    try:
-        hints.scim_limit = q['count']
-    except KeyError:
-        pass
-    try:
-        hints.scim_offset = q['startIndex']
-    except KeyError:
-        pass
+    expiration_time = None
+    if CONF.scim.caching:
+        expiration_time = CONF.scim.cache_time
+    hints.set_pagination(limit=_get_int_param(q, 'count'),
+                         offset=_get_int_param(q, 'startIndex'),
+                         marker=q.get('marker'),
+                         count_total=CONF.scim.count_total,
+                         total_expiration_time=expiration_time)
     return hints
 
 
-def get_scim_page_info(context, hints):
+def paginate(context, hints, refs):
+    """Return the requested page of refs and its SCIM page info.
+
+    Drivers that cannot paginate leave it to us, in which case the whole
+    list is sorted by id and sliced here.
+    """
+    page = hints.pagination
+    if not page['paginated']:
+        refs = sorted(refs, key=lambda ref: ref['id'])
+        page['total'] = len(refs)
+        if page['marker'] is not None:
+            refs = [ref for ref in refs if ref['id'] > page['marker']]
+        elif page['offset']:
+            refs = refs[page['offset']:]
+        if page['limit'] is not None:
+            refs = refs[:page['limit']]
+
+    total = page['total']
+    if total is None:
+        total = (page['offset'] or 0) + len(refs)
     page_info = {
-        "totalResults": hints.scim_total
+        "totalResults": total
     }
     if ('startIndex' in context['query_string']):
-        page_info["startIndex"] = hints.scim_offset
+        page_info["startIndex"] = page['offset']
     if ('count' in context['query_string']):
-        page_info["itemsPerPage"] = hints.scim_limit
-    return page_info
+        page_info["itemsPerPage"] = page['limit']
+    return refs, page_info
 
 
 def get_path(path):
@@ -152,7 +193,7 @@ class ScimUserV3Controller(UserV3):
             refs = self.identity_api.list_users(
                 domain_scope=self._get_domain_id_for_request(context),
                 hints=hints)
-        scim_page_info = get_scim_page_info(context, hints)
+        refs, scim_page_info = paginate(context, hints, refs)
         return conv.listusers_key2scim(refs, context['path'], scim_page_info)
 
     def get_user(self, context, user_id):
@@ -208,7 +249,7 @@ class ScimRoleV3Controller(controller.V3Controller):
         except KeyError:
             pass
         refs = self.assignment_api.list_roles(hints=pagination(context, hints))
-        scim_page_info = get_scim_page_info(context, hints)
+        refs, scim_page_info = paginate(context, hints, refs)
         return conv.listroles_key2scim(refs, context['path'], scim_page_info)
 
     @controller.protected()
@@ -261,7 +302,7 @@ class ScimGroupV3Controller(GroupV3):
             refs = self.identity_api.list_groups(
                 domain_scope=self._get_domain_id_for_request(context),
                 hints=hints)
-        scim_page_info = get_scim_page_info(context, hints)
+        refs, scim_page_info = paginate(context, hints, refs)
         return conv.listgroups_key2scim(refs, context['path'], scim_page_info)
 
     def get_group(self, context, group_id):
@@ -307,8 +348,8 @@ class ScimOrganizationV3Controller(ProjectV3):
     @controller.filterprotected('domain_id', 'enabled', 'name')
     def list_organizations(self, context, filters):
         hints = pagination(context, ProjectV3.build_driver_hints(context, filters))
-        refs = self.assignment_api.list_projects(hints=pagination(context, hints))
-        scim_page_info = get_scim_page_info(context, hints)
+        refs = self.assignment_api.list_projects(hints=hints)
+        refs, scim_page_info = paginate(context, hints, refs)
         return conv.listorganizations_key2scim(refs, context['path'], scim_page_info)
 
     def get_organization(self, context, organization_id):
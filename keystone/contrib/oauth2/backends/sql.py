@@ -12,14 +12,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
 import uuid
 
 from keystone.common import sql
 from keystone.contrib import oauth2
 from keystone import exception
-from keystone.i18n import _
+from keystone.i18n import _, _LI
+from keystone.openstack.common import log
 from oslo.utils import timeutils
 
+
+LOG = log.getLogger(__name__)
+
 # TODO(garcianavalon) configuration options
 VALID_RESPONSE_TYPES = sql.Enum('code', 'token')
 VALID_CLIENT_TYPES = sql.Enum('confidential')
@@ -52,8 +57,7 @@ class AuthorizationCode(sql.ModelBase, sql.DictBase):
     consumer_id = sql.Column(sql.String(64), sql.ForeignKey('consumer_oauth2.id'),
                              nullable=False, index=True)
     authorizing_user_id = sql.Column(sql.String(64), nullable=False)
-    # TODO(garcianavalon) datetime type or similar?
-    expires_at = sql.Column(sql.String(64), nullable=False)
+    expires_at = sql.Column(sql.DateTime(), nullable=False, index=True)
     scopes = sql.Column(sql.JsonBlob(), nullable=True)
     state = sql.Column(sql.String(256), nullable=True)
     redirect_uri = sql.Column(sql.String(256), nullable=False)
@@ -88,13 +92,56 @@ class AccessToken(sql.ModelBase, sql.DictBase):
     # NOTE(garcianavalon) if the consumers uses the client credentials grant
     # there is no authorizing user, so it should be nullable.
     authorizing_user_id = sql.Column(sql.String(64), nullable=True)
-    # TODO(garcianavalon) datetime type or similar?
-    expires_at = sql.Column(sql.String(64), nullable=False)
+    expires_at = sql.Column(sql.DateTime(), nullable=False, index=True)
     scopes = sql.Column(sql.JsonBlob(), nullable=True)
-    refresh_token = sql.Column(sql.String(64), nullable=True)
+    refresh_token = sql.Column(sql.String(64), nullable=True, unique=True,
+                               index=True)
     valid = sql.Column(sql.Boolean(), default=True, nullable=False)
     extra = sql.Column(sql.JsonBlob(), nullable=True)
 
+def _expiry_range_batched(session, column, criteria, upper_bound_func,
+                          batch_size):
+    """Returns the stop point of the next batch for expiration.
+
+    Works like the token backend strategy of the same name, for any
+    indexed expiry ``column`` and extra filter ``criteria``.
+    """
+    LOG.info(_LI('OAuth2 expiration batch size: %d') % batch_size)
+    query = session.query(column)
+    query = query.filter(column < upper_bound_func(), *criteria)
+    query = query.order_by(column)
+    query = query.offset(batch_size - 1)
+    query = query.limit(1)
+    while True:
+        try:
+            next_expiration = query.one()[0]
+        except sql.NotFound:
+            # There are less than `batch_size` rows remaining, so fall
+            # through to the normal delete
+            break
+        yield next_expiration
+    yield upper_bound_func()
+
+
+def _expiry_range_all(session, column, criteria, upper_bound_func):
+    """Expires all rows in one pass."""
+
+    yield upper_bound_func()
+
+
+def _expiry_range_strategy(dialect):
+    """Choose a expiry range strategy.
+
+    Like the token backend, DB2 and MySQL (Galera) get a batched strategy
+    so a big purge doesn't exceed their transaction limits.
+    """
+    if dialect == 'ibm_db_sa':
+        return functools.partial(_expiry_range_batched, batch_size=100)
+    elif dialect == 'mysql':
+        return functools.partial(_expiry_range_batched, batch_size=1000)
+    return _expiry_range_all
+
+
 class OAuth2(oauth2.Driver):
     """ CRUD driver for the SQL backend """
     # CONSUMERS
@@ -239,6 +286,7 @@ class OAuth2(oauth2.Driver):
         session = sql.get_session()
         with session.begin():
             refs = session.query(AccessToken)
+            refs = refs.filter(AccessToken.expires_at > timeutils.utcnow())
             if user_id:
                 refs = refs.filter_by(authorizing_user_id=user_id)
         return [token.to_dict() for token in refs]
@@ -255,7 +303,9 @@ class OAuth2(oauth2.Driver):
     def get_access_token(self, access_token_id, user_id=None):
         session = sql.get_session()
         with session.begin():
-            access_token_ref = session.query(AccessToken).get(access_token_id)
+            query = session.query(AccessToken).filter_by(id=access_token_id)
+            query = query.filter(AccessToken.expires_at > timeutils.utcnow())
+            access_token_ref = query.first()
             self._check_access_token_ref(access_token_ref, access_token_id, user_id)
         return access_token_ref.to_dict()
 
@@ -288,4 +338,74 @@ class OAuth2(oauth2.Driver):
             if access_token_ref is None:
                 msg = _('Access Token for refresh token %s not found') %refresh_token
                 raise exception.NotFound(message=msg)
-        return access_token_ref.to_dict()
\ No newline at end of file
+        return access_token_ref.to_dict()
+
+    def rotate_access_token(self, refresh_token, access_token):
+        session = sql.get_session()
+        with session.begin():
+            previous_ref = session.query(AccessToken).filter_by(
+                refresh_token=refresh_token, valid=True).first()
+            # NOTE(garcianavalon) the conditional update makes concurrent
+            # refreshes with the same refresh token fail except for one.
+            updated = 0
+            if previous_ref is not None:
+                query = session.query(AccessToken).filter_by(
+                    id=previous_ref.id, valid=True)
+                updated = query.update({'valid': False},
+                                       synchronize_session=False)
+            if not updated:
+                msg = _('Access Token for refresh token %s not found'
+                        ) %refresh_token
+                raise exception.NotFound(message=msg)
+            previous_token = previous_ref.to_dict()
+            session.add(AccessToken.from_dict(access_token))
+        previous_token['valid'] = False
+        return previous_token
+
+    # EXPIRED DATA
+    def _flush_expired(self, session, model, criteria,
+                       upper_bound_func=timeutils.utcnow):
+        expiry_range_func = _expiry_range_strategy(session.bind.dialect.name)
+        query = session.query(model)
+        total_removed = 0
+        for expiry_time in expiry_range_func(session, model.expires_at,
+                                             criteria, upper_bound_func):
+            delete_query = query.filter(model.expires_at <= expiry_time,
+                                        *criteria)
+            total_removed += delete_query.delete(synchronize_session=False)
+            LOG.debug('Removed %(count)d rows from %(table)s',
+                      {'count': total_removed, 'table': model.__tablename__})
+        return total_removed
+
+    def flush_expired_tokens(self):
+        session = sql.get_session()
+
+        # NOTE(garcianavalon) an expired access token is still needed while
+        # its refresh token can be used, keep it unless it was revoked or
+        # the refresh token is too old.
+        removable = [AccessToken.refresh_token == sql.sql.null(),
+                     AccessToken.valid == sql.sql.false()]
+        cutoff = oauth2.refresh_token_cutoff()
+        if cutoff is not None:
+            removable.append(AccessToken.expires_at <= cutoff)
+        removed = self._flush_expired(session, AccessToken,
+                                      criteria=[sql.sql.or_(*removable)])
+        LOG.info(_LI('Total expired OAuth2 access tokens removed: %d'),
+                 removed)
+
+        # authorization codes are useless once expired or used. Used codes
+        # that have not expired yet are removed in batches too, up to the
+        # latest expiry among them.
+        removed = self._flush_expired(session, AuthorizationCode,
+                                      criteria=[])
+        used = [AuthorizationCode.valid == sql.sql.false()]
+        last_expiry = session.query(
+            sql.sql.func.max(AuthorizationCode.expires_at)).filter(
+                *used).scalar()
+        if last_expiry is not None:
+            removed += self._flush_expired(
+                session, AuthorizationCode, criteria=used,
+                upper_bound_func=lambda: last_expiry)
+        LOG.info(_LI('Total expired or used OAuth2 authorization codes '
+                     'removed: %d'), removed)
+        session.flush()
@@ -22,13 +22,18 @@ from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import wsgi
 from keystone.contrib.oauth2 import core
-from keystone.contrib.oauth2 import validator
 from keystone.i18n import _
 from keystone.models import token_model
 from keystone.openstack.common import log
+from oslo.utils import timeutils
 
 LOG = log.getLogger(__name__)
 
+
+def _format_expires_at(ref):
+    ref['expires_at'] = timeutils.isotime(ref['expires_at'], subsecond=True)
+    return ref
+
 @dependency.requires('oauth2_api')
 class ConsumerCrudV3(controller.V3Controller):
 
@@ -84,7 +89,8 @@ class AuthorizationCodeEndpointV3(controller.V3Controller):
     @controller.protected()
     def list_authorization_codes(self, context):
         """Description of the controller logic."""
-        ref = self.oauth2_api.list_authorization_codes()
+        ref = [_format_expires_at(code)
+               for code in self.oauth2_api.list_authorization_codes()]
         return AuthorizationCodeEndpointV3.wrap_collection(context, ref)
 
 @dependency.requires('oauth2_api')
@@ -109,13 +115,15 @@ class AccessTokenEndpointV3(controller.V3Controller):
     @controller.protected()
     def list_access_tokens(self, context, user_id):
         """List authorized access tokens. """
-        ref = self.oauth2_api.list_access_tokens(user_id=user_id)
+        ref = [_format_expires_at(token) for token
+               in self.oauth2_api.list_access_tokens(user_id=user_id)]
         return AccessTokenEndpointV3.wrap_collection(context, ref)
 
     @controller.protected()
     def get_access_token(self, context, user_id, access_token_id):
         """Get access token. """
         ref = self.oauth2_api.get_access_token(access_token_id, user_id=user_id)
+        ref = _format_expires_at(ref)
         return AccessTokenEndpointV3.wrap_member(context, ref)
 
     @controller.protected()
@@ -138,8 +146,7 @@ class OAuth2ControllerV3(controller.V3Controller):
 
     @controller.protected()
     def request_authorization_code(self, context):
-        request_validator = validator.OAuth2Validator()
-        server = core.Server(request_validator)
+        server = core.get_server()
         # Validate request
         headers = context['headers']
         body = context['query_string']
@@ -229,8 +236,7 @@ class OAuth2ControllerV3(controller.V3Controller):
 
     # @controller.protected()
     def create_authorization_code(self, context, user_auth):
-        request_validator = validator.OAuth2Validator()
-        server = core.Server(request_validator)
+        server = core.get_server()
         # Validate request
         headers = context['headers']
         body = user_auth
@@ -295,8 +301,7 @@ class OAuth2ControllerV3(controller.V3Controller):
             raise exception.ValidationError(message=msg)
 
     def create_access_token(self, context, token_request):
-        request_validator = validator.OAuth2Validator()
-        server = core.Server(request_validator)
+        server = core.get_server()
 
         # Validate request
         headers = context['headers']
@@ -15,19 +15,32 @@
 from __future__ import absolute_import
 
 import abc
+import datetime
+import threading
+import uuid
+
 import six
 
+from keystone import config
 from keystone import exception
 from keystone import notifications
+from keystone.common import cache
 from keystone.common import dependency
 from keystone.common import extension
 from keystone.common import manager
+from keystone.common import utils
 from keystone.openstack.common import log
 
 from oauthlib import oauth2 as oauth2lib
+from oslo.utils import timeutils
 
 
+CONF = config.CONF
 LOG = log.getLogger(__name__)
+SHOULD_CACHE = cache.should_cache_fn('oauth2')
+
+# NOTE(garcianavalon): The config option is not available at import time.
+EXPIRATION_TIME = lambda: CONF.oauth2.cache_time
 
 EXTENSION_DATA = {
     'name': 'OpenStack OAUTH2 API',
@@ -60,6 +73,17 @@ def filter_consumer(consumer_ref):
         consumer_ref.pop('secret', None)
     return consumer_ref
 
+
+def refresh_token_cutoff():
+    """Returns the expiry of the access tokens whose refresh tokens are
+    too old to be used, or None if refresh tokens never get too old.
+
+    """
+    max_age = CONF.oauth2.refresh_token_max_age
+    if not max_age:
+        return None
+    return timeutils.utcnow() - datetime.timedelta(seconds=max_age)
+
 class Server(oauth2lib.AuthorizationEndpoint, oauth2lib.TokenEndpoint, 
              oauth2lib.ResourceEndpoint, oauth2lib.RevocationEndpoint):
 
@@ -112,6 +136,37 @@ class Server(oauth2lib.AuthorizationEndpoint, oauth2lib.TokenEndpoint,
 
 
 
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def get_server():
+    """Get the OAuth2 Server shared by every request in this process.
+
+    Building the grants and endpoints is not free, so it is done once.
+    Neither the server nor the validator keep per-request state, that
+    lives in the oauthlib Request, so they are safe to share between
+    threads and greenlets.
+
+    """
+    global _SERVER
+    if _SERVER is None:
+        with _SERVER_LOCK:
+            if _SERVER is None:
+                # NOTE(garcianavalon) the validator imports the auth plugins,
+                # which import this module.
+                from keystone.contrib.oauth2 import validator
+                _SERVER = Server(validator.OAuth2Validator())
+    return _SERVER
+
+
+def reset_server():
+    """Drop the shared OAuth2 Server, it is built again when needed."""
+    global _SERVER
+    with _SERVER_LOCK:
+        _SERVER = None
+
+
 @dependency.provider('oauth2_api')
 class Manager(manager.Manager):
     """Manager.
@@ -121,6 +176,7 @@ class Manager(manager.Manager):
 
     """
     _CONSUMER = 'consumer_oauth2'
+    _ACCESS_TOKEN = 'access_token_oauth2'
 
     def __init__(self):
         super(Manager, self).__init__(
@@ -133,7 +189,8 @@ class Manager(manager.Manager):
     @notifications.deleted(_CONSUMER)
     def delete_consumer(self, consumer_id):
         ret_val = self.driver.delete_consumer(consumer_id)
-        
+        self._get_client.invalidate(self, consumer_id)
+
         # delete all the stored credentials
         self.driver.delete_consumer_credentials(consumer_id)
 
@@ -141,13 +198,14 @@ class Manager(manager.Manager):
         self.driver.delete_authorization_codes(consumer_id)
 
         # and the issued tokens
-        self.driver.delete_access_tokens(consumer_id)
+        self.delete_access_tokens(consumer_id)
 
         return ret_val
 
     @notifications.updated(_CONSUMER)
     def update_consumer(self, consumer_id, consumer_ref):
         ret_val = self.driver.update_consumer(consumer_id, consumer_ref)
+        self._get_client.invalidate(self, consumer_id)
         # TODO(garcianavalon) also delete on scopes or grant_type changes
         if 'redirect_uris' not in consumer_ref:
             return ret_val
@@ -159,10 +217,133 @@ class Manager(manager.Manager):
         self.driver.delete_authorization_codes(consumer_id)
 
         # and the issued tokens
-        self.driver.delete_access_tokens(consumer_id)
+        self.delete_access_tokens(consumer_id)
 
         return ret_val
 
+    @notifications.disabled(_ACCESS_TOKEN, public=False)
+    def revoke_access_token(self, access_token_id, user_id=None):
+        ret_val = self.driver.revoke_access_token(access_token_id,
+                                                  user_id=user_id)
+        self._invalidate_bearer_token(access_token_id)
+        return ret_val
+
+    def store_access_token(self, access_token):
+        ret_val = self.driver.store_access_token(access_token)
+        # drop a possible negative entry for this id
+        self._invalidate_bearer_token(access_token['id'])
+        return ret_val
+
+    def rotate_access_token(self, refresh_token, access_token):
+        previous_token = self.driver.rotate_access_token(refresh_token,
+                                                         access_token)
+        self._invalidate_bearer_token(previous_token['id'])
+        self._invalidate_bearer_token(access_token['id'])
+        return previous_token
+
+    def delete_access_tokens(self, client_id):
+        ret_val = self.driver.delete_access_tokens(client_id)
+        # NOTE(garcianavalon) we don't know the ids of the deleted tokens,
+        # so every cached token is moved to a new generation.
+        self._get_bearer_token_generation.invalidate(self)
+        return ret_val
+
+    # CLIENT AUTHENTICATION
+    def get_client(self, client_id):
+        """Get a consumer as needed by the OAuth2 flow.
+
+        The consumer is cached, so the several lookups made while
+        processing a single OAuth2 request read it from the backend at
+        most once. Only a digest of the secret is kept in the cache.
+
+        :param client_id: id of the consumer
+        :type client_id: string
+        :returns: consumer without secret
+
+        """
+        client = self._get_client(client_id).copy()
+        client.pop('secret_digest')
+        return client
+
+    def check_client_secret(self, client_id, secret):
+        """Check the secret of a consumer in constant time.
+
+        :param client_id: id of the consumer
+        :type client_id: string
+        :param secret: the secret sent by the client
+        :type secret: string
+        :returns: True if the secret is the consumer one
+
+        """
+        client = self._get_client(client_id)
+        return utils.auth_str_equal(utils.hash_access_key(secret),
+                                    client['secret_digest'])
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _get_client(self, client_id):
+        client = self.driver.get_consumer_with_secret(client_id)
+        client['secret_digest'] = utils.hash_access_key(
+            client.pop('secret'))
+        return client
+
+    # BEARER TOKEN VALIDATION
+    def get_bearer_token(self, access_token_id):
+        """Get the access token data needed to validate a bearer token.
+
+        Lookups are cached, including the ones for unknown tokens which
+        are remembered for ``[oauth2] negative_cache_time`` seconds.
+        The caller must check ``expires_at`` because cached tokens are
+        kept after they expire.
+
+        :param access_token_id: the access_token_id (the string itself)
+        :type access_token_id: string
+        :returns: dict with the id, consumer_id, authorizing_user_id,
+            scopes, valid and expires_at (datetime) of the access token or
+            None if it does not exist
+
+        """
+        generation = self._get_bearer_token_generation()
+        token = self._get_bearer_token(access_token_id, generation)
+        if 'not_found_until' not in token:
+            return token
+        if token['not_found_until'] > timeutils.utcnow():
+            return None
+        # the negative entry is stale, look the token up again
+        self._get_bearer_token.invalidate(self, access_token_id, generation)
+        token = self._get_bearer_token(access_token_id, generation)
+        return None if 'not_found_until' in token else token
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _get_bearer_token(self, access_token_id, generation):
+        try:
+            access_token = self.driver.get_access_token(access_token_id)
+        except exception.NotFound:
+            not_found_until = timeutils.utcnow() + datetime.timedelta(
+                seconds=CONF.oauth2.negative_cache_time)
+            return {'id': access_token_id,
+                    'not_found_until': not_found_until}
+
+        # NOTE(garcianavalon) the refresh token is left out on purpose, it
+        # is not needed to validate a request and it shouldn't be cached.
+        return {
+            'id': access_token['id'],
+            'consumer_id': access_token['consumer_id'],
+            'authorizing_user_id': access_token['authorizing_user_id'],
+            'scopes': access_token['scopes'],
+            'valid': access_token['valid'],
+            'expires_at': access_token['expires_at'],
+        }
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE)
+    def _get_bearer_token_generation(self):
+        return uuid.uuid4().hex
+
+    def _invalidate_bearer_token(self, access_token_id):
+        self._get_bearer_token.invalidate(
+            self, access_token_id, self._get_bearer_token_generation())
+
 
 @dependency.requires('identity_api')
 @six.add_metaclass(abc.ABCMeta)
@@ -341,7 +522,7 @@ class Driver(object):
     # ACCESS TOKEN
     @abc.abstractmethod
     def list_access_tokens(self, user_id=None):
-        """Lists all the access tokens granted by a user.
+        """Lists all the unexpired access tokens granted by a user.
 
         :param user_id: optional filter to check the token belongs to a user
         :type user_id: string
@@ -353,7 +534,7 @@ class Driver(object):
     @abc.abstractmethod
     def get_access_token(self, access_token_id, user_id=None):
         """Get an already existent access_token. If exposed by the Identity
-         API, use the user_id check.
+         API, use the user_id check. Expired tokens are not found.
 
         :param access_token_id: the access_token_id (the string itself)
         :type access_token_id: string
@@ -410,4 +591,30 @@ class Driver(object):
         :returns: access_token as dict
 
         """
-        raise exception.NotImplemented()
\ No newline at end of file
+        raise exception.NotImplemented()
+
+    @abc.abstractmethod
+    def rotate_access_token(self, refresh_token, access_token):
+        """Stores the access token issued in a refresh grant and invalidates
+        the one the refresh token belonged to, atomically. A refresh token
+        can only be used once.
+
+        :param refresh_token: The refresh token used in the grant.
+        :type refresh_token: string
+        :param access_token: The new access token, with its own refresh token
+        :type access_token: dict
+        :returns: the invalidated access_token as dict
+
+        """
+        raise exception.NotImplemented()
+
+    @abc.abstractmethod
+    def flush_expired_tokens(self):
+        """Deletes expired access tokens and expired or used authorization
+        codes. Expired access tokens are kept while their refresh token can
+        still be used.
+
+        :returns: Nothing
+
+        """
+        raise exception.NotImplemented()
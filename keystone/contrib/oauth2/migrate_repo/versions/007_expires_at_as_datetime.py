@@ -0,0 +1,128 @@
+# Copyright (C) 2014 Universidad Politecnica de Madrid
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import calendar
+import datetime
+import time
+
+import sqlalchemy as sql
+from oslo.utils import timeutils
+
+
+TEMPORARY_COLUMN = 'expires_at_tmp'
+ACCESS_TOKEN_FORMAT = '%Y-%m-%d %H:%M:%S'
+# NOTE(garcianavalon) rows are read and updated by primary key ranges so
+# big tables are never loaded in memory and every batch is a single
+# executemany UPDATE.
+BATCH_SIZE = 1000
+
+
+def _parse(value):
+    # NOTE(garcianavalon) anything we can't parse is considered already
+    # expired so oauth2_flush removes it.
+    try:
+        return timeutils.normalize_time(timeutils.parse_isotime(value))
+    except ValueError:
+        return datetime.datetime(1970, 1, 1)
+
+
+def _access_token_to_datetime(value):
+    # NOTE(garcianavalon) access tokens were stored as 'YYYY-MM-DD HH:MM:SS'
+    # in the local time of the server (datetime.today()), shift them to UTC.
+    # This assumes the migration runs with the same timezone as the servers
+    # that issued the tokens.
+    local = _parse(value)
+    return datetime.datetime.utcfromtimestamp(time.mktime(local.timetuple()))
+
+
+def _access_token_to_string(value):
+    local = datetime.datetime.fromtimestamp(
+        calendar.timegm(value.timetuple()))
+    return local.strftime(ACCESS_TOKEN_FORMAT)
+
+
+def _authorization_code_to_datetime(value):
+    # authorization codes were stored as UTC ISO 8601 strings
+    return _parse(value)
+
+
+def _authorization_code_to_string(value):
+    return timeutils.isotime(value, subsecond=True)
+
+
+# table name -> (primary key column, upgrade conversion,
+#                downgrade conversion)
+TABLES = {
+    'access_token_oauth2': (
+        'id', _access_token_to_datetime, _access_token_to_string),
+    'authorization_code_oauth2': (
+        'code', _authorization_code_to_datetime,
+        _authorization_code_to_string),
+}
+
+
+def _copy_column(migrate_engine, table, primary_key, convert):
+    update = table.update().where(
+        primary_key == sql.bindparam('key')).values(
+            {TEMPORARY_COLUMN: sql.bindparam('value')})
+    last_key = None
+    while True:
+        query = sql.select([primary_key, table.c.expires_at])
+        if last_key is not None:
+            query = query.where(primary_key > last_key)
+        query = query.order_by(primary_key).limit(BATCH_SIZE)
+        rows = migrate_engine.execute(query).fetchall()
+        if not rows:
+            return
+        migrate_engine.execute(update, [
+            {'key': key, 'value': convert(expires_at)}
+            for key, expires_at in rows])
+        last_key = rows[-1][0]
+
+
+def _migrate_column(migrate_engine, table_name, new_type, convert):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    table = sql.Table(table_name, meta, autoload=True)
+    primary_key = table.c[TABLES[table_name][0]]
+
+    new_column = sql.Column(TEMPORARY_COLUMN, new_type, nullable=True)
+    new_column.create(table)
+    _copy_column(migrate_engine, table, primary_key, convert)
+
+    table.c.expires_at.drop()
+    table = sql.Table(table_name, sql.MetaData(bind=migrate_engine),
+                      autoload=True)
+    table.c[TEMPORARY_COLUMN].alter(name='expires_at', nullable=False)
+    return sql.Table(table_name, sql.MetaData(bind=migrate_engine),
+                     autoload=True)
+
+
+def upgrade(migrate_engine):
+    for table_name in TABLES:
+        table = _migrate_column(migrate_engine, table_name,
+                                sql.DateTime(), TABLES[table_name][1])
+        sql.Index('ix_%s_expires_at' % table_name,
+                  table.c.expires_at).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    for table_name in TABLES:
+        meta = sql.MetaData()
+        meta.bind = migrate_engine
+        table = sql.Table(table_name, meta, autoload=True)
+        sql.Index('ix_%s_expires_at' % table_name,
+                  table.c.expires_at).drop(migrate_engine)
+        _migrate_column(migrate_engine, table_name,
+                        sql.String(64), TABLES[table_name][2])
@@ -0,0 +1,34 @@
+# Copyright (C) 2014 Universidad Politecnica de Madrid
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sqlalchemy as sql
+
+
+INDEX_NAME = 'ix_access_token_oauth2_refresh_token'
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    access_token_table = sql.Table('access_token_oauth2', meta, autoload=True)
+    sql.Index(INDEX_NAME, access_token_table.c.refresh_token,
+              unique=True).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    access_token_table = sql.Table('access_token_oauth2', meta, autoload=True)
+    sql.Index(INDEX_NAME, access_token_table.c.refresh_token,
+              unique=True).drop(migrate_engine)
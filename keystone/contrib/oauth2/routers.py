@@ -61,6 +61,8 @@ class OAuth2Extension(wsgi.V3ExtensionRouter):
         access_token_controller = controllers.AccessTokenEndpointV3()
         authorization_code_controller = controllers.AuthorizationCodeEndpointV3()
         oauth2_controller = controllers.OAuth2ControllerV3() 
+        # build the OAuth2 server shared by all the requests of this worker
+        oauth2.get_server()
 
         # Admin only consumer CRUD
         self._add_resource(
@@ -17,6 +17,8 @@ import datetime
 from keystone import exception
 from keystone.auth import plugins as auth_plugins
 from keystone.common import dependency
+from keystone.contrib.oauth2 import core as oauth2
+from keystone.i18n import _
 from keystone.openstack.common import log
 from oauthlib.oauth2 import RequestValidator
 
@@ -33,7 +35,7 @@ class OAuth2Validator(RequestValidator):
     # Pre- and post-authorization.
     def validate_client_id(self, client_id, request, *args, **kwargs):
         # Simple validity check, does client exist? Not banned?
-        client_dict = self.oauth2_api.get_consumer(client_id)
+        client_dict = self.oauth2_api.get_client(client_id)
         if client_dict:
             return True
         # NOTE(garcianavalon) Currently the sql driver raises an exception 
@@ -45,7 +47,7 @@ class OAuth2Validator(RequestValidator):
     def validate_redirect_uri(self, client_id, redirect_uri, request, *args, **kwargs):
         # Is the client allowed to use the supplied redirect_uri? i.e. has
         # the client previously registered this EXACT redirect uri.
-        client_dict = self.oauth2_api.get_consumer(client_id)
+        client_dict = self.oauth2_api.get_client(client_id)
         registered_uris = client_dict['redirect_uris']  
         return redirect_uri in registered_uris
 
@@ -61,7 +63,7 @@ class OAuth2Validator(RequestValidator):
         if not scopes:
             return True # the client is not requesting any scope
 
-        client_dict = self.oauth2_api.get_consumer(client_id)
+        client_dict = self.oauth2_api.get_client(client_id)
 
         if not client_dict['scopes']:
             return False # the client isnt allowed any scopes
@@ -110,8 +112,7 @@ class OAuth2Validator(RequestValidator):
         # TODO(garcianavalon) find a better place to do this
         now = timeutils.utcnow()
         future = now + datetime.timedelta(seconds=token_duration)
-        expiry_date = timeutils.isotime(future, subsecond=True)
-        authorization_code['expires_at'] = expiry_date
+        authorization_code['expires_at'] = future
         self.oauth2_api.store_authorization_code(authorization_code)
 
     # Token request
@@ -124,8 +125,8 @@ class OAuth2Validator(RequestValidator):
         if authmethod.lower() == 'basic':
             auth = auth.decode('base64')
             client_id, secret = auth.split(':', 1)
-            client_dict = self.oauth2_api.get_consumer_with_secret(client_id)
-            if client_dict['secret'] == secret:
+            if self.oauth2_api.check_client_secret(client_id, secret):
+                client_dict = self.oauth2_api.get_client(client_id)
                 # TODO(garcianavalon) this can be done in a cleaner way 
                 #if we change the consumer model attribute to client_id
                 request.client = type('obj', (object,), 
@@ -207,16 +208,29 @@ class OAuth2Validator(RequestValidator):
         else:
             user_id = request.user_id
 
-        expires_at = datetime.datetime.today() + datetime.timedelta(seconds=token['expires_in'])
+        expires_at = timeutils.utcnow() + datetime.timedelta(seconds=token['expires_in'])
         access_token = {
             'id':token['access_token'],
             'consumer_id':consumer_id,
             'authorizing_user_id':user_id,
             'scopes': request.scopes,
-            'expires_at':datetime.datetime.strftime(expires_at, '%Y-%m-%d %H:%M:%S'),
+            'expires_at':expires_at,
             'refresh_token': token.get('refresh_token', None),
         }
-        self.oauth2_api.store_access_token(access_token)
+        if request.grant_type != 'refresh_token':
+            self.oauth2_api.store_access_token(access_token)
+            return
+
+        # NOTE(garcianavalon) the new token replaces the one the refresh
+        # token was issued with, they belong to the same family and share
+        # its scopes.
+        try:
+            self.oauth2_api.rotate_access_token(request.refresh_token,
+                                                access_token)
+        except exception.NotFound:
+            # the refresh token was used by a concurrent request
+            msg = _('Invalid refresh token')
+            raise exception.Unauthorized(message=msg)
 
     def invalidate_authorization_code(self, client_id, code, request, *args, **kwargs):
         # Authorization codes are use once, invalidate it when a Bearer token
@@ -226,13 +240,11 @@ class OAuth2Validator(RequestValidator):
     # Protected resource request
     def validate_bearer_token(self, token, scopes, request):
         # Remember to check expiration and scope membership
-        try:
-            access_token = self.oauth2_api.get_access_token(token)
-        except exception.NotFound:
+        access_token = self.oauth2_api.get_bearer_token(token)
+        if not access_token or not access_token['valid']:
             return False
 
-        if (datetime.datetime.strptime(access_token['expires_at'], '%Y-%m-%d %H:%M:%S') 
-            < datetime.datetime.today()):
+        if access_token['expires_at'] < timeutils.utcnow():
             return False
 
         if access_token['scopes'] != scopes:
@@ -256,8 +268,12 @@ class OAuth2Validator(RequestValidator):
         # return its scopes, these will be passed on to the refreshed
         # access token if the client did not specify a scope during the
         # request.
-        # TODO(garcianavalon)
-        return ['all_info']
+        try:
+            access_token = self.oauth2_api.get_access_token_by_refresh_token(
+                refresh_token)
+        except exception.NotFound:
+            return []
+        return access_token['scopes'] or []
 
     def is_within_original_scope(self, request_scopes, refresh_token, request, *args, **kwargs):
         """Check if requested scopes are within a scope of the refresh token.
@@ -275,8 +291,8 @@ class OAuth2Validator(RequestValidator):
         Method is used by:
             - Refresh token grant
         """
-        # TODO(garcianavalon)
-        return True
+        original_scopes = self.get_original_scopes(refresh_token, request)
+        return set(request_scopes).issubset(original_scopes)
 
     def validate_refresh_token(self, refresh_token, client, request, *args, **kwargs):
         """Ensure the Bearer token is valid and authorized access to scopes.
@@ -296,6 +312,16 @@ class OAuth2Validator(RequestValidator):
         except exception.NotFound:
             return False
 
+        # refresh tokens are used once, and only by the client they were
+        # issued to
+        if not access_token['valid']:
+            return False
+        if access_token['consumer_id'] != getattr(client, 'client_id', None):
+            return False
+        cutoff = oauth2.refresh_token_cutoff()
+        if cutoff is not None and access_token['expires_at'] <= cutoff:
+            return False
+
         request.user = access_token['authorizing_user_id']
         
         return True
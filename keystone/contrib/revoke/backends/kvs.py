@@ -71,3 +71,6 @@ class Revoke(revoke.Driver):
 
     def revoke(self, event):
         self._prune_expired_events_and_get(new_event=event)
+
+    def prune_expired_events(self):
+        self._prune_expired_events_and_get()
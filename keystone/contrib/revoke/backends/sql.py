@@ -33,7 +33,7 @@ class RevocationEvent(sql.ModelBase, sql.ModelDictMixin):
     access_token_id = sql.Column(sql.String(64))
     issued_before = sql.Column(sql.DateTime(), nullable=False)
     expires_at = sql.Column(sql.DateTime())
-    revoked_at = sql.Column(sql.DateTime(), nullable=False)
+    revoked_at = sql.Column(sql.DateTime(), nullable=False, index=True)
     audit_id = sql.Column(sql.String(32))
     audit_chain_id = sql.Column(sql.String(32))
 
@@ -57,7 +57,7 @@ class Revoke(revoke.Driver):
             # been increased beyond the default.
         return batch_size
 
-    def _prune_expired_events(self):
+    def prune_expired_events(self):
         oldest = revoke.revoked_before_cutoff_time()
 
         session = sql.get_session()
@@ -81,13 +81,17 @@ class Revoke(revoke.Driver):
         session.flush()
 
     def get_events(self, last_fetch=None):
-        self._prune_expired_events()
         session = sql.get_session()
         query = session.query(RevocationEvent).order_by(
             RevocationEvent.revoked_at)
 
         if last_fetch:
             query = query.filter(RevocationEvent.revoked_at > last_fetch)
+        else:
+            # NOTE(garcianavalon) expired events are removed by
+            # prune_expired_events, until then they are just skipped.
+            oldest = revoke.revoked_before_cutoff_time()
+            query = query.filter(RevocationEvent.revoked_at >= oldest)
 
         events = [model.RevokeEvent(**e.to_dict()) for e in query]
 
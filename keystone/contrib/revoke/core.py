@@ -12,6 +12,8 @@
 
 import abc
 import datetime
+import threading
+import uuid
 
 from oslo.utils import timeutils
 import six
@@ -56,6 +58,11 @@ SHOULD_CACHE = cache.should_cache_fn('revoke')
 # TODO(ayoung): migrate from the token section
 REVOCATION_CACHE_EXPIRATION_TIME = lambda: CONF.token.revocation_cache_time
 
+# Events are fetched again if they were revoked this close to the newest
+# event already applied, which covers timestamps truncated by the database
+# and events that were committed slightly out of order.
+FETCH_OVERLAP = datetime.timedelta(seconds=5)
+
 
 def revoked_before_cutoff_time():
     expire_delta = datetime.timedelta(
@@ -76,6 +83,8 @@ class Manager(manager.Manager):
         super(Manager, self).__init__(CONF.revoke.driver)
         self._register_listeners()
         self.model = model
+        self._revoke_tree_lock = threading.Lock()
+        self._reset_revoke_tree()
 
     def _user_callback(self, service, resource_type, operation,
                        payload):
@@ -201,11 +210,80 @@ class Manager(manager.Manager):
 
     @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
                         expiration_time=REVOCATION_CACHE_EXPIRATION_TIME)
+    def _get_revoke_generation(self):
+        """Identifies the current set of revocation events.
+
+        The value changes whenever an event is recorded, telling every worker
+        sharing the cache that its revocation tree needs to catch up.
+
+        """
+        return uuid.uuid4().hex
+
+    def _reset_revoke_tree(self):
+        self._revoke_tree = model.CompiledRevokeTree()
+        self._revoke_events = {}
+        self._revoke_tree_generation = None
+        self._revoke_tree_built_at = None
+        self._last_fetch = None
+
+    def _apply_revoke_events(self, events):
+        for event in events:
+            key = tuple(getattr(event, attr) for attr in model.REVOKE_KEYS)
+            if key in self._revoke_events:
+                continue
+            self._revoke_events[key] = event
+            self._revoke_tree.add_event(event)
+            if self._last_fetch is None or event.revoked_at > self._last_fetch:
+                self._last_fetch = event.revoked_at
+
+    def _prune_revoke_tree(self):
+        oldest = revoked_before_cutoff_time()
+        expired = [key for key, event in six.iteritems(self._revoke_events)
+                   if event.revoked_at < oldest]
+        if not expired:
+            return
+        for key in expired:
+            del self._revoke_events[key]
+        # NOTE(garcianavalon) events sharing a path in the tree only keep
+        # the latest issued_before, so removing them one by one could drop
+        # a leaf that a remaining event still needs. Rebuild from memory.
+        self._revoke_tree = model.CompiledRevokeTree(
+            revoke_events=self._revoke_events.values())
+
     def _get_revoke_tree(self):
-        events = self.driver.get_events()
-        revoke_tree = model.RevokeTree(revoke_events=events)
+        """Returns this worker's revocation tree, brought up to date.
+
+        Only the events newer than the last ones applied are fetched when the
+        revocation generation changes. The whole tree is reloaded once every
+        ``[token] revocation_cache_time`` seconds to pick up anything an
+        incremental fetch could have missed.
 
-        return revoke_tree
+        """
+        generation = self._get_revoke_generation()
+        if generation == self._revoke_tree_generation:
+            return self._revoke_tree
+
+        with self._revoke_tree_lock:
+            if generation == self._revoke_tree_generation:
+                return self._revoke_tree
+
+            now = timeutils.utcnow()
+            reload_delta = datetime.timedelta(
+                seconds=REVOCATION_CACHE_EXPIRATION_TIME())
+            if (self._revoke_tree_built_at is None or
+                    self._revoke_tree_built_at + reload_delta < now):
+                self._reset_revoke_tree()
+                self._revoke_tree_built_at = now
+                self._apply_revoke_events(self.driver.get_events())
+            else:
+                last_fetch = None
+                if self._last_fetch is not None:
+                    last_fetch = self._last_fetch - FETCH_OVERLAP
+                self._apply_revoke_events(
+                    self.driver.get_events(last_fetch=last_fetch))
+                self._prune_revoke_tree()
+            self._revoke_tree_generation = generation
+            return self._revoke_tree
 
     def check_token(self, token_values):
         """Checks the values from a token against the revocation list
@@ -222,7 +300,7 @@ class Manager(manager.Manager):
 
     def revoke(self, event):
         self.driver.revoke(event)
-        self._get_revoke_tree.invalidate(self)
+        self._get_revoke_generation.invalidate(self)
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -251,3 +329,13 @@ class Driver(object):
 
         """
         raise exception.NotImplemented()  # pragma: no cover
+
+    @abc.abstractmethod
+    def prune_expired_events(self):
+        """remove the revocation events that can no longer match a token
+
+        Events revoked before the expiration cutoff are deleted.  This is
+        a maintenance task, see ``keystone-manage revoke_flush``.
+
+        """
+        raise exception.NotImplemented()  # pragma: no cover
@@ -249,6 +249,147 @@ class RevokeTree(object):
         return False
 
 
+class CompiledRevokeTree(object):
+    """Revocation matcher compiled into per-attribute bitsets
+
+    Offers the same interface as RevokeTree.  Every distinct combination of
+    event attributes (a path in RevokeTree) is given a slot, and for every
+    attribute the slots are indexed by value, plus one set of slots for the
+    wildcard.  Slot sets are stored as the bits of an integer so that
+    matching a token is a handful of dict lookups, ORs and ANDs.  Each slot
+    keeps the latest 'issued_before' of its events, like the tree leaves.
+
+    """
+
+    # Attributes that rarely hold a wildcard are checked first, so that a
+    # token which is not revoked is usually rejected after a couple of steps.
+    _MATCH_ORDER = ['audit_id',
+                    'audit_chain_id',
+                    'user_id',
+                    'project_id',
+                    'role_id',
+                    'domain_id',
+                    'domain_scope_id',
+                    'trust_id',
+                    'consumer_id',
+                    'access_token_id',
+                    'expires_at']
+
+    # Alternative names to be checked in the token for every attribute.
+    _ALTERNATIVES = {
+        'user_id': ['user_id', 'trustor_id', 'trustee_id'],
+        'domain_id': ['identity_domain_id', 'assignment_domain_id'],
+        # For a domain-scoped token, the domain is in assignment_domain_id.
+        'domain_scope_id': ['assignment_domain_id', ],
+    }
+
+    def __init__(self, revoke_events=None):
+        self._slots = dict()
+        self._issued_before = []
+        self._free_slots = []
+        self._wildcards = dict((name, 0) for name in _EVENT_NAMES)
+        self._values = dict((name, dict()) for name in _EVENT_NAMES)
+        self.add_events(revoke_events)
+
+    @staticmethod
+    def _path(event):
+        # NOTE(garcianavalon) RevokeTree treats any false value as '*'.
+        return tuple(getattr(event, name) or None for name in _EVENT_NAMES)
+
+    def add_event(self, event):
+        """Updates the matcher based on a revocation event.
+
+        :param:  Event to add
+
+        :returns:  the event that was passed in.
+
+        """
+        path = self._path(event)
+        slot = self._slots.get(path)
+        if slot is not None:
+            self._issued_before[slot] = max(event.issued_before,
+                                            self._issued_before[slot])
+            return event
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._issued_before[slot] = event.issued_before
+        else:
+            slot = len(self._issued_before)
+            self._issued_before.append(event.issued_before)
+        self._slots[path] = slot
+
+        bit = 1 << slot
+        for name, value in zip(_EVENT_NAMES, path):
+            if value is None:
+                self._wildcards[name] |= bit
+            else:
+                values = self._values[name]
+                values[value] = values.get(value, 0) | bit
+        return event
+
+    def remove_event(self, event):
+        """Update the matcher based on the removal of a Revocation Event
+
+        As with RevokeTree, only an exact match on 'issued_before' ever
+        triggers a removal.
+
+        :param: Event to remove
+
+        """
+        path = self._path(event)
+        slot = self._slots.get(path)
+        if slot is None or event.issued_before != self._issued_before[slot]:
+            return
+
+        mask = ~(1 << slot)
+        for name, value in zip(_EVENT_NAMES, path):
+            if value is None:
+                self._wildcards[name] &= mask
+            else:
+                values = self._values[name]
+                values[value] &= mask
+                if not values[value]:
+                    del values[value]
+        del self._slots[path]
+        self._issued_before[slot] = None
+        self._free_slots.append(slot)
+
+    def add_events(self, revoke_events):
+        return map(self.add_event, revoke_events or [])
+
+    def is_revoked(self, token_data):
+        """Check if a token matches any revocation event
+
+        token_data is the same map RevokeTree.is_revoked expects.
+
+        """
+        matches = None
+        for name in self._MATCH_ORDER:
+            values = self._values[name]
+            candidates = self._wildcards[name]
+            if name == 'role_id':
+                for role_id in token_data.get('roles', []):
+                    candidates |= values.get(role_id, 0)
+            else:
+                for alt_name in self._ALTERNATIVES.get(name, (name,)):
+                    candidates |= values.get(token_data[alt_name], 0)
+            if matches is None:
+                matches = candidates
+            else:
+                matches &= candidates
+            if not matches:
+                return False
+
+        issued_at = token_data['issued_at']
+        while matches:
+            bit = matches & -matches
+            if self._issued_before[bit.bit_length() - 1] > issued_at:
+                return True
+            matches ^= bit
+        return False
+
+
 def build_token_values_v2(access, default_domain_id):
     token_data = access['token']
 
@@ -18,6 +18,19 @@ from keystone import exception
 from keystone.i18n import _
 
 
+# NOTE(garcianavalon) keep the IN lists, the executemany batches and the
+# OR-ed conditions of the bulk deletes to a reasonable size for every
+# dialect (SQLite limits both the bound parameters and the expression
+# depth of a statement)
+BULK_BATCH_SIZE = 100
+
+
+def _batches(items, batch_size=BULK_BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
 class Role(sql.ModelBase, sql.ModelDictMixin):
     __tablename__ = 'role_fiware'
     __table_args__ = (sql.UniqueConstraint('name', 'application_id'), {'extend_existing': True})
@@ -89,6 +102,27 @@ class RoleOrganization(sql.ModelBase, sql.ModelDictMixin):
 
 class Roles(roles.RolesDriver):
     """ CRUD driver for the SQL backend """
+
+    def _check_ids_exist(self, session, column, ids, not_found):
+        found = set()
+        for batch in _batches(ids):
+            query = session.query(column).filter(column.in_(batch))
+            found.update(row[0] for row in query)
+        missing = set(ids) - found
+        if missing:
+            raise not_found(sorted(missing)[0])
+
+    def _delete_assignments_bulk(self, model, attributes, assignments):
+        session = sql.get_session()
+        with session.begin():
+            for batch in _batches(assignments):
+                conditions = [
+                    sql.sql.and_(*[getattr(model, attr) == assignment[attr]
+                                   for attr in attributes])
+                    for assignment in batch]
+                query = session.query(model).filter(sql.sql.or_(*conditions))
+                query.delete(synchronize_session=False)
+
     # ROLES
     def list_roles(self, **kwargs):
         session = sql.get_session()
@@ -155,6 +189,15 @@ class Roles(roles.RolesDriver):
 
         return [assignment.to_dict() for assignment in query]
 
+    def list_user_roles_in_application(self, user_id, application_id):
+        session = sql.get_session()
+        query = session.query(RoleUser.organization_id, Role.id, Role.name)
+        query = query.join(Role, RoleUser.role_id == Role.id)
+        query = query.filter(RoleUser.user_id == user_id)
+        query = query.filter(RoleUser.application_id == application_id)
+
+        return [dict(organization_id=organization_id, id=role_id, name=name)
+                for organization_id, role_id, name in query]
 
     def add_role_to_user(self, role_id, user_id, organization_id, 
                          application_id):
@@ -178,6 +221,47 @@ class Roles(roles.RolesDriver):
                                  organization_id=organization_id,
                                  application_id=application_id)) 
 
+    def add_role_assignments_bulk(self, assignments):
+        assignments = set((a['role_id'], a['user_id'], a['organization_id'],
+                           a['application_id']) for a in assignments)
+        if not assignments:
+            return
+
+        role_ids, user_ids, _organization_ids, application_ids = (
+            set(ids) for ids in zip(*assignments))
+
+        session = sql.get_session()
+        with session.begin():
+            self._check_ids_exist(
+                session, Role.id, role_ids,
+                lambda role_id: exception.NotFound(
+                    _('No Role found with id: %s') % role_id))
+
+            # skip the assignments that already exist
+            for batch in _batches(user_ids):
+                query = session.query(RoleUser.role_id, RoleUser.user_id,
+                                      RoleUser.organization_id,
+                                      RoleUser.application_id)
+                query = query.filter(RoleUser.user_id.in_(batch))
+                query = query.filter(
+                    RoleUser.application_id.in_(application_ids))
+                assignments.difference_update(query)
+
+            for batch in _batches(assignments):
+                session.execute(
+                    RoleUser.__table__.insert(),
+                    [dict(role_id=role_id, user_id=user_id,
+                          organization_id=organization_id,
+                          application_id=application_id)
+                     for role_id, user_id, organization_id, application_id
+                     in batch])
+
+    def remove_role_user_assignments_bulk(self, assignments):
+        self._delete_assignments_bulk(
+            RoleUser,
+            ['role_id', 'user_id', 'organization_id', 'application_id'],
+            assignments)
+
     def remove_role_from_user(self, role_id, user_id, 
                               organization_id, application_id,
                               check_ids=True):
@@ -252,6 +336,64 @@ class Roles(roles.RolesDriver):
         with session.begin():
             session.delete(ref)
 
+    # CASCADE DELETIONS
+    def delete_all_application_resources(self, application_id):
+        session = sql.get_session()
+        with session.begin():
+            role_ids = session.query(Role.id).filter_by(
+                application_id=application_id).subquery()
+            permission_ids = session.query(Permission.id).filter_by(
+                application_id=application_id).subquery()
+
+            counts = {}
+            query = session.query(RoleUser).filter(sql.sql.or_(
+                RoleUser.application_id == application_id,
+                RoleUser.role_id.in_(role_ids)))
+            counts['user_assignments'] = query.delete(
+                synchronize_session=False)
+
+            query = session.query(RoleOrganization).filter(sql.sql.or_(
+                RoleOrganization.application_id == application_id,
+                RoleOrganization.role_id.in_(role_ids)))
+            counts['organization_assignments'] = query.delete(
+                synchronize_session=False)
+
+            query = session.query(RolePermission).filter(sql.sql.or_(
+                RolePermission.role_id.in_(role_ids),
+                RolePermission.permission_id.in_(permission_ids)))
+            query.delete(synchronize_session=False)
+
+            query = session.query(Role).filter_by(
+                application_id=application_id)
+            counts['roles'] = query.delete(synchronize_session=False)
+
+            query = session.query(Permission).filter_by(
+                application_id=application_id)
+            counts['permissions'] = query.delete(synchronize_session=False)
+        return counts
+
+    def delete_all_user_assignments(self, user_id):
+        session = sql.get_session()
+        with session.begin():
+            query = session.query(RoleUser).filter_by(user_id=user_id)
+            count = query.delete(synchronize_session=False)
+        return {'user_assignments': count}
+
+    def delete_all_organization_assignments(self, organization_id):
+        session = sql.get_session()
+        with session.begin():
+            counts = {}
+            query = session.query(RoleOrganization).filter_by(
+                organization_id=organization_id)
+            counts['organization_assignments'] = query.delete(
+                synchronize_session=False)
+
+            query = session.query(RoleUser).filter_by(
+                organization_id=organization_id)
+            counts['user_assignments'] = query.delete(
+                synchronize_session=False)
+        return counts
+
     # PERMISSIONS
     def list_permissions(self, **kwargs):
         session = sql.get_session()
@@ -307,6 +449,33 @@ class Roles(roles.RolesDriver):
         
         return [g.to_dict() for g in query]
 
+    def _list_internal_permissions(self, assignment_model, **filters):
+        session = sql.get_session()
+        query = session.query(assignment_model.application_id,
+                              Permission.name)
+        query = query.join(
+            RolePermission,
+            assignment_model.role_id == RolePermission.role_id)
+        query = query.join(
+            Permission, RolePermission.permission_id == Permission.id)
+        query = query.filter(Permission.is_internal == sql.sql.true())
+        for attr, value in filters.items():
+            if value:
+                query = query.filter(
+                    getattr(assignment_model, attr) == value)
+
+        return [dict(application_id=application_id, name=name)
+                for application_id, name in query.distinct()]
+
+    def list_internal_permissions_for_user(self, user_id,
+                                           organization_id=None):
+        return self._list_internal_permissions(
+            RoleUser, user_id=user_id, organization_id=organization_id)
+
+    def list_internal_permissions_for_organization(self, organization_id):
+        return self._list_internal_permissions(
+            RoleOrganization, organization_id=organization_id)
+
     def add_permission_to_role(self, role_id, permission_id):
         session = sql.get_session()
         self.get_role(role_id)
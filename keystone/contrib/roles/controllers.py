@@ -134,6 +134,59 @@ class RoleUserAssignmentV3(BaseControllerV3):
         ref = self.roles_api.list_role_user_assignments(**filters)
         return RoleUserAssignmentV3.wrap_collection(context, ref)
 
+    _ASSIGNMENT_ATTRIBUTES = ['role_id', 'user_id', 'organization_id',
+                              'application_id']
+
+    def _validate_role_assignments(self, role_assignments):
+        """Check that role_assignments is a non-empty list of assignments
+        with every required attribute and return them without extra keys.
+
+        """
+        if not role_assignments or not isinstance(role_assignments, list):
+            raise exception.ValidationError(
+                attribute='a list of role assignments',
+                target='role_assignments')
+        assignments = []
+        for assignment in role_assignments:
+            if not isinstance(assignment, dict):
+                raise exception.ValidationError(
+                    attribute=', '.join(self._ASSIGNMENT_ATTRIBUTES),
+                    target='role_assignment')
+            missing = [k for k in self._ASSIGNMENT_ATTRIBUTES
+                       if not assignment.get(k)]
+            if missing:
+                raise exception.ValidationError(
+                    attribute=', '.join(missing), target='role_assignment')
+            assignments.append(dict((k, assignment[k])
+                                    for k in self._ASSIGNMENT_ATTRIBUTES))
+        return assignments
+
+    def _check_allowed_to_assign_in_bulk(self, context, protection,
+                                         role_assignments=None):
+        """Add a flag for the policy engine if the user is allowed to
+        assign every role in the batch.
+
+        """
+        assignments = self._validate_role_assignments(role_assignments)
+        user_id = context['environment']['KEYSTONE_AUTH_CONTEXT']['user_id']
+        allowed_roles = self.roles_api.list_roles_user_allowed_to_assign(
+            user_id=user_id, organization_id=None)
+        ref = {}
+        ref['is_allowed_to_get_and_assign'] = all(
+            assignment['role_id'] in allowed_roles.get(
+                assignment['application_id'], [])
+            for assignment in assignments)
+
+        self.check_protection(context, protection, ref)
+
+    @controller.protected(callback=_check_allowed_to_assign_in_bulk)
+    def add_role_user_assignments(self, context, role_assignments=None):
+        """Grant roles to users in bulk. Each element of role_assignments
+        must have role_id, user_id, organization_id and application_id.
+        """
+        assignments = self._validate_role_assignments(role_assignments)
+        self.roles_api.add_role_assignments_bulk(assignments)
+
     @controller.protected(callback=_check_allowed_to_get_and_assign)
     def add_role_to_user(self, context, role_id, user_id, 
                          organization_id, application_id):
@@ -391,33 +444,8 @@ class FiwareApiControllerV3(BaseControllerV3):
             See https://github.com/ging/fi-ware-idm/wiki/Using-the-FI-LAB-instance\
             #get-user-information-and-roles
         """
-        # TODO(garcianavalon) check if token is valid, use user_id to filter in get
-        token = self.oauth2_api.get_access_token(token_id)
-        user = self.identity_api.get_user(token['authorizing_user_id'])
-        application_id = token['consumer_id']
-        
-        organizations = self.roles_api.get_authorized_organizations(
-            user, application_id)
-
-        # remove the default organization and extract its roles
-        user_roles = []
-        user_organization = next((org for org in organizations 
-            if org['id'] == user['default_project_id']), None)
-
-        if user_organization:
-            organizations.remove(user_organization)
-            # extract the user-scoped roles
-            user_roles = user_organization.pop('roles') 
-
-        response_body = {
-            'id':user['id'],
-            'email': user['name'],
-            'displayName': user.get('username', user['name']),
-            'roles': user_roles,
-            'organizations': organizations,
-            'app_id': application_id
-        }
-        return response_body
+        # TODO(garcianavalon) use user_id to filter in get
+        return self.roles_api.get_access_token_info(token_id)
 
 @dependency.requires('oauth2_api')
 class ExtendedPermissionsConsumerCrudV3(BaseControllerV3):
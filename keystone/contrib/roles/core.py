@@ -13,17 +13,31 @@
 # under the License.
 
 import abc
+import functools
+import threading
+import uuid
+
+from oslo.utils import timeutils
 import six
+from six.moves import queue
 
+from keystone import config
 from keystone import exception
 from keystone import notifications
+from keystone.common import cache
 from keystone.common import dependency
 from keystone.common import extension
 from keystone.common import manager
+from keystone.i18n import _
 from keystone.openstack.common import log
 
 
+CONF = config.CONF
 LOG = log.getLogger(__name__)
+SHOULD_CACHE = cache.should_cache_fn('roles')
+
+# NOTE(garcianavalon): The config option is not available at import time.
+EXPIRATION_TIME = lambda: CONF.roles.cache_time
 
 EXTENSION_DATA = {
     'name': 'UPM-FIWARE Roles API',
@@ -50,7 +64,58 @@ ASSIGN_INTERNAL_ROLES_PERMISSION = 'Get and assign all internal application role
 MANAGE_APPLICATION_PERMISSION = 'Manage the application'
 MANAGE_ROLES_PERMISSION = 'Manage roles'
 
-@dependency.requires('assignment_api')
+class CascadeDeleteWorker(object):
+    """Runs cascade deletions one after another in a background thread.
+
+    Progress is reported through the log: every job is logged when it is
+    queued, started and finished, together with the number of rows removed
+    and the number of jobs still pending.
+
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def pending(self):
+        """Number of queued or running jobs."""
+        return self._queue.unfinished_tasks
+
+    def submit(self, description, function):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='roles-cascade-delete')
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put((description, function))
+        LOG.info(_('Queued cascade deletion of %(description)s, '
+                   '%(pending)s job(s) pending'),
+                 {'description': description, 'pending': self.pending})
+
+    def join(self):
+        """Block until every queued job has been processed."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            description, function = self._queue.get()
+            try:
+                LOG.info(_('Started cascade deletion of %s'), description)
+                counts = function()
+                LOG.info(_('Finished cascade deletion of %(description)s, '
+                           'removed %(counts)s, %(pending)s job(s) pending'),
+                         {'description': description, 'counts': counts,
+                          'pending': self.pending - 1})
+            except Exception:
+                LOG.exception(_('Cascade deletion of %s failed'), description)
+            finally:
+                self._queue.task_done()
+
+
+@dependency.requires('assignment_api', 'identity_api', 'oauth2_api')
 @dependency.provider('roles_api')
 class RolesManager(manager.Manager):
     """Roles and Permissions Manager.
@@ -59,6 +124,8 @@ class RolesManager(manager.Manager):
     how this dynamically calls the backend.
 
     """
+    _USER = 'user'
+    _ORGANIZATION = 'organization'
 
     def __init__(self):
 
@@ -68,17 +135,229 @@ class RolesManager(manager.Manager):
                 'project': [self.delete_organization_assignments],
                 'consumer_oauth2':[self.delete_application_resources]
             },
+            notifications.ACTIONS.updated: {
+                'user': [self._invalidate_access_token_info_callback],
+                'project': [self._invalidate_access_token_info_callback],
+                'consumer_oauth2': [
+                    self._invalidate_access_token_info_callback],
+            },
+            notifications.ACTIONS.disabled: {
+                'access_token_oauth2': [self._revoke_access_token_callback],
+            },
+            notifications.ACTIONS.internal: {
+                notifications.INVALIDATE_USER_TOKEN_PERSISTENCE: [
+                    self._invalidate_access_token_info_callback],
+                notifications.INVALIDATE_USER_PROJECT_TOKEN_PERSISTENCE: [
+                    self._invalidate_access_token_info_callback],
+            },
         }
 
+        self._cascade_worker = None
+
         super(RolesManager, self).__init__(
             'keystone.contrib.roles.backends.sql.Roles')
 
+    # ACCESS TOKEN INFO
+    def get_access_token_info(self, access_token_id):
+        """Get the user, roles and organizations behind an OAuth2 token.
+
+        The result is cached under the access token id. Every change to
+        roles or assignments bumps a generation value that is part of the
+        cache key, so stale entries are never served and a cache hit costs
+        no SQL at all. The expiry and the revocation of the token are
+        cached along and checked on every call.
+
+        :param access_token_id: the OAuth2 access token id
+        :type access_token_id: string
+        :returns: dict with the user info, the user-scoped roles, the
+            organizations with their roles and the application id
+        :raises: keystone.exception.NotFound if the token doesn't exist,
+            expired or was revoked
+        """
+        token_info = self._get_access_token_info(
+            access_token_id, self._get_access_token_info_generation())
+        if (not token_info['valid'] or
+                token_info['expires_at'] <= timeutils.utcnow()):
+            msg = _('Access Token %s not found') % access_token_id
+            raise exception.NotFound(message=msg)
+        return token_info['info']
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _get_access_token_info(self, access_token_id, generation):
+        token = self.oauth2_api.get_access_token(access_token_id)
+        if not token['valid']:
+            return {'valid': False, 'expires_at': token['expires_at']}
+
+        user = self.identity_api.get_user(token['authorizing_user_id'])
+        application_id = token['consumer_id']
+
+        organizations = self.get_authorized_organizations(
+            user, application_id)
+
+        # remove the default organization and extract its roles
+        user_roles = []
+        user_organization = next((org for org in organizations
+            if org['id'] == user.get('default_project_id')), None)
+
+        if user_organization:
+            organizations.remove(user_organization)
+            # extract the user-scoped roles
+            user_roles = user_organization.pop('roles')
+
+        return {
+            'valid': True,
+            'expires_at': token['expires_at'],
+            'info': {
+                'id': user['id'],
+                'email': user['name'],
+                'displayName': user.get('username', user['name']),
+                'roles': user_roles,
+                'organizations': organizations,
+                'app_id': application_id
+            }
+        }
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE)
+    def _get_access_token_info_generation(self):
+        return uuid.uuid4().hex
+
+    def _invalidate_access_token_info(self):
+        # NOTE(garcianavalon) we can't know which tokens are affected by a
+        # change so we move all of them to a new generation instead of
+        # deleting them one by one. Old entries just expire.
+        self._get_access_token_info_generation.invalidate(self)
+
+    def _invalidate_access_token_info_callback(self, service, resource_type,
+                                               operation, payload):
+        self._invalidate_access_token_info()
+
+    def _revoke_access_token_callback(self, service, resource_type,
+                                      operation, payload):
+        access_token_id = payload['resource_info']
+        self._get_access_token_info.invalidate(
+            self, access_token_id, self._get_access_token_info_generation())
+
+    # INTERNAL PERMISSIONS INDEX
+    def _get_user_internal_permissions(self, user_id, organization_id):
+        return self._get_internal_permissions(
+            self._USER, user_id, organization_id or None,
+            self._get_internal_permissions_generation())
+
+    def _get_organization_internal_permissions(self, organization_id):
+        return self._get_internal_permissions(
+            self._ORGANIZATION, organization_id, None,
+            self._get_internal_permissions_generation())
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=EXPIRATION_TIME)
+    def _get_internal_permissions(self, actor_type, actor_id,
+                                  organization_id, generation):
+        """Build the (actor, organization) index of internal permissions.
+
+        :returns: dictionary with application ids as keys and sets of
+            internal permission names as values
+        """
+        if actor_type == self._USER:
+            permissions = self.driver.list_internal_permissions_for_user(
+                actor_id, organization_id)
+        else:
+            permissions = (
+                self.driver.list_internal_permissions_for_organization(
+                    actor_id))
+
+        index = {}
+        for permission in permissions:
+            index.setdefault(
+                permission['application_id'], set()).add(permission['name'])
+        return index
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE)
+    def _get_internal_permissions_generation(self):
+        return uuid.uuid4().hex
+
+    def _invalidate_internal_permissions(self):
+        # NOTE(garcianavalon) changes in the permissions of a role affect
+        # every actor with that role, so start a new generation.
+        self._get_internal_permissions_generation.invalidate(self)
+
+    def _invalidate_user_internal_permissions(self, user_id,
+                                              organization_id):
+        generation = self._get_internal_permissions_generation()
+        # the user index is stored per organization and for all of them
+        for org_id in set([organization_id or None, None]):
+            self._get_internal_permissions.invalidate(
+                self, self._USER, user_id, org_id, generation)
+
+    def _invalidate_organization_internal_permissions(self, organization_id):
+        self._get_internal_permissions.invalidate(
+            self, self._ORGANIZATION, organization_id, None,
+            self._get_internal_permissions_generation())
+
+    # ROLES
+    def update_role(self, role_id, role):
+        ret = self.driver.update_role(role_id, role)
+        self._invalidate_access_token_info()
+        return ret
+
+    def delete_role(self, role_id):
+        ret = self.driver.delete_role(role_id)
+        self._invalidate_internal_permissions()
+        self._invalidate_access_token_info()
+        return ret
+
+    # ROLE-USER
+    def add_role_to_user(self, role_id, user_id, organization_id,
+                         application_id):
+        ret = self.driver.add_role_to_user(
+            role_id, user_id, organization_id, application_id)
+        self._invalidate_user_internal_permissions(user_id, organization_id)
+        self._invalidate_access_token_info()
+        return ret
+
+    def add_role_assignments_bulk(self, assignments):
+        # NOTE(garcianavalon) users and organizations live in other
+        # backends, check them through their managers like the single
+        # assignment does. Each distinct id is only checked once, but it is
+        # still a call per id, the managers have no bulk get. Applications
+        # are not checked, as in the single assignment.
+        for user_id in set(a['user_id'] for a in assignments):
+            self.identity_api.get_user(user_id)
+        for organization_id in set(a['organization_id'] for a in assignments):
+            self.assignment_api.get_project(organization_id)
+        ret = self.driver.add_role_assignments_bulk(assignments)
+        actors = set((a['user_id'], a['organization_id'])
+                     for a in assignments)
+        for user_id, organization_id in actors:
+            self._invalidate_user_internal_permissions(
+                user_id, organization_id)
+        self._invalidate_access_token_info()
+        return ret
+
+    def remove_role_from_user(self, role_id, user_id, organization_id,
+                              application_id, check_ids=True):
+        ret = self.driver.remove_role_from_user(
+            role_id, user_id, organization_id, application_id,
+            check_ids=check_ids)
+        self._invalidate_user_internal_permissions(user_id, organization_id)
+        self._invalidate_access_token_info()
+        return ret
+
+    # ROLE-ORGANIZATION
+    def add_role_to_organization(self, role_id, organization_id,
+                                 application_id, check_ids=True):
+        ret = self.driver.add_role_to_organization(
+            role_id, organization_id, application_id, check_ids=check_ids)
+        self._invalidate_organization_internal_permissions(organization_id)
+        return ret
+
     def remove_role_from_organization(self, role_id,  
                                       organization_id, application_id,
                                       check_ids=True):
 
         response = self.driver.remove_role_from_organization(
             role_id, organization_id, application_id, check_ids=check_ids)
+        self._invalidate_organization_internal_permissions(organization_id)
 
         # get all roles allowed to assign
         application_roles = self.list_roles_organization_allowed_to_assign(
@@ -95,94 +374,118 @@ class RolesManager(manager.Manager):
         ]
 
         self._delete_user_assignments(delete_assignments)
-        
+        self._invalidate_access_token_info()
+
         return response
 
-    def delete_application_resources(self, service, resource_type, 
+    # PERMISSIONS
+    def update_permission(self, permission_id, permission):
+        ret = self.driver.update_permission(permission_id, permission)
+        self._invalidate_internal_permissions()
+        return ret
+
+    def delete_permission(self, permission_id):
+        ret = self.driver.delete_permission(permission_id)
+        self._invalidate_internal_permissions()
+        return ret
+
+    def add_permission_to_role(self, role_id, permission_id):
+        ret = self.driver.add_permission_to_role(role_id, permission_id)
+        self._invalidate_internal_permissions()
+        return ret
+
+    def remove_permission_from_role(self, role_id, permission_id):
+        ret = self.driver.remove_permission_from_role(role_id, permission_id)
+        self._invalidate_internal_permissions()
+        return ret
+
+    def delete_application_resources(self, service, resource_type,
                                      operation, payload):
         app_id = payload['resource_info']
-        # Delete all assignments
-        user_assignments = self.driver.list_role_user_assignments(
-            application_id=app_id)
-        self._delete_user_assignments(user_assignments)
-        org_assignments = self.driver.list_role_organization_assignments(
-            application_id=app_id)
-        self._delete_organization_assignments(org_assignments)
-
-        # Delete all roles and permissions
-        roles = self.driver.list_roles(application_id=app_id)
-        for role in roles:
-            self.driver.delete_role(role['id'])
-
-        permissions = self.driver.list_roles(application_id=app_id)
-        for permission in permissions:
-            self.driver.delete_permission(permission['id'])
-
+        self._cascade_delete(
+            'application %s' % app_id,
+            self.driver.delete_all_application_resources, app_id)
 
     def delete_user_assignments(self, service, resource_type, operation,
                                 payload):
         user_id = payload['resource_info']
-        assignments = self.driver.list_role_user_assignments(
-            user_id=user_id)
-        self._delete_user_assignments(assignments)
-
+        self._cascade_delete(
+            'user %s' % user_id,
+            self.driver.delete_all_user_assignments, user_id)
 
-    def delete_organization_assignments(self, service, resource_type, 
+    def delete_organization_assignments(self, service, resource_type,
                                         operation, payload):
         org_id = payload['resource_info']
-        org_assignments = self.driver.list_role_organization_assignments(
-            organization_id=org_id)
-        self._delete_organization_assignments(org_assignments)
+        self._cascade_delete(
+            'organization %s' % org_id,
+            self.driver.delete_all_organization_assignments, org_id)
 
-        # Delete all user assignments in this org
-        user_assignments = self.driver.list_role_user_assignments(
-            organization_id=org_id)
-        self._delete_user_assignments(user_assignments)
-
-    def _delete_user_assignments(self, assignments):
-        for assignment in assignments:
-            self.driver.remove_role_from_user(
-                role_id=assignment['role_id'], 
-                user_id=assignment['user_id'],
-                organization_id=assignment['organization_id'],
-                application_id=assignment['application_id'],
-                check_ids=False)
+    def _cascade_delete(self, description, delete_all, resource_id):
+        """Remove everything that hangs from a deleted resource.
 
+        Each cascade is a handful of set-based DELETE statements run in a
+        single transaction by the driver. If configured, the work is moved
+        to a background worker so the API call that deleted the resource
+        does not wait for it, which is why the callbacks are not marked
+        deferrable.
 
-    def _delete_organization_assignments(self, assignments):
-        for assignment in assignments:
-            self.driver.remove_role_from_organization(
-                role_id=assignment['role_id'], 
-                organization_id=assignment['organization_id'],
-                application_id=assignment['application_id'],
-                check_ids=False)
+        """
+        def cascade():
+            counts = delete_all(resource_id)
+            self._invalidate_internal_permissions()
+            self._invalidate_access_token_info()
+            return counts
+
+        if CONF.roles.background_cascade_delete:
+            self.cascade_worker.submit(description, cascade)
+        else:
+            counts = cascade()
+            LOG.debug('Cascade deletion of %(description)s removed '
+                      '%(counts)s', {'description': description,
+                                     'counts': counts})
+
+    @property
+    def cascade_worker(self):
+        if self._cascade_worker is None:
+            self._cascade_worker = CascadeDeleteWorker()
+        return self._cascade_worker
 
+    def _delete_user_assignments(self, assignments):
+        self.driver.remove_role_user_assignments_bulk(assignments)
+        actors = set((a['user_id'], a['organization_id'])
+                     for a in assignments)
+        for user_id, organization_id in actors:
+            self._invalidate_user_internal_permissions(
+                user_id, organization_id)
 
     def get_authorized_organizations(self, user, 
                                     application_id,
                                     remove_default_organization=False):
-        # roles associated with this user in the application
-        assignments = self.driver.list_role_user_assignments(
-            user_id=user['id'], application_id=application_id)
-
-        # organizations the user is in
-        organizations = self.assignment_api.list_projects_for_user(user['id'])
-
-        # filter to only organizations with roles
-        organizations = [org for org in organizations 
-            if org['id'] in [a['organization_id'] for a in assignments]]
+        # roles (with their names) associated with this user in the
+        # application, grouped by organization
+        organization_roles = {}
+        for role in self.driver.list_user_roles_in_application(
+                user['id'], application_id):
+            organization_roles.setdefault(
+                role['organization_id'], []).append(
+                    dict(id=role['id'], name=role['name']))
+
+        if not organization_roles:
+            return []
+
+        # organizations the user is in, filtered to only organizations
+        # with roles
+        organizations = [org for org 
+            in self.assignment_api.list_projects_for_user(user['id'])
+            if org['id'] in organization_roles]
 
         for organization in organizations:
-            role_ids = [a['role_id'] for a in assignments 
-                        if a['organization_id'] == organization['id']]            
-            # Load roles' names
-            organization['roles'] = [dict(id=r['id'], name=r['name']) for r
-                    in [self.driver.get_role(id) for id in role_ids]]
+            organization['roles'] = organization_roles[organization['id']]
 
         if remove_default_organization:
             # always remove the default org
             organizations = [org for org in organizations 
-                if not org['id'] == user['default_project_id']]
+                if not org['id'] == user.get('default_project_id')]
 
         return organizations
 
@@ -192,36 +495,40 @@ class RolesManager(manager.Manager):
         """List all the applications in which the user has at least 
         one role with the permission 'Manage the application' permission.
         """
-        assignments = self.driver.list_role_user_assignments(
+        permissions = self._get_user_internal_permissions(
             user_id, organization_id)
-        return self._get_allowed_applications_manage_roles(assignments)
+        return self._get_allowed_applications(
+            permissions, MANAGE_ROLES_PERMISSION)
        
     def list_applications_organization_allowed_to_manage_roles(self, 
                                                                organization_id):
         """List all the applications in which the organization has at least 
         one role with the permission 'Manage the application' permission.
         """
-        assignments = self.driver.list_role_organization_assignments(
+        permissions = self._get_organization_internal_permissions(
             organization_id)
-        return self._get_allowed_applications_manage_roles(assignments)
+        return self._get_allowed_applications(
+            permissions, MANAGE_ROLES_PERMISSION)
 
     def list_applications_user_allowed_to_manage(self, user_id, 
                                                  organization_id):
         """List all the applications in which the user has at least 
         one role with the permission 'Manage the application' permission.
         """
-        assignments = self.driver.list_role_user_assignments(
+        permissions = self._get_user_internal_permissions(
             user_id, organization_id)
-        return self._get_allowed_applications(assignments)
+        return self._get_allowed_applications(
+            permissions, MANAGE_APPLICATION_PERMISSION)
        
     def list_applications_organization_allowed_to_manage(self, 
                                                          organization_id):
         """List all the applications in which the organization has at least 
         one role with the permission 'Manage the application' permission.
         """
-        assignments = self.driver.list_role_organization_assignments(
+        permissions = self._get_organization_internal_permissions(
             organization_id)
-        return self._get_allowed_applications(assignments)
+        return self._get_allowed_applications(
+            permissions, MANAGE_APPLICATION_PERMISSION)
 
     def list_roles_user_allowed_to_assign(self, user_id, organization_id):
         """List the roles that a given user can assign. To be able to assign roles
@@ -235,9 +542,11 @@ class RolesManager(manager.Manager):
         :returns: dictionary with application ids as keys and list 
             of role ids as values
         """
-        assignments = self.driver.list_role_user_assignments(
+        permissions = self._get_user_internal_permissions(
             user_id, organization_id)
-        return self._get_allowed_roles(assignments)
+        list_assignments = functools.partial(
+            self.driver.list_role_user_assignments, user_id, organization_id)
+        return self._get_allowed_roles(permissions, list_assignments)
 
 
     def list_roles_organization_allowed_to_assign(self, organization_id):
@@ -250,53 +559,26 @@ class RolesManager(manager.Manager):
         :returns: dictionary with application ids as keys and list 
             of role ids as values
         """
-        assignments = self.driver.list_role_organization_assignments(
+        permissions = self._get_organization_internal_permissions(
             organization_id)
-        return self._get_allowed_roles(assignments)
+        list_assignments = functools.partial(
+            self.driver.list_role_organization_assignments, organization_id)
+        return self._get_allowed_roles(permissions, list_assignments)
         
-    def _get_all_internal_permissions(self, current_assignments):
-        applications = set([a['application_id'] for a in current_assignments])
-        permissions = {}
-        for application_id in applications:
-            owned_roles = [a['role_id'] for a in current_assignments
-                           if a['application_id'] == application_id]
-            permissions[application_id] = []
-            for role_id in owned_roles:
-                permissions[application_id] += \
-                    [p['name'] for p in 
-                     self.driver.list_permissions_for_role(role_id)
-                     if p['is_internal'] == True]
-        return permissions
-
-    def _get_allowed_applications_manage_roles(self, current_assignments):
-        application_permissions = self._get_all_internal_permissions(
-            current_assignments)
-        allowed_applications = []
-        for application in application_permissions:
-            permissions = application_permissions[application]
-
-            # Check if the manage internal permission is present
-            if MANAGE_ROLES_PERMISSION in permissions:
-                allowed_applications.append(application)
-
-        return allowed_applications
-
-    def _get_allowed_applications(self, current_assignments):
-        application_permissions = self._get_all_internal_permissions(
-            current_assignments)
+    def _get_allowed_applications(self, application_permissions,
+                                  required_permission):
         allowed_applications = []
         for application in application_permissions:
             permissions = application_permissions[application]
 
-            # Check if the manage internal permission is present
-            if MANAGE_APPLICATION_PERMISSION in permissions:
+            # Check if the internal permission is present
+            if required_permission in permissions:
                 allowed_applications.append(application)
 
         return allowed_applications
 
-    def _get_allowed_roles(self, current_assignments):
-        application_permissions = self._get_all_internal_permissions(
-            current_assignments)
+    def _get_allowed_roles(self, application_permissions, list_assignments):
+        current_assignments = None
         allowed_roles = {}
         for application in application_permissions:
             permissions = application_permissions[application]
@@ -309,6 +591,8 @@ class RolesManager(manager.Manager):
 
             elif ASSIGN_OWNED_PUBLIC_ROLES_PERMISSION in permissions:
                 # add only the public roles the user has in the application
+                if current_assignments is None:
+                    current_assignments = list_assignments()
                 roles_to_add += [a['role_id'] for a 
                     in current_assignments 
                     if a['application_id'] == application]
@@ -405,6 +689,20 @@ class RolesDriver(object):
         """
         raise exception.NotImplemented()
 
+    @abc.abstractmethod
+    def list_user_roles_in_application(self, user_id, application_id):
+        """List the roles a user has in an application, in all the
+        organizations, including the role names.
+
+        :param user_id: user with roles
+        :type user_id: string
+        :param application_id: application to filter by
+        :type application_id: string
+        :returns: list of roles as dicts with 'id', 'name' and 
+            'organization_id' keys
+        """
+        raise exception.NotImplemented()
+
     @abc.abstractmethod
     def add_role_to_user(self, role_id, user_id, organization_id, application_id):
         """Grant role to a user.
@@ -425,6 +723,32 @@ class RolesDriver(object):
         """
         raise exception.NotImplemented()
 
+    @abc.abstractmethod
+    def add_role_assignments_bulk(self, assignments):
+        """Grant several roles to several users at once. Assignments that
+        already exist are skipped. Only role ids are checked, the manager
+        checks the rest.
+
+        :param assignments: dicts with 'role_id', 'user_id', 
+            'organization_id' and 'application_id' keys
+        :type assignments: list
+        :returns: None.
+
+        """
+        raise exception.NotImplemented()
+
+    @abc.abstractmethod
+    def remove_role_user_assignments_bulk(self, assignments):
+        """Revoke several user's roles at once. Ids are not checked.
+
+        :param assignments: dicts with 'role_id', 'user_id', 
+            'organization_id' and 'application_id' keys
+        :type assignments: list
+        :returns: None.
+
+        """
+        raise exception.NotImplemented()
+
     @abc.abstractmethod
     def remove_role_from_user(self, role_id, user_id, 
                               organization_id, application_id,
@@ -493,6 +817,44 @@ class RolesDriver(object):
         """
         raise exception.NotImplemented() 
     
+    # CASCADE DELETIONS
+    @abc.abstractmethod
+    def delete_all_application_resources(self, application_id):
+        """Delete the roles, permissions and assignments of an application.
+
+        Everything is removed in a single transaction.
+
+        :param application_id: id of the deleted application
+        :type application_id: string
+        :returns: dict with the number of deleted rows per resource type
+
+        """
+        raise exception.NotImplemented()
+
+    @abc.abstractmethod
+    def delete_all_user_assignments(self, user_id):
+        """Delete every role assignment of a user.
+
+        :param user_id: id of the deleted user
+        :type user_id: string
+        :returns: dict with the number of deleted rows per resource type
+
+        """
+        raise exception.NotImplemented()
+
+    @abc.abstractmethod
+    def delete_all_organization_assignments(self, organization_id):
+        """Delete every role assignment made to or within an organization.
+
+        Everything is removed in a single transaction.
+
+        :param organization_id: id of the deleted organization
+        :type organization_id: string
+        :returns: dict with the number of deleted rows per resource type
+
+        """
+        raise exception.NotImplemented()
+
     # PERMISSIONS
     @abc.abstractmethod
     def list_permissions(self, **kwargs):
@@ -562,6 +924,31 @@ class RolesDriver(object):
         """
         raise exception.NotImplemented()
 
+    @abc.abstractmethod
+    def list_internal_permissions_for_user(self, user_id,
+                                           organization_id=None):
+        """List the internal permissions granted to a user through its
+        roles, in a single query.
+
+        :param user_id: user with roles
+        :type user_id: string
+        :param organization_id: organization-scope. Optional parameter
+        :type organization_id: string
+        :returns: list of dicts with 'application_id' and 'name' keys
+        """
+        raise exception.NotImplemented()
+
+    @abc.abstractmethod
+    def list_internal_permissions_for_organization(self, organization_id):
+        """List the internal permissions granted to an organization through
+        its roles, in a single query.
+
+        :param organization_id: organization with roles
+        :type organization_id: string
+        :returns: list of dicts with 'application_id' and 'name' keys
+        """
+        raise exception.NotImplemented()
+
     @abc.abstractmethod
     def add_permission_to_role(self, role_id, permission_id):
         """Delete role.
@@ -76,6 +76,7 @@ class RolesExtension(wsgi.V3ExtensionRouter):
             mapper, user_assignment_controller,
             path=self.PATH_PREFIX + '/users/role_assignments',
             get_action='list_role_user_assignments',
+            put_action='add_role_user_assignments',
             rel=build_resource_relation(resource_name='role_assignments'))
 
         self._add_resource(
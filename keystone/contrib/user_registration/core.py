@@ -76,6 +76,7 @@ class Manager(manager.Manager):
             'keystone.contrib.user_registration.backends.sql.Registration')
         # TODO(garcianavalon) set as configuration option in keystone.conf
 
+    @notifications.deferrable
     def delete_user_projects(self, service, resource_type, operation,
                              payload):
         user_id = payload['resource_info']
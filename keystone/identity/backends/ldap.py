@@ -18,7 +18,6 @@ import ldap
 import ldap.filter
 
 from keystone import clean
-from keystone.common import driver_hints
 from keystone.common import ldap as common_ldap
 from keystone.common import models
 from keystone import config
@@ -52,6 +51,10 @@ class Identity(identity.Driver):
     # Identity interface
 
     def authenticate(self, user_id, password):
+        # NOTE(garcianavalon) the entity cache of this process may not have
+        # seen a change made through another process, read from the
+        # directory so a disabled user can't get tokens.
+        self.user._invalidate(user_id)
         try:
             user_ref = self._get_user(user_id)
         except exception.UserNotFound:
@@ -78,7 +81,7 @@ class Identity(identity.Driver):
         return self.user.get_filtered(user_id)
 
     def list_users(self, hints):
-        return self.user.get_all_filtered()
+        return self.user.get_all_filtered(hints)
 
     def get_user_by_name(self, user_name, domain_id):
         # domain_id will already have been handled in the Manager layer,
@@ -152,33 +155,33 @@ class Identity(identity.Driver):
     def list_groups_for_user(self, user_id, hints):
         user_ref = self._get_user(user_id)
         user_dn = user_ref['dn']
-        return self.group.list_user_groups_filtered(user_dn)
+        return self.group.list_user_groups_filtered(user_dn, hints)
 
     def list_groups(self, hints):
-        return self.group.get_all_filtered()
+        return self.group.get_all_filtered(hints)
 
     def list_users_in_group(self, group_id, hints):
+        user_dns = self.group.list_group_users(group_id)
+        user_ids = [self.user._dn_to_id(user_dn) for user_dn in user_dns]
+        # NOTE(garcianavalon) LDAP matches the ids regardless of case.
+        found = dict((user['id'].lower(), user)
+                     for user in self.user.get_all_by_ids(user_ids))
+
         users = []
-        for user_dn in self.group.list_group_users(group_id):
-            user_id = self.user._dn_to_id(user_dn)
-            try:
-                users.append(self.user.get_filtered(user_id))
-            except exception.UserNotFound:
+        for user_dn, user_id in zip(user_dns, user_ids):
+            user = found.get(user_id.lower())
+            if user is None:
                 LOG.debug(("Group member '%(user_dn)s' not found in"
                            " '%(group_id)s'. The user should be removed"
                            " from the group. The user will be ignored."),
                           dict(user_dn=user_dn, group_id=group_id))
+                continue
+            users.append(self.user.filter_attributes(user))
         return users
 
     def check_user_in_group(self, user_id, group_id):
-        user_refs = self.list_users_in_group(group_id, driver_hints.Hints())
-        for x in user_refs:
-            if x['id'] == user_id:
-                break
-        else:
-            # Try to fetch the user to see if it even exists.  This
-            # will raise a more accurate exception.
-            self.get_user(user_id)
+        user_ref = self._get_user(user_id)
+        if not self.group.has_member(group_id, user_ref['dn']):
             raise exception.NotFound(_("User '%(user_id)s' not found in"
                                        " group '%(group_id)s'") %
                                      {'user_id': user_id,
@@ -258,8 +261,9 @@ class UserApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap):
         user = self.get(user_id)
         return self.filter_attributes(user)
 
-    def get_all_filtered(self):
-        return [self.filter_attributes(user) for user in self.get_all()]
+    def get_all_filtered(self, hints=None):
+        return [self.filter_attributes(user)
+                for user in self.get_all(hints=hints)]
 
     def filter_attributes(self, user):
         return identity.filter_user(common_ldap.filter_entity(user))
@@ -351,7 +355,7 @@ class GroupApi(common_ldap.BaseLdap):
                                                   self.ldap_filter or '')
         return self.get_all(query)
 
-    def list_user_groups_filtered(self, user_dn):
+    def list_user_groups_filtered(self, user_dn, hints=None):
         """Return a filtered list of groups for which the user is a member."""
 
         user_dn_esc = ldap.filter.escape_filter_chars(user_dn)
@@ -359,7 +363,17 @@ class GroupApi(common_ldap.BaseLdap):
                                                   self.member_attribute,
                                                   user_dn_esc,
                                                   self.ldap_filter or '')
-        return self.get_all_filtered(query)
+        return self.get_all_filtered(hints, query)
+
+    def has_member(self, group_id, member_dn):
+        """Tells whether member_dn is a member of the group."""
+        query = u'(%s=%s)' % (self.member_attribute,
+                              ldap.filter.escape_filter_chars(member_dn))
+        if self._ldap_get(group_id, query + (self.ldap_filter or '')):
+            return True
+        # Raise GroupNotFound for groups that don't exist.
+        self.get(group_id)
+        return False
 
     def list_group_users(self, group_id):
         """Return a list of user dns which are members of a group."""
@@ -385,6 +399,6 @@ class GroupApi(common_ldap.BaseLdap):
         group = self.get(group_id)
         return common_ldap.filter_entity(group)
 
-    def get_all_filtered(self, query=None):
+    def get_all_filtered(self, hints=None, query=None):
         return [common_ldap.filter_entity(group)
-                for group in self.get_all(query)]
+                for group in self.get_all(query, hints)]
@@ -119,7 +119,8 @@ class Identity(identity.Driver):
         https://blueprints.launchpad.net/keystone/+spec/sql-identiy-pam
 
         """
-        return utils.check_password(password, user_ref.password)
+        return identity.VERIFIED_PASSWORDS.check_password(
+            user_ref.id, password, user_ref.password)
 
     # Identity interface
     def authenticate(self, user_id, password):
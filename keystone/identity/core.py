@@ -15,8 +15,13 @@
 """Main entry point into the Identity service."""
 
 import abc
+import collections
 import functools
+import hashlib
+import hmac
 import os
+import threading
+import time
 import uuid
 
 from oslo.config import cfg
@@ -27,6 +32,7 @@ from keystone import clean
 from keystone.common import dependency
 from keystone.common import driver_hints
 from keystone.common import manager
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.i18n import _
@@ -66,6 +72,71 @@ def filter_user(user_ref):
     return user_ref
 
 
+class VerifiedPasswordCache(object):
+    """Remembers the passwords recently verified for each user.
+
+    Checking a password against its sha512_crypt hash is slow on purpose,
+    which hurts clients that authenticate with the same credentials over
+    and over. Once a password matched, the cache keeps an HMAC of it and of
+    the hash it matched, under a key that never leaves the process, for
+    ``[identity] verified_password_cache_time`` seconds. Neither the
+    password nor anything that can be checked offline is stored, and a new
+    hash never matches the entries made for the old one.
+
+    """
+
+    def __init__(self):
+        self._key = os.urandom(32)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, password, hashed):
+        if isinstance(password, six.text_type):
+            password = password.encode('utf-8')
+        if isinstance(hashed, six.text_type):
+            hashed = hashed.encode('utf-8')
+        return hmac.new(self._key, hashed + b'\x00' + password,
+                        hashlib.sha256).hexdigest()
+
+    def check_password(self, user_id, password, hashed):
+        """Same as ``utils.check_password``, remembering the matches."""
+        if (not CONF.identity.cache_verified_passwords or
+                password is None or hashed is None):
+            return utils.check_password(password, hashed)
+
+        digest = self._digest(password, hashed)
+        entry = self._entries.get(user_id)
+        if (entry is not None and entry[1] > time.time() and
+                utils.auth_str_equal(entry[0], digest)):
+            return True
+
+        if not utils.check_password(password, hashed):
+            return False
+        now = time.time()
+        size = CONF.identity.verified_password_cache_size
+        with self._lock:
+            if len(self._entries) >= size:
+                for key, entry in list(self._entries.items()):
+                    if entry[1] <= now:
+                        del self._entries[key]
+                if len(self._entries) >= size:
+                    self._entries.clear()
+            self._entries[user_id] = (
+                digest, now + CONF.identity.verified_password_cache_time)
+        return True
+
+    def invalidate(self, user_id=None):
+        """Forgets the passwords of a user, or of everybody."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+VERIFIED_PASSWORDS = VerifiedPasswordCache()
+
+
 class DomainConfigs(dict):
     """Discover, store and provide access to domain specific configs.
 
@@ -271,9 +342,32 @@ class Manager(manager.Manager):
     _GROUP = 'group'
 
     def __init__(self):
+        self.event_callbacks = {
+            notifications.ACTIONS.updated: {
+                self._USER: [self._invalidate_verified_password_callback],
+            },
+            notifications.ACTIONS.deleted: {
+                self._USER: [self._invalidate_verified_password_callback],
+            },
+            notifications.ACTIONS.internal: {
+                notifications.INVALIDATE_USER_TOKEN_PERSISTENCE: [
+                    self._invalidate_verified_password_callback],
+            },
+        }
         super(Manager, self).__init__(CONF.identity.driver)
         self.domain_configs = DomainConfigs()
 
+    def _invalidate_verified_password_callback(self, service, resource_type,
+                                               operation, payload):
+        if not CONF.identity.cache_verified_passwords:
+            return
+        # NOTE(garcianavalon) the drivers remember passwords by their local
+        # user ids, which only differ from the public ones with mappings.
+        if self.id_mapping_api.get_id_mapping(payload['resource_info']):
+            VERIFIED_PASSWORDS.invalidate()
+        else:
+            VERIFIED_PASSWORDS.invalidate(payload['resource_info'])
+
     # Domain ID normalization methods
 
     def _set_domain_id_and_mapping(self, ref, domain_id, driver,
@@ -324,8 +418,8 @@ class Manager(manager.Manager):
             return self._set_domain_id_and_mapping_for_single_ref(
                 ref, domain_id, driver, entity_type, conf)
         elif isinstance(ref, list):
-            return [self._set_domain_id_and_mapping(
-                    x, domain_id, driver, entity_type) for x in ref]
+            return self._set_domain_id_and_mapping_for_list(
+                ref, domain_id, driver, entity_type, conf)
         else:
             raise ValueError(_('Expected dict or list: %s') % type(ref))
 
@@ -361,6 +455,59 @@ class Manager(manager.Manager):
                           ref['id'])
         return ref
 
+    def _set_domain_id_and_mapping_for_list(self, ref_list, domain_id,
+                                            driver, entity_type, conf):
+        """Patch the domain_id/public_id into a list of entities.
+
+        The mappings of the whole list are read and created at once.
+
+        """
+        ref_list = [ref.copy() for ref in ref_list]
+        for ref in ref_list:
+            self._insert_domain_id_if_needed(ref, driver, domain_id, conf)
+
+        if not ref_list or not self._is_mapping_needed(driver):
+            return ref_list
+
+        local_entities = [{'domain_id': ref['domain_id'],
+                           'local_id': ref['id'],
+                           'entity_type': entity_type}
+                          for ref in ref_list]
+        public_ids = self.id_mapping_api.get_public_ids(local_entities)
+
+        missing = {}
+        for local_entity, public_id in zip(local_entities, public_ids):
+            if not public_id:
+                missing.setdefault(
+                    (local_entity['domain_id'], local_entity['local_id']),
+                    local_entity)
+        if missing:
+            new_entities = list(missing.values())
+            # Need to create the mappings. If the driver generates UUIDs
+            # then pass the local UUIDs in as the public IDs to use.
+            new_public_ids = None
+            if driver.generates_uuids():
+                new_public_ids = [local_entity['local_id']
+                                  for local_entity in new_entities]
+            new_public_ids = self.id_mapping_api.create_id_mappings(
+                new_entities, new_public_ids)
+            LOG.debug('Created %d new mappings to public IDs',
+                      len(new_public_ids))
+            created = dict(
+                ((local_entity['domain_id'], local_entity['local_id']),
+                 public_id)
+                for local_entity, public_id in zip(new_entities,
+                                                   new_public_ids))
+            public_ids = [
+                public_id or created[(local_entity['domain_id'],
+                                      local_entity['local_id'])]
+                for local_entity, public_id in zip(local_entities,
+                                                   public_ids)]
+
+        for ref, public_id in zip(ref_list, public_ids):
+            ref['id'] = public_id
+        return ref_list
+
     def _insert_domain_id_if_needed(self, ref, driver, domain_id, conf):
         """Inserts the domain ID into the ref, if required.
 
@@ -1057,12 +1204,112 @@ class Driver(object):
     # end of identity
 
 
+def _local_entity_key(local_entity):
+    return (local_entity['domain_id'], local_entity['local_id'],
+            local_entity['entity_type'])
+
+
+class PublicIDCache(object):
+    """Remembers the public IDs of the most recently used local entities.
+
+    A mapping doesn't change until it is deleted, so the entries don't
+    expire, the least recently used ones are dropped once ``size`` of them
+    are stored.
+
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._keys_by_public_id = {}
+        self._lock = threading.Lock()
+
+    def get(self, local_entity):
+        key = _local_entity_key(local_entity)
+        with self._lock:
+            public_id = self._entries.pop(key, None)
+            if public_id is not None:
+                self._entries[key] = public_id
+        return public_id
+
+    def add(self, local_entity, public_id):
+        key = _local_entity_key(local_entity)
+        with self._lock:
+            self._remove(self._entries.get(key))
+            while len(self._entries) >= self.size:
+                self._remove(next(iter(self._entries.values())))
+            self._entries[key] = public_id
+            self._keys_by_public_id[public_id] = key
+
+    def _remove(self, public_id):
+        key = self._keys_by_public_id.pop(public_id, None)
+        if key is not None:
+            self._entries.pop(key, None)
+
+    def invalidate(self, public_id=None):
+        """Forgets a public ID, or all of them."""
+        with self._lock:
+            if public_id is None:
+                self._entries.clear()
+                self._keys_by_public_id.clear()
+            else:
+                self._remove(public_id)
+
+
 @dependency.provider('id_mapping_api')
 class MappingManager(manager.Manager):
     """Default pivot point for the ID Mapping backend."""
 
     def __init__(self):
         super(MappingManager, self).__init__(CONF.identity_mapping.driver)
+        self.public_ids = None
+        if CONF.identity_mapping.public_id_cache_size > 0:
+            self.public_ids = PublicIDCache(
+                CONF.identity_mapping.public_id_cache_size)
+
+    def get_public_id(self, local_entity):
+        return self.get_public_ids([local_entity])[0]
+
+    def get_public_ids(self, local_entities):
+        if self.public_ids is None:
+            return self.driver.get_public_ids(local_entities)
+
+        public_ids = [self.public_ids.get(local_entity)
+                      for local_entity in local_entities]
+        missing = [i for i, public_id in enumerate(public_ids)
+                   if public_id is None]
+        if missing:
+            found = self.driver.get_public_ids(
+                [local_entities[i] for i in missing])
+            for i, public_id in zip(missing, found):
+                if public_id is not None:
+                    public_ids[i] = public_id
+                    self.public_ids.add(local_entities[i], public_id)
+        return public_ids
+
+    def create_id_mapping(self, local_entity, public_id=None):
+        public_id = self.driver.create_id_mapping(local_entity, public_id)
+        if self.public_ids is not None:
+            self.public_ids.add(local_entity, public_id)
+        return public_id
+
+    def create_id_mappings(self, local_entities, public_ids=None):
+        public_ids = self.driver.create_id_mappings(local_entities,
+                                                    public_ids)
+        if self.public_ids is not None:
+            for local_entity, public_id in zip(local_entities, public_ids):
+                self.public_ids.add(local_entity, public_id)
+        return public_ids
+
+    def delete_id_mapping(self, public_id):
+        self.driver.delete_id_mapping(public_id)
+        if self.public_ids is not None:
+            self.public_ids.invalidate(public_id)
+
+    def purge_mappings(self, purge_filter):
+        self.driver.purge_mappings(purge_filter)
+        if self.public_ids is not None:
+            self.public_ids.invalidate()
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -1080,6 +1327,18 @@ class MappingDriver(object):
         """
         raise exception.NotImplemented()  # pragma: no cover
 
+    def get_public_ids(self, local_entities):
+        """Returns the public IDs for a list of local entities.
+
+        :param list local_entities: The local entities, as given to
+                                    get_public_id.
+        :returns: list with the public ID of each local entity, or None for
+                  the ones without a mapping.
+
+        """
+        return [self.get_public_id(local_entity)
+                for local_entity in local_entities]
+
     @abc.abstractmethod
     def get_id_mapping(self, public_id):
         """Returns the local mapping.
@@ -1104,6 +1363,23 @@ class MappingDriver(object):
         """
         raise exception.NotImplemented()  # pragma: no cover
 
+    def create_id_mappings(self, local_entities, public_ids=None):
+        """Create and store the mappings of a list of local entities.
+
+        :param list local_entities: The local entities, as given to
+                                    create_id_mapping.
+        :param list public_ids: If specified, the public ID of each local
+                                entity, any of which may be None to have it
+                                generated.
+        :returns: list of public IDs
+
+        """
+        if public_ids is None:
+            public_ids = [None] * len(local_entities)
+        return [self.create_id_mapping(local_entity, public_id)
+                for local_entity, public_id in zip(local_entities,
+                                                   public_ids)]
+
     @abc.abstractmethod
     def delete_id_mapping(self, public_id):
         """Deletes an entry for the given public_id.
@@ -18,6 +18,18 @@ from keystone import identity
 from keystone.identity.mapping_backends import mapping as identity_mapping
 
 
+# NOTE(garcianavalon) keep the IN lists and the executemany batches to a
+# reasonable size for every dialect (SQLite limits the bound parameters of
+# a statement)
+BULK_BATCH_SIZE = 100
+
+
+def _batches(items, batch_size=BULK_BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
 class IDMapping(sql.ModelBase, sql.ModelDictMixin):
     __tablename__ = 'id_mapping'
     public_id = sql.Column(sql.String(64), primary_key=True)
@@ -57,6 +69,30 @@ class Mapping(identity.MappingDriver):
         except sql.NotFound:
             return None
 
+    def get_public_ids(self, local_entities):
+        local_ids = {}
+        for local_entity in local_entities:
+            local_ids.setdefault(
+                (local_entity['domain_id'], local_entity['entity_type']),
+                set()).add(local_entity['local_id'])
+
+        session = sql.get_session()
+        public_ids = {}
+        for (domain_id, entity_type), ids in local_ids.items():
+            for batch in _batches(ids):
+                query = session.query(IDMapping.local_id,
+                                      IDMapping.public_id)
+                query = query.filter_by(domain_id=domain_id)
+                query = query.filter_by(entity_type=entity_type)
+                query = query.filter(IDMapping.local_id.in_(batch))
+                for local_id, public_id in query:
+                    public_ids[(domain_id, local_id, entity_type)] = public_id
+
+        return [public_ids.get((local_entity['domain_id'],
+                                local_entity['local_id'],
+                                local_entity['entity_type']))
+                for local_entity in local_entities]
+
     def get_id_mapping(self, public_id):
         session = sql.get_session()
         mapping_ref = session.query(IDMapping).get(public_id)
@@ -73,6 +109,22 @@ class Mapping(identity.MappingDriver):
             session.add(mapping_ref)
         return public_id
 
+    def create_id_mappings(self, local_entities, public_ids=None):
+        if public_ids is None:
+            public_ids = [None] * len(local_entities)
+        rows = []
+        for local_entity, public_id in zip(local_entities, public_ids):
+            row = local_entity.copy()
+            if public_id is None:
+                public_id = self.id_generator_api.generate_public_ID(row)
+            row['public_id'] = public_id
+            rows.append(row)
+
+        with sql.transaction() as session:
+            for batch in _batches(rows):
+                session.execute(IDMapping.__table__.insert(), batch)
+        return [row['public_id'] for row in rows]
+
     def delete_id_mapping(self, public_id):
         with sql.transaction() as session:
             try:
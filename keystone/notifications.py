@@ -18,6 +18,8 @@ import collections
 import inspect
 import logging
 import socket
+import threading
+import time
 
 from oslo.config import cfg
 from oslo import messaging
@@ -27,14 +29,35 @@ from pycadf import cadftype
 from pycadf import credential
 from pycadf import eventfactory
 from pycadf import resource
+from six.moves import queue
 
 from keystone.i18n import _
+from keystone.i18n import _LI
+from keystone.i18n import _LW
 from keystone.openstack.common import log
 
 
 notifier_opts = [
     cfg.StrOpt('default_publisher_id',
                help='Default publisher_id for outgoing notifications'),
+    cfg.BoolOpt('async_notifications', default=False,
+                help='Send notifications to the message bus and run the '
+                     'event callbacks marked as deferrable from a pool of '
+                     'background workers, instead of inside the request '
+                     'that triggered them. Callbacks that are not marked '
+                     'as deferrable always run synchronously.'),
+    cfg.IntOpt('notification_workers', default=4,
+               help='Number of background workers used when '
+                    'async_notifications is enabled. Notifications about '
+                    'the same resource are handled by the same worker, '
+                    'in order, unless its queue is full. The queue depth and wait times are logged '
+                    'every minute while there are notifications.'),
+    cfg.IntOpt('notification_queue_size', default=1000,
+               help='Maximum number of notifications waiting for a '
+                    'background worker, split evenly between the '
+                    'workers. When the queue of a worker is full, '
+                    'notifications are handled inside the request that '
+                    'triggered them.'),
 ]
 
 LOG = log.getLogger(__name__)
@@ -50,6 +73,8 @@ SAML_AUDIT_TYPE = 'http://docs.oasis-open.org/security/saml/v2.0'
 # resource types that can be notified
 _SUBSCRIBERS = {}
 _notifier = None
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
 
 
 CONF = cfg.CONF
@@ -153,6 +178,177 @@ def internal(*args, **kwargs):
     return ManagerNotificationWrapper(ACTIONS.internal, *args, **kwargs)
 
 
+def deferrable(callback):
+    """Marks an event callback that does not need to finish in the request.
+
+    When ``async_notifications`` is enabled, deferrable callbacks run on a
+    background worker after the notifying call has returned. Only mark
+    callbacks whose effects nobody relies on right away, like cleaning up
+    associations of a deleted entity; anything that revokes access must
+    stay synchronous.
+
+    """
+    callback.deferrable = True
+    return callback
+
+
+class Dispatcher(object):
+    """Runs notification jobs on a bounded pool of background workers.
+
+    Each worker has its own queue. Jobs with the same key, the id of the
+    notified resource, always go to the same worker, so they are handled
+    in the order they were submitted. When the queue of a worker is full,
+    jobs run in the calling thread instead, which slows down the callers
+    rather than letting the backlog grow without limit, but those jobs may
+    run before older jobs with the same key.
+
+    The statistics are logged every ``stats_interval`` seconds while jobs
+    are being handled.
+
+    """
+
+    def __init__(self, workers, queue_size, stats_interval=60):
+        self._workers = max(workers, 1)
+        worker_queue_size = max(queue_size // self._workers, 1)
+        self._queues = [queue.Queue(worker_queue_size)
+                        for i in range(self._workers)]
+        self._threads = [None] * self._workers
+        self._next_queue = 0
+        self._lock = threading.Lock()
+        self._stats_interval = stats_interval
+        self._last_stats = time.time()
+        self.dispatched = 0
+        self.inline = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _start_worker(self, index):
+        with self._lock:
+            thread = self._threads[index]
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._run,
+                                          args=(self._queues[index],),
+                                          name='keystone-notifications')
+                thread.daemon = True
+                thread.start()
+                self._threads[index] = thread
+
+    def _queue_index(self, key):
+        if key is not None:
+            return hash(key) % self._workers
+        with self._lock:
+            index = self._next_queue
+            self._next_queue = (index + 1) % self._workers
+        return index
+
+    def submit(self, description, function, *args, **kwargs):
+        """Queues ``function(*args)``, or runs it now if the queue is full.
+
+        Jobs submitted with the same ``key`` keyword argument are handled
+        in order.
+
+        """
+        index = self._queue_index(kwargs.get('key'))
+        thread = self._threads[index]
+        if thread is None or not thread.is_alive():
+            self._start_worker(index)
+        try:
+            self._queues[index].put_nowait((time.time(), description,
+                                            function, args))
+        except queue.Full:
+            with self._lock:
+                self.inline += 1
+            LOG.warning(_LW('Notification queue is full, handling '
+                            '%s synchronously'), description)
+            self._call(description, function, args)
+
+    def _call(self, description, function, args):
+        try:
+            function(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            LOG.exception(_('Failed to handle notification %s'), description)
+
+    def _run(self, jobs):
+        while True:
+            queued_at, description, function, args = jobs.get()
+            try:
+                wait = time.time() - queued_at
+                with self._lock:
+                    self._wait_total += wait
+                    self._wait_max = max(self._wait_max, wait)
+                    self.dispatched += 1
+                self._call(description, function, args)
+            finally:
+                jobs.task_done()
+            self._log_stats()
+
+    def _log_stats(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_stats < self._stats_interval:
+                return
+            self._last_stats = now
+        LOG.info(_LI('Notification dispatcher: %(pending)d pending of '
+                     '%(queue_size)d, %(dispatched)d dispatched, '
+                     '%(inline)d handled synchronously, %(failed)d failed, '
+                     'average wait %(average_wait).3f s, maximum wait '
+                     '%(max_wait).3f s'), self.stats())
+
+    def join(self):
+        """Blocks until every queued job has been handled."""
+        for jobs in self._queues:
+            jobs.join()
+
+    def stats(self):
+        """Returns the queue depth and how long jobs waited in the queue.
+
+        ``pending`` counts the queued and running jobs, ``inline`` the jobs
+        that ran in the caller because the queue was full, and the wait
+        times are in seconds.
+
+        """
+        with self._lock:
+            dispatched = self.dispatched
+            return {'pending': sum(jobs.unfinished_tasks
+                                   for jobs in self._queues),
+                    'queue_size': sum(jobs.maxsize for jobs in self._queues),
+                    'workers': self._workers,
+                    'dispatched': dispatched,
+                    'inline': self.inline,
+                    'failed': self.failed,
+                    'average_wait': (self._wait_total / dispatched
+                                     if dispatched else 0.0),
+                    'max_wait': self._wait_max}
+
+
+def _get_dispatcher():
+    """Return the dispatcher, or None to handle notifications in place."""
+    global _dispatcher
+
+    if not CONF.async_notifications:
+        return None
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher(CONF.notification_workers,
+                                         CONF.notification_queue_size)
+    return _dispatcher
+
+
+def get_dispatch_stats():
+    """Return the statistics of the background dispatcher, if it is used."""
+    dispatcher = _get_dispatcher()
+    return dispatcher.stats() if dispatcher else None
+
+
+def reset_dispatcher():
+    global _dispatcher
+    _dispatcher = None
+
+
 def _get_callback_info(callback):
     if getattr(callback, 'im_class', None):
         return [getattr(callback, '__module__', None),
@@ -198,6 +394,17 @@ def notify_event_callbacks(service, resource_type, operation, payload):
                               'resource_type': resource_type,
                               'operation': operation,
                               'payload': payload}
+                dispatcher = _get_dispatcher()
+                if dispatcher and getattr(cb, 'deferrable', False) is True:
+                    LOG.debug('Deferring callback %(cb_name)s for event '
+                              '%(service)s %(resource_type)s %(operation)s '
+                              'for %(payload)s', subst_dict)
+                    dispatcher.submit(
+                        '%(service)s.%(resource_type)s.%(operation)s to '
+                        '%(cb_name)s' % subst_dict,
+                        cb, service, resource_type, operation, payload,
+                        key=payload.get('resource_info'))
+                    continue
                 LOG.debug('Invoking callback %(cb_name)s for event '
                           '%(service)s %(resource_type)s %(operation)s for'
                           '%(payload)s', subst_dict)
@@ -261,12 +468,28 @@ def _send_notification(operation, resource_type, resource_id, public=True):
                 'service': service,
                 'resource_type': resource_type,
                 'operation': operation}
-            try:
-                notifier.info(context, event_type, payload)
-            except Exception:
-                LOG.exception(_(
-                    'Failed to send %(res_id)s %(event_type)s notification'),
-                    {'res_id': resource_id, 'event_type': event_type})
+            _notify(notifier, context, event_type, payload, resource_id,
+                    key=resource_id)
+
+
+def _notify(notifier, context, event_type, payload, resource_id, key):
+    dispatcher = _get_dispatcher()
+    if dispatcher:
+        dispatcher.submit(event_type, _info, notifier, context, event_type,
+                          payload, resource_id, key=key)
+    else:
+        _info(notifier, context, event_type, payload, resource_id)
+
+
+def _info(notifier, context, event_type, payload, resource_id):
+    # diaper defense: any exception that occurs while emitting the
+    # notification should not interfere with the API request
+    try:
+        notifier.info(context, event_type, payload)
+    except Exception:
+        LOG.exception(_(
+            'Failed to send %(res_id)s %(event_type)s notification'),
+            {'res_id': resource_id, 'event_type': event_type})
 
 
 def _get_request_audit_info(context, user_id=None):
@@ -447,14 +670,9 @@ def _send_audit_notification(action, initiator, outcome, **kwargs):
     notifier = _get_notifier()
 
     if notifier:
-        try:
-            notifier.info(context, event_type, payload)
-        except Exception:
-            # diaper defense: any exception that occurs while emitting the
-            # notification should not interfere with the API request
-            LOG.exception(_(
-                'Failed to send %(action)s %(event_type)s notification'),
-                {'action': action, 'event_type': event_type})
+        # NOTE(garcianavalon) keep the events of each initiator in order.
+        _notify(notifier, context, event_type, payload, action,
+                key=getattr(initiator, 'name', None))
 
 
 emit_event = CadfNotificationWrapper
@@ -15,8 +15,11 @@
 
 """Policy engine for keystone"""
 
+import ast
 import os.path
 
+import six
+
 from keystone.common import utils
 from keystone import config
 from keystone import exception
@@ -32,15 +35,18 @@ LOG = log.getLogger(__name__)
 _ENFORCER = None
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_COMPILED_RULES = None
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
     global _ENFORCER
+    global _COMPILED_RULES
     _POLICY_PATH = None
     _POLICY_CACHE = {}
     _ENFORCER = None
+    _COMPILED_RULES = None
 
 
 def init():
@@ -65,6 +71,148 @@ def _set_rules(data):
         data, default_rule))
 
 
+def _deny(target, creds):
+    return False
+
+
+def _compile_check(check, compiled):
+    """Turns a tree of policy checks into a single function.
+
+    The function takes the target and the credentials and gives the same
+    result as the check. Referenced rules are looked up in ``compiled``
+    when the function runs, so rules can be compiled in any order. Check
+    types that are not known here are called as they are.
+
+    """
+    kind = type(check)
+
+    if kind is common_policy.TrueCheck:
+        return lambda target, creds: True
+
+    if kind is common_policy.FalseCheck:
+        return _deny
+
+    if kind is common_policy.NotCheck:
+        rule = _compile_check(check.rule, compiled)
+        return lambda target, creds: not rule(target, creds)
+
+    if kind is common_policy.AndCheck:
+        and_rules = [_compile_check(r, compiled) for r in check.rules]
+
+        def and_check(target, creds):
+            for rule in and_rules:
+                if not rule(target, creds):
+                    return False
+            return True
+        return and_check
+
+    if kind is common_policy.OrCheck:
+        or_rules = [_compile_check(r, compiled) for r in check.rules]
+
+        def or_check(target, creds):
+            for rule in or_rules:
+                if rule(target, creds):
+                    return True
+            return False
+        return or_check
+
+    if kind is common_policy.RuleCheck:
+        name = check.match
+
+        def rule_check(target, creds):
+            # NOTE(garcianavalon) like RuleCheck, a rule that looks up
+            # something missing from the credentials fails closed.
+            try:
+                return compiled[name](target, creds)
+            except KeyError:
+                return False
+        return rule_check
+
+    if kind is common_policy.RoleCheck:
+        role = check.match.lower()
+        return lambda target, creds: role in [x.lower()
+                                              for x in creds['roles']]
+
+    if kind is common_policy.GenericCheck:
+        return _compile_generic_check(check) or (
+            lambda target, creds: check(target, creds, compiled.enforcer))
+
+    return lambda target, creds: check(target, creds, compiled.enforcer)
+
+
+def _compile_generic_check(check):
+    """Compiles checks like ``project_id:%(project_id)s``.
+
+    The left side is resolved once, either to a literal or to the path of
+    the credential to compare with.
+
+    """
+    match = check.match
+    literal = kind_parts = None
+    try:
+        literal = six.text_type(ast.literal_eval(check.kind))
+    except ValueError:
+        kind_parts = check.kind.split('.')
+    except Exception:
+        # NOTE(garcianavalon) leave anything else to the check itself, so
+        # that it fails when enforced and not when the rules are loaded.
+        return None
+
+    def generic_check(target, creds):
+        try:
+            value = match % target
+        except KeyError:
+            return False
+        if kind_parts is None:
+            return value == literal
+        leftval = creds
+        try:
+            for kind_part in kind_parts:
+                leftval = leftval[kind_part]
+        except KeyError:
+            return False
+        return value == six.text_type(leftval)
+    return generic_check
+
+
+class _CompiledRules(dict):
+    """The compiled functions of a set of rules, by rule name.
+
+    Unknown names give the default rule, or deny when there is none, just
+    like :class:`keystone.openstack.common.policy.Rules`.
+
+    """
+
+    def __init__(self, rules, enforcer):
+        super(_CompiledRules, self).__init__()
+        self.rules = rules
+        self.enforcer = enforcer
+        for name, check in six.iteritems(rules):
+            self[name] = _compile_check(check, self)
+
+        default = rules.default_rule
+        if isinstance(default, common_policy.BaseCheck):
+            self._default = _compile_check(default, self)
+        elif isinstance(default, six.string_types) and default in self:
+            self._default = self[default]
+        else:
+            self._default = _deny
+
+    def __missing__(self, name):
+        return self._default
+
+
+def _get_compiled_rules():
+    global _COMPILED_RULES
+    compiled = _COMPILED_RULES
+    # NOTE(garcianavalon) set_rules always replaces the Rules object, so
+    # its identity tells whether the rules were reloaded.
+    if compiled is None or compiled.rules is not _ENFORCER.rules:
+        compiled = _CompiledRules(_ENFORCER.rules, _ENFORCER)
+        _COMPILED_RULES = compiled
+    return compiled
+
+
 def enforce(credentials, action, target, do_raise=True):
     """Verifies that the action is valid on the target in this context.
 
@@ -84,6 +232,17 @@ def enforce(credentials, action, target, do_raise=True):
     """
     init()
 
+    if CONF.policy.compile_rules:
+        # NOTE(garcianavalon) like the interpreted rules, credentials
+        # missing what a rule needs deny the action.
+        try:
+            result = _get_compiled_rules()[action](target, credentials)
+        except KeyError:
+            result = False
+        if do_raise and not result:
+            raise exception.ForbiddenAction(action=action)
+        return result
+
     # Add the exception arguments if asked to do a raise
     extra = {}
     if do_raise:
@@ -22,6 +22,7 @@ library to work with nova.
 
 """
 
+import itertools
 import re
 import shelve
 
@@ -142,6 +143,14 @@ def _match(key, value, attrs):
         # them
         str_sids = [six.text_type(x) for x in attrs[key]]
         return six.text_type(value) in str_sids
+    if '*' in value:
+        # A substring search, matched regardless of case like most LDAP
+        # attributes are.
+        pattern = '.*'.join(re.escape(_unescape(core.utf8_decode(part)))
+                            for part in value.split('*'))
+        regex = re.compile('^%s$' % pattern, re.IGNORECASE | re.UNICODE)
+        return any(regex.match(_internal_attr(key, x)[0])
+                   for x in attrs[key])
     if key != 'objectclass':
         check_value = _internal_attr(key, value)[0]
         norm_values = list(_internal_attr(key, x)[0] for x in attrs[key])
@@ -154,6 +163,12 @@ def _match(key, value, attrs):
     return False
 
 
+def _unescape(value):
+    """Reverts ``ldap.filter.escape_filter_chars``."""
+    return re.sub(r'\\([0-9a-fA-F]{2})',
+                  lambda m: six.unichr(int(m.group(1), 16)), value)
+
+
 def _subs(value):
     """Returns a list of subclass strings.
 
@@ -199,10 +214,12 @@ class FakeLdap(core.LDAPHandler):
     '''
 
     __prefix = 'ldap:'
+    _msgids = itertools.count(1)
 
     def __init__(self, conn=None):
         super(FakeLdap, self).__init__(conn=conn)
         self._ldap_options = {ldap.OPT_DEREF: ldap.DEREF_NEVER}
+        self._searches = {}
 
     def connect(self, url, page_size=0, alias_dereferencing=None,
                 use_tls=False, tls_cacertfile=None, tls_cacertdir=None,
@@ -502,11 +519,39 @@ class FakeLdap(core.LDAPHandler):
                    filterstr='(objectClass=*)', attrlist=None, attrsonly=0,
                    serverctrls=None, clientctrls=None,
                    timeout=-1, sizelimit=0):
-        raise exception.NotImplemented()
+        if serverctrls:
+            # paged results are not emulated
+            raise exception.NotImplemented()
+        msgid = next(self._msgids)
+        results = self.search_s(base, scope, filterstr, attrlist, attrsonly)
+        self._searches[msgid] = [results, sizelimit or None]
+        return msgid
 
     def result3(self, msgid=ldap.RES_ANY, all=1, timeout=None,
                 resp_ctrl_classes=None):
-        raise exception.NotImplemented()
+        """Returns the entries found by search_ext.
+
+        Like a server, this raises SIZELIMIT_EXCEEDED once the entries
+        allowed by the sizelimit of the search have been returned and more
+        were found.
+
+        """
+        search = self._searches[msgid]
+        results, remaining = search
+        if all:
+            del self._searches[msgid]
+            if remaining is not None and len(results) > remaining:
+                raise ldap.SIZELIMIT_EXCEEDED
+            return ldap.RES_SEARCH_RESULT, results, msgid, []
+        if not results:
+            del self._searches[msgid]
+            return ldap.RES_SEARCH_RESULT, [], msgid, []
+        if remaining == 0:
+            del self._searches[msgid]
+            raise ldap.SIZELIMIT_EXCEEDED
+        if remaining is not None:
+            search[1] -= 1
+        return ldap.RES_SEARCH_ENTRY, [results.pop(0)], msgid, []
 
 
 class FakeLdapPool(FakeLdap):
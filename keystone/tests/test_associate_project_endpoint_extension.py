@@ -13,8 +13,11 @@
 # under the License.
 
 import copy
+import functools
 import uuid
 
+import mock
+
 # NOTE(morganfainberg): import endpoint filter to populate the SQL model
 from keystone.contrib import endpoint_filter  # flake8: noqa
 from keystone.tests import test_v3
@@ -1029,6 +1032,37 @@ class EndpointGroupCRUDTestCase(TestExtensionCase):
         self.delete(url)
         self.get(url, expected_status=404)
 
+    def test_project_endpoint_ids_cached_until_change(self):
+        body = copy.deepcopy(self.DEFAULT_ENDPOINT_GROUP_BODY)
+        body['endpoint_group']['filters'] = {'service_id': self.service_id}
+        endpoint_group_id = self._create_valid_endpoint_group(
+            self.DEFAULT_ENDPOINT_GROUP_URL, body)
+        self._create_endpoint_group_project_association(
+            endpoint_group_id, self.default_domain_project_id)
+
+        endpoint_filter_api = self.endpoint_filter_api
+        list_ids = functools.partial(
+            endpoint_filter_api.list_endpoint_ids_for_project,
+            self.default_domain_project_id)
+        self.assertEqual([self.endpoint_id], list_ids())
+
+        with mock.patch.object(endpoint_filter_api.driver,
+                               'get_endpoint_group') as get_endpoint_group:
+            self.assertEqual([self.endpoint_id], list_ids())
+        self.assertFalse(get_endpoint_group.called)
+
+        # a new endpoint of the service is matched by the group
+        endpoint_ref = self.new_endpoint_ref(service_id=self.service_id)
+        r = self.post('/endpoints', body={'endpoint': endpoint_ref})
+        endpoint_id = r.result['endpoint']['id']
+        self.assertEqual(sorted([self.endpoint_id, endpoint_id]), list_ids())
+
+        # and a group that does not match anything anymore is seen too
+        body['endpoint_group']['filters'] = {'service_id': uuid.uuid4().hex}
+        self.patch('/OS-EP-FILTER/endpoint_groups/%s' % endpoint_group_id,
+                   body=body)
+        self.assertEqual([], list_ids())
+
     def _create_valid_endpoint_group(self, url, body):
         r = self.post(url, body=body)
         return r.result['endpoint_group']['id']
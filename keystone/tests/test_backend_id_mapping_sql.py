@@ -15,10 +15,12 @@
 
 import uuid
 
+import mock
 from testtools import matchers
 
 from keystone.common import sql
 from keystone.identity.mapping_backends import mapping
+from keystone.identity.mapping_backends import sql as mapping_backend_sql
 from keystone.tests import identity_mapping as mapping_sql
 from keystone.tests import test_backend_sql
 
@@ -136,6 +138,77 @@ class SqlIDMapping(test_backend_sql.SqlTests):
         self.assertEqual(
             public_id, self.id_mapping_api.get_public_id(local_entity))
 
+    def test_bulk_id_mappings(self):
+        initial_mappings = len(mapping_sql.list_id_mappings())
+        local_entities = [{'domain_id': domain_id,
+                           'local_id': uuid.uuid4().hex,
+                           'entity_type': entity_type}
+                          for domain_id, entity_type in (
+                              (self.domainA['id'], mapping.EntityType.USER),
+                              (self.domainA['id'], mapping.EntityType.GROUP),
+                              (self.domainB['id'], mapping.EntityType.USER))]
+        self.assertEqual([None] * 3,
+                         self.id_mapping_api.get_public_ids(local_entities))
+
+        uuid_public_id = uuid.uuid4().hex
+        public_ids = self.id_mapping_api.create_id_mappings(
+            local_entities[:2], [None, uuid_public_id])
+        self.assertThat(mapping_sql.list_id_mappings(),
+                        matchers.HasLength(initial_mappings + 2))
+        self.assertEqual(uuid_public_id, public_ids[1])
+        self.assertEqual(
+            self.id_generator_api.generate_public_ID(local_entities[0]),
+            public_ids[0])
+
+        # the results follow the order of the entities asked for
+        self.assertEqual(
+            [None, public_ids[1], public_ids[0]],
+            self.id_mapping_api.get_public_ids(
+                [local_entities[2], local_entities[1], local_entities[0]]))
+        self.assertEqual(public_ids[0],
+                         self.id_mapping_api.get_public_id(local_entities[0]))
+
+    def test_bulk_id_mappings_batched(self):
+        local_entities = [{'domain_id': self.domainA['id'],
+                           'local_id': uuid.uuid4().hex,
+                           'entity_type': mapping.EntityType.USER}
+                          for _ in range(5)]
+        with mock.patch.object(mapping_backend_sql, 'BULK_BATCH_SIZE', 2):
+            public_ids = self.id_mapping_api.create_id_mappings(
+                local_entities)
+            self.assertEqual(
+                public_ids,
+                self.id_mapping_api.get_public_ids(local_entities))
+
+    def test_list_post_processed_in_bulk(self):
+        # a read only driver of domainA, which needs all its ids mapped
+        driver = mock.Mock()
+        driver.is_domain_aware.return_value = False
+        driver.generates_uuids.return_value = False
+        local_ids = [uuid.uuid4().hex for _ in range(3)]
+        self.id_mapping_api.create_id_mapping(
+            {'domain_id': self.domainA['id'], 'local_id': local_ids[0],
+             'entity_type': mapping.EntityType.USER})
+        initial_mappings = len(mapping_sql.list_id_mappings())
+
+        refs = [{'id': local_id} for local_id in local_ids + local_ids[1:2]]
+        with mock.patch.object(self.id_mapping_api, 'get_public_id'):
+            with mock.patch.object(self.id_mapping_api, 'create_id_mapping'):
+                mapped = self.identity_api._set_domain_id_and_mapping(
+                    refs, self.domainA['id'], driver,
+                    mapping.EntityType.USER)
+        self.assertThat(mapping_sql.list_id_mappings(),
+                        matchers.HasLength(initial_mappings + 2))
+        self.assertEqual(mapped[1], mapped[3])
+        for local_id, ref in zip(local_ids, mapped):
+            self.assertEqual(self.domainA['id'], ref['domain_id'])
+            self.assertEqual(
+                self.id_mapping_api.get_public_id(
+                    {'domain_id': self.domainA['id'], 'local_id': local_id,
+                     'entity_type': mapping.EntityType.USER}),
+                ref['id'])
+        self.assertEqual(local_ids[0], refs[0]['id'])
+
     def test_delete_public_id_is_silent(self):
         # Test that deleting an invalid public key is silent
         self.id_mapping_api.delete_id_mapping(uuid.uuid4().hex)
@@ -197,3 +270,64 @@ class SqlIDMapping(test_backend_sql.SqlTests):
         self.id_mapping_api.purge_mappings({})
         self.assertThat(mapping_sql.list_id_mappings(),
                         matchers.HasLength(initial_mappings))
+
+
+class SqlIDMappingCached(SqlIDMapping):
+    """Same tests with the public IDs kept in memory."""
+
+    def config_overrides(self):
+        super(SqlIDMappingCached, self).config_overrides()
+        self.config_fixture.config(group='identity_mapping',
+                                   public_id_cache_size=2)
+
+    def _create_mappings(self, count):
+        local_entities = [{'domain_id': self.domainA['id'],
+                           'local_id': uuid.uuid4().hex,
+                           'entity_type': mapping.EntityType.USER}
+                          for _ in range(count)]
+        public_ids = self.id_mapping_api.create_id_mappings(local_entities)
+        return local_entities, public_ids
+
+    def test_public_ids_read_once(self):
+        local_entities, public_ids = self._create_mappings(1)
+        self.id_mapping_api.public_ids.invalidate()
+        with mock.patch.object(self.id_mapping_api.driver, 'get_public_ids',
+                               wraps=self.id_mapping_api.driver.get_public_ids
+                               ) as get_public_ids:
+            for _ in range(2):
+                self.assertEqual(
+                    public_ids,
+                    self.id_mapping_api.get_public_ids(local_entities))
+        self.assertEqual(1, get_public_ids.call_count)
+
+    def test_missing_public_ids_not_cached(self):
+        local_entity = {'domain_id': self.domainA['id'],
+                        'local_id': uuid.uuid4().hex,
+                        'entity_type': mapping.EntityType.USER}
+        self.assertIsNone(self.id_mapping_api.get_public_id(local_entity))
+        public_id = self.id_mapping_api.create_id_mapping(local_entity)
+        self.assertEqual(public_id,
+                         self.id_mapping_api.get_public_id(local_entity))
+
+    def test_least_recently_used_forgotten(self):
+        local_entities, public_ids = self._create_mappings(3)
+        cache = self.id_mapping_api.public_ids
+        self.assertIsNone(cache.get(local_entities[0]))
+        self.assertEqual(public_ids[2], cache.get(local_entities[2]))
+
+        self.id_mapping_api.get_public_id(local_entities[1])
+        self.id_mapping_api.get_public_id(local_entities[0])
+        self.assertIsNone(cache.get(local_entities[2]))
+        self.assertEqual(public_ids[1], cache.get(local_entities[1]))
+
+    def test_deleted_mapping_forgotten(self):
+        local_entities, public_ids = self._create_mappings(1)
+        self.id_mapping_api.delete_id_mapping(public_ids[0])
+        self.assertIsNone(self.id_mapping_api.get_public_id(local_entities[0]))
+
+    def test_purged_mappings_forgotten(self):
+        local_entities, public_ids = self._create_mappings(2)
+        self.id_mapping_api.purge_mappings({'local_id':
+                                            local_entities[0]['local_id']})
+        self.assertEqual([None, public_ids[1]],
+                         self.id_mapping_api.get_public_ids(local_entities))
@@ -23,6 +23,7 @@ from testtools import matchers
 
 from keystone import assignment
 from keystone.common import cache
+from keystone.common import driver_hints
 from keystone.common import ldap as common_ldap
 from keystone.common.ldap import core as common_ldap_core
 from keystone.common import sql
@@ -1725,6 +1726,203 @@ class LDAPIdentity(BaseLDAPIdentity, tests.TestCase):
             self.assertNotIn('dn', group_ref)
         self.assertEqual(set(expected_group_ids), group_ids)
 
+    def test_list_users_filtered_in_ldap(self):
+        user = {'name': u'Ministry of Silly Walks',
+                'domain_id': CONF.identity.default_domain_id,
+                'password': uuid.uuid4().hex, 'enabled': True}
+        user = self.identity_api.create_user(user)
+        for comparator, value in [('equals', user['name']),
+                                  ('startswith', u'ministry'),
+                                  ('contains', u'Silly'),
+                                  ('endswith', u'WALKS')]:
+            hints = driver_hints.Hints()
+            hints.add_filter('name', value, comparator=comparator)
+            users = self.identity_api.list_users(hints=hints)
+            self.assertEqual([user['id']], [ref['id'] for ref in users])
+            # the driver satisfied the filter
+            self.assertEqual([], hints.filters)
+
+    def test_list_users_filter_escaped_in_ldap(self):
+        hints = driver_hints.Hints()
+        hints.add_filter('name', u'*)(sn=*', comparator='contains')
+        self.assertEqual([], self.identity_api.list_users(hints=hints))
+
+    def test_filters_left_to_the_controller(self):
+        hints = driver_hints.Hints()
+        hints.add_filter('name', self.user_foo['name'], case_sensitive=True)
+        hints.add_filter('enabled', True)
+        hints.add_filter('name', u'foo', comparator='unknown')
+        filters = list(hints.filters)
+        users = self.identity_api.list_users(hints=hints)
+        self.assertIn(self.user_foo['id'], [ref['id'] for ref in users])
+        self.assertEqual(filters, hints.filters)
+
+    def test_list_users_limited_in_ldap(self):
+        hints = driver_hints.Hints()
+        hints.set_limit(1)
+        with mock.patch.object(fakeldap.FakeLdap, 'search_ext',
+                               autospec=True,
+                               side_effect=fakeldap.FakeLdap.search_ext
+                               ) as search_ext:
+            users = self.identity_api.driver.list_users(hints)
+        # one more than the limit, so that the list is known to be truncated
+        self.assertEqual(2, len(users))
+        self.assertEqual(2, search_ext.call_args[1]['sizelimit'])
+
+    def test_list_users_not_limited_with_unsatisfied_filters(self):
+        hints = driver_hints.Hints()
+        hints.set_limit(1)
+        hints.add_filter('enabled', True)
+        users = self.identity_api.driver.list_users(hints)
+        self.assertEqual(len(default_fixtures.USERS), len(users))
+
+    def test_list_groups_for_user_filtered_in_ldap(self):
+        user = {'name': uuid.uuid4().hex,
+                'domain_id': CONF.identity.default_domain_id,
+                'password': uuid.uuid4().hex, 'enabled': True}
+        user = self.identity_api.create_user(user)
+        domain = self._get_domain_fixture()
+        groups = []
+        for _ in range(2):
+            group = {'name': uuid.uuid4().hex, 'domain_id': domain['id']}
+            group = self.identity_api.create_group(group)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            groups.append(group)
+        hints = driver_hints.Hints()
+        hints.add_filter('name', groups[1]['name'][:8],
+                         comparator='startswith')
+        refs = self.identity_api.list_groups_for_user(user['id'],
+                                                      hints=hints)
+        self.assertEqual([groups[1]['id']], [ref['id'] for ref in refs])
+        self.assertEqual([], hints.filters)
+
+    def _create_group_with_members(self, count):
+        domain = self._get_domain_fixture()
+        group = {'name': uuid.uuid4().hex, 'domain_id': domain['id']}
+        group = self.identity_api.create_group(group)
+        user_ids = []
+        for _ in range(count):
+            user = {'name': uuid.uuid4().hex,
+                    'domain_id': CONF.identity.default_domain_id,
+                    'password': uuid.uuid4().hex, 'enabled': True}
+            user = self.identity_api.create_user(user)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            user_ids.append(user['id'])
+        return group, user_ids
+
+    @mock.patch.object(common_ldap_core, 'LDAP_IDS_PER_SEARCH', 2)
+    def test_list_users_in_group_batched(self):
+        group, user_ids = self._create_group_with_members(3)
+        user_api = self.identity_api.driver.user
+        with mock.patch.object(user_api, 'get_all',
+                               wraps=user_api.get_all) as get_all:
+            users = self.identity_api.list_users_in_group(group['id'])
+        self.assertEqual(sorted(user_ids),
+                         sorted(user['id'] for user in users))
+        for user in users:
+            self.assertNotIn('password', user)
+            self.assertNotIn('dn', user)
+        # three members looked up two at a time
+        self.assertEqual(2, get_all.call_count)
+
+    def test_check_user_in_group_reads_no_members(self):
+        group, user_ids = self._create_group_with_members(2)
+        other_user = self.user_foo['id']
+        with mock.patch.object(self.identity_api.driver.group,
+                               'list_group_users') as list_group_users:
+            self.identity_api.check_user_in_group(user_ids[1], group['id'])
+            self.assertRaises(exception.NotFound,
+                              self.identity_api.check_user_in_group,
+                              other_user, group['id'])
+        self.assertFalse(list_group_users.called)
+        self.assertRaises(exception.GroupNotFound,
+                          self.identity_api.check_user_in_group,
+                          user_ids[0], uuid.uuid4().hex)
+
+    def _enable_entity_cache(self):
+        self.config_fixture.config(group='ldap', entity_cache=True)
+        self.reload_backends(CONF.identity.default_domain_id)
+        return self.identity_api.driver.user
+
+    def _mock_search(self):
+        return mock.patch.object(common_ldap_core.KeystoneLDAPHandler,
+                                 'search_s', autospec=True,
+                                 side_effect=(common_ldap_core.
+                                              KeystoneLDAPHandler.search_s))
+
+    def test_entity_cache_reads_once(self):
+        user_api = self._enable_entity_cache()
+        with self._mock_search() as search_s:
+            user_ref = user_api.get(self.user_foo['id'])
+            self.assertEqual(user_ref, user_api.get(self.user_foo['id']))
+        self.assertEqual(1, search_s.call_count)
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                          'size': 1},
+                         user_api.entity_cache.stats())
+
+    def test_entity_cache_disabled(self):
+        user_api = self.identity_api.driver.user
+        self.assertIsNone(user_api.entity_cache)
+        with self._mock_search() as search_s:
+            user_api.get(self.user_foo['id'])
+            user_api.get(self.user_foo['id'])
+        self.assertEqual(2, search_s.call_count)
+
+    def test_entity_cache_by_name(self):
+        user_api = self._enable_entity_cache()
+        with self._mock_search() as search_s:
+            user_ref = user_api.get_by_name(self.user_foo['name'])
+            self.assertEqual(
+                user_ref, user_api.get_by_name(self.user_foo['name'].upper()))
+            self.assertEqual(user_ref, user_api.get(self.user_foo['id']))
+        self.assertEqual(1, search_s.call_count)
+
+    def test_entity_cache_invalidated_on_update(self):
+        user_api = self._enable_entity_cache()
+        user_api.get(self.user_foo['id'])
+        self.identity_api.update_user(self.user_foo['id'],
+                                      {'email': 'new@example.com'})
+        user_ref = user_api.get(self.user_foo['id'])
+        self.assertEqual('new@example.com', user_ref['email'])
+
+    def test_entity_cache_invalidated_on_delete(self):
+        user_api = self._enable_entity_cache()
+        user = {'name': uuid.uuid4().hex,
+                'domain_id': CONF.identity.default_domain_id,
+                'password': uuid.uuid4().hex, 'enabled': True}
+        user = self.identity_api.create_user(user)
+        user_api.get(user['id'])
+        user_api.get_by_name(user['name'])
+        self.identity_api.delete_user(user['id'])
+        self.assertRaises(exception.UserNotFound, user_api.get, user['id'])
+        self.assertRaises(exception.UserNotFound, user_api.get_by_name,
+                          user['name'])
+
+    def test_entity_cache_expires(self):
+        user_api = self._enable_entity_cache()
+        user_api.get(self.user_foo['id'])
+        with mock.patch.object(common_ldap_core.time, 'time',
+                               return_value=common_ldap_core.time.time() +
+                               CONF.ldap.entity_cache_time):
+            with self._mock_search() as search_s:
+                user_api.get(self.user_foo['id'])
+        self.assertEqual(1, search_s.call_count)
+
+    def test_authenticate_reads_past_entity_cache(self):
+        user_api = self._enable_entity_cache()
+        user_api.get(self.user_foo['id'])
+        with self._mock_search() as search_s:
+            self.identity_api.driver.authenticate(self.user_foo['id'],
+                                                  self.user_foo['password'])
+        self.assertTrue(search_s.called)
+
+    def test_entity_cache_size(self):
+        self.config_fixture.config(group='ldap', entity_cache_size=1)
+        user_api = self._enable_entity_cache()
+        user_api.get(self.user_foo['id'])
+        user_api.get(self.user_two['id'])
+        self.assertEqual(1, user_api.entity_cache.stats()['size'])
+
     def test_user_id_attribute_in_create(self):
         conf = self.get_config(CONF.identity.default_domain_id)
         conf.ldap.user_id_attribute = 'mail'
@@ -2139,6 +2337,25 @@ class LdapIdentitySqlAssignmentWithMapping(LdapIdentitySqlAssignment):
         self.identity_api.get_user(user1['id'])
         self.identity_api.get_user(user2['id'])
 
+    def test_list_users_maps_ids_in_bulk(self):
+        self.id_mapping_api.purge_mappings({})
+        driver = self.id_mapping_api.driver
+        with mock.patch.object(driver, 'get_public_ids',
+                               wraps=driver.get_public_ids) as get_public_ids:
+            with mock.patch.object(driver, 'get_public_id') as get_public_id:
+                with mock.patch.object(
+                        driver, 'create_id_mappings',
+                        wraps=driver.create_id_mappings) as create_mappings:
+                    users = self.identity_api.list_users()
+                    self.assertEqual(users, self.identity_api.list_users())
+        self.assertEqual(2, get_public_ids.call_count)
+        self.assertFalse(get_public_id.called)
+        self.assertEqual(1, create_mappings.call_count)
+        self.assertThat(mapping_sql.list_id_mappings(),
+                        matchers.HasLength(len(users)))
+        for user in users:
+            self.assertEqual(user, self.identity_api.get_user(user['id']))
+
     def test_get_roles_for_user_and_project_user_group_same_id(self):
         self.skipTest('N/A: We never generate the same ID for a user and '
                       'group in our mapping table')
@@ -25,8 +25,10 @@ from testtools import matchers
 
 from keystone.common import driver_hints
 from keystone.common import sql
+from keystone.common import utils
 from keystone import config
 from keystone import exception
+from keystone import identity
 from keystone.identity.backends import sql as identity_sql
 from keystone import tests
 from keystone.tests import default_fixtures
@@ -311,6 +313,81 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
         self.assertNotIn('default_project_id', user_ref)
         session.close()
 
+    def _create_user_for_verified_password_cache(self):
+        self.config_fixture.config(group='identity',
+                                   cache_verified_passwords=True)
+        self.addCleanup(identity.VERIFIED_PASSWORDS.invalidate)
+        user = {'name': uuid.uuid4().hex,
+                'domain_id': DEFAULT_DOMAIN_ID,
+                'password': uuid.uuid4().hex}
+        user_ref = self.identity_api.create_user(user)
+        user_ref['password'] = user['password']
+        return user_ref
+
+    def _authenticate(self, user_id, password):
+        with mock.patch.object(utils, 'check_password',
+                               wraps=utils.check_password) as check_password:
+            self.identity_api.authenticate(context={}, user_id=user_id,
+                                           password=password)
+        return check_password.call_count
+
+    def test_verified_password_is_not_hashed_again(self):
+        user = self._create_user_for_verified_password_cache()
+        self.assertEqual(1, self._authenticate(user['id'], user['password']))
+        self.assertEqual(0, self._authenticate(user['id'], user['password']))
+
+    def test_verified_password_cache_disabled(self):
+        user = self._create_user_for_verified_password_cache()
+        self.config_fixture.config(group='identity',
+                                   cache_verified_passwords=False)
+        self.assertEqual(1, self._authenticate(user['id'], user['password']))
+        self.assertEqual(1, self._authenticate(user['id'], user['password']))
+
+    def test_verified_password_cache_disabled_skips_invalidation(self):
+        user = self._create_user_for_verified_password_cache()
+        self.config_fixture.config(group='identity',
+                                   cache_verified_passwords=False)
+        with mock.patch.object(self.id_mapping_api,
+                               'get_id_mapping') as get_id_mapping:
+            self.identity_api.update_user(user['id'],
+                                          {'name': uuid.uuid4().hex})
+        self.assertFalse(get_id_mapping.called)
+
+    def test_verified_password_cache_rejects_other_passwords(self):
+        user = self._create_user_for_verified_password_cache()
+        self._authenticate(user['id'], user['password'])
+        self.assertRaises(AssertionError,
+                          self.identity_api.authenticate,
+                          context={},
+                          user_id=user['id'],
+                          password=uuid.uuid4().hex)
+
+    def test_verified_password_expires(self):
+        self.config_fixture.config(group='identity',
+                                   verified_password_cache_time=0)
+        user = self._create_user_for_verified_password_cache()
+        self.assertEqual(1, self._authenticate(user['id'], user['password']))
+        self.assertEqual(1, self._authenticate(user['id'], user['password']))
+
+    def test_verified_password_forgotten_on_password_change(self):
+        user = self._create_user_for_verified_password_cache()
+        self._authenticate(user['id'], user['password'])
+        new_password = uuid.uuid4().hex
+        self.identity_api.update_user(user['id'], {'password': new_password})
+        self.assertRaises(AssertionError,
+                          self.identity_api.authenticate,
+                          context={},
+                          user_id=user['id'],
+                          password=user['password'])
+        self.assertEqual(1, self._authenticate(user['id'], new_password))
+
+    def test_verified_password_forgotten_on_disable(self):
+        user = self._create_user_for_verified_password_cache()
+        self._authenticate(user['id'], user['password'])
+        self.identity_api.update_user(user['id'], {'enabled': False})
+        self.identity_api.update_user(user['id'], {'enabled': True})
+        self.assertEqual(1, self._authenticate(user['id'], user['password']))
+
     def test_list_domains_for_user(self):
         domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
         self.assignment_api.create_domain(domain['id'], domain)
@@ -560,6 +637,60 @@ class SqlCatalog(SqlTests, test_backend.CatalogTests):
         self.assertIsNone(catalog_endpoint.get('adminURL'))
         self.assertIsNone(catalog_endpoint.get('internalURL'))
 
+    def _create_service_with_endpoint(self, url):
+        service = {
+            'id': uuid.uuid4().hex,
+            'type': uuid.uuid4().hex,
+            'name': uuid.uuid4().hex,
+        }
+        self.catalog_api.create_service(service['id'], service.copy())
+
+        endpoint = {
+            'id': uuid.uuid4().hex,
+            'region_id': None,
+            'interface': 'public',
+            'url': url,
+            'service_id': service['id'],
+        }
+        self.catalog_api.create_endpoint(endpoint['id'], endpoint.copy())
+        return service, endpoint
+
+    def test_get_catalog_renders_precompiled_urls(self):
+        service, endpoint = self._create_service_with_endpoint(
+            'http://$(public_bind_host)s:$(public_port)d/%%/$(tenant_id)s/'
+            '$(user_id)s')
+        expected_url = 'http://%s:%d/%%/tenant/user' % (
+            CONF.public_bind_host, CONF.public_port)
+
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual(expected_url,
+                         catalog[None][service['type']]['publicURL'])
+
+        catalog = self.catalog_api.get_v3_catalog('user', 'tenant')
+        self.assertEqual(expected_url, catalog[0]['endpoints'][0]['url'])
+
+    def test_get_catalog_is_cached_until_catalog_changes(self):
+        service, endpoint = self._create_service_with_endpoint(
+            'http://localhost/$(tenant_id)s')
+        self.catalog_api.get_catalog('user', 'tenant')
+
+        with mock.patch.object(sql, 'get_session',
+                               wraps=sql.get_session) as get_session:
+            catalog = self.catalog_api.get_catalog('user', 'other-tenant')
+            self.catalog_api.get_v3_catalog('user', 'other-tenant')
+        self.assertFalse(get_session.called)
+        self.assertEqual('http://localhost/other-tenant',
+                         catalog[None][service['type']]['publicURL'])
+
+        self.catalog_api.update_endpoint(
+            endpoint['id'], {'url': 'http://remotehost/$(tenant_id)s'})
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual('http://remotehost/tenant',
+                         catalog[None][service['type']]['publicURL'])
+
+        self.catalog_api.update_service(service['id'], {'enabled': False})
+        self.assertEqual({}, self.catalog_api.get_catalog('user', 'tenant'))
+
     def test_create_endpoint_region_404(self):
         service = {
             'id': uuid.uuid4().hex,
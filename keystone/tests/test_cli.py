@@ -27,3 +27,11 @@ class CliTestCase(tests.SQLDriverOverrides, tests.TestCase):
         self.useFixture(database.Database())
         self.load_backends()
         cli.TokenFlush.main()
+
+    def test_revoke_flush(self):
+        self.config_fixture.config(
+            group='revoke',
+            driver='keystone.contrib.revoke.backends.sql.Revoke')
+        self.useFixture(database.Database())
+        self.load_backends()
+        cli.RevokeFlush.main()
@@ -58,3 +58,14 @@ class ListHintsTests(test.TestCase):
         hints.set_limit(10, truncated=True)
         self.assertEqual(10, hints.limit['limit'])
         self.assertTrue(hints.limit['truncated'])
+
+    def test_pagination(self):
+        hints = driver_hints.Hints()
+        self.assertIsNone(hints.pagination)
+        hints.set_pagination(limit=10, marker='abc')
+        self.assertEqual(10, hints.pagination['limit'])
+        self.assertEqual('abc', hints.pagination['marker'])
+        self.assertIsNone(hints.pagination['offset'])
+        self.assertFalse(hints.pagination['count_total'])
+        self.assertFalse(hints.pagination['paginated'])
+        self.assertIsNone(hints.pagination['total'])
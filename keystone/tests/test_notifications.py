@@ -13,6 +13,8 @@
 #   under the License.
 
 import logging
+import threading
+import time
 import uuid
 
 import mock
@@ -26,6 +28,7 @@ import testtools
 
 from keystone.common import dependency
 from keystone import notifications
+from keystone import tests
 from keystone.tests import test_v3
 
 
@@ -779,3 +782,121 @@ class TestCallbackRegistration(testtools.TestCase):
                           uuid.uuid4().hex,
                           'thing',
                           callback)
+
+
+class AsyncNotificationsTestCase(tests.TestCase):
+    def setUp(self):
+        super(AsyncNotificationsTestCase, self).setUp()
+        notifications.reset_dispatcher()
+        self.addCleanup(notifications.reset_dispatcher)
+        self.resource_type = uuid.uuid4().hex
+
+    def config_overrides(self):
+        super(AsyncNotificationsTestCase, self).config_overrides()
+        self.config_fixture.config(async_notifications=True)
+
+    def test_deferrable_callback_runs_in_background(self):
+        release = threading.Event()
+        calls = []
+
+        @notifications.deferrable
+        def callback(service, resource_type, operation, payload):
+            release.wait()
+            calls.append(payload)
+
+        notifications.register_event_callback(
+            DELETED_OPERATION, self.resource_type, callback)
+        notifications._send_notification(
+            DELETED_OPERATION, self.resource_type, 'id', public=False)
+        self.assertEqual([], calls)
+
+        release.set()
+        notifications._get_dispatcher().join()
+        self.assertEqual([{'resource_info': 'id'}], calls)
+        self.assertEqual(1, notifications.get_dispatch_stats()['dispatched'])
+
+    def test_other_callbacks_run_synchronously(self):
+        callback = register_callback(DELETED_OPERATION, self.resource_type)
+        notifications._send_notification(
+            DELETED_OPERATION, self.resource_type, 'id', public=False)
+        callback.assert_called_once_with('identity', self.resource_type,
+                                         DELETED_OPERATION,
+                                         {'resource_info': 'id'})
+        self.assertEqual(0, notifications.get_dispatch_stats()['dispatched'])
+
+    def test_bus_notifications_are_sent_in_background(self):
+        notifier = mock.Mock()
+        with mock.patch.object(notifications, '_get_notifier',
+                               return_value=notifier):
+            notifications._send_notification(
+                CREATED_OPERATION, self.resource_type, 'id')
+            notifications._get_dispatcher().join()
+        notifier.info.assert_called_once_with(
+            {}, 'identity.%s.created' % self.resource_type,
+            {'resource_info': 'id'})
+
+    def test_full_queue_runs_in_caller(self):
+        dispatcher = notifications.Dispatcher(workers=1, queue_size=1)
+        started = threading.Event()
+        release = threading.Event()
+        threads = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        dispatcher.submit('block', block)
+        started.wait()
+        dispatcher.submit('queued', lambda: threads.append('worker'))
+        dispatcher.submit('inline', lambda: threads.append(
+            threading.current_thread()))
+        self.assertEqual([threading.current_thread()], threads)
+
+        stats = dispatcher.stats()
+        self.assertEqual(2, stats['pending'])
+        self.assertEqual(1, stats['inline'])
+
+        release.set()
+        dispatcher.join()
+        self.assertEqual([threading.current_thread(), 'worker'], threads)
+        self.assertEqual(3, dispatcher.stats()['dispatched'] +
+                         dispatcher.stats()['inline'])
+
+    def test_same_key_is_handled_in_order(self):
+        dispatcher = notifications.Dispatcher(workers=4, queue_size=400)
+        handled = []
+
+        def job(key, number):
+            time.sleep(0.001 * (number % 3))
+            handled.append((key, number, threading.current_thread()))
+
+        keys = [uuid.uuid4().hex for i in range(8)]
+        for number in range(10):
+            for key in keys:
+                dispatcher.submit(key, job, key, number, key=key)
+        dispatcher.join()
+
+        for key in keys:
+            jobs = [(number, thread) for k, number, thread in handled
+                    if k == key]
+            self.assertEqual(list(range(10)),
+                             [number for number, thread in jobs])
+            self.assertEqual(1, len(set(thread for number, thread in jobs)))
+
+    def test_stats_are_logged(self):
+        dispatcher = notifications.Dispatcher(workers=1, queue_size=1,
+                                              stats_interval=0)
+        with mock.patch.object(notifications.LOG, 'info') as log_info:
+            dispatcher.submit('job', lambda: None)
+            dispatcher.join()
+            # the stats are logged after the job is marked as done
+            for i in range(100):
+                if log_info.called:
+                    break
+                time.sleep(0.01)
+        stats = log_info.call_args[0][1]
+        self.assertEqual(1, stats['dispatched'])
+
+    def test_disabled_by_default(self):
+        self.config_fixture.config(async_notifications=False)
+        self.assertIsNone(notifications.get_dispatch_stats())
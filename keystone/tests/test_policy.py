@@ -153,6 +153,12 @@ class PolicyTestCase(tests.TestCase):
         rules.enforce(admin_credentials, uppercase_action, self.target)
 
 
+class InterpretedPolicyTestCase(PolicyTestCase):
+    def config_overrides(self):
+        super(InterpretedPolicyTestCase, self).config_overrides()
+        self.config_fixture.config(group='policy', compile_rules=False)
+
+
 class DefaultPolicyTestCase(tests.TestCase):
     def setUp(self):
         super(DefaultPolicyTestCase, self).setUp()
@@ -203,6 +209,12 @@ class DefaultPolicyTestCase(tests.TestCase):
                           self.credentials, "example:noexist", {})
 
 
+class InterpretedDefaultPolicyTestCase(DefaultPolicyTestCase):
+    def config_overrides(self):
+        super(InterpretedDefaultPolicyTestCase, self).config_overrides()
+        self.config_fixture.config(group='policy', compile_rules=False)
+
+
 class PolicyJsonTestCase(tests.TestCase):
 
     def _load_entries(self, filename):
@@ -216,3 +228,61 @@ class PolicyJsonTestCase(tests.TestCase):
         diffs = set(policy_keys).difference(set(cloud_policy_keys))
 
         self.assertThat(diffs, matchers.Equals(set()))
+
+    def _assert_compiled_rules_match_interpreted_rules(self, policy_file):
+        with open(tests.dirs.etc(policy_file)) as f:
+            policy_rules = common_policy.Rules.load_json(f.read())
+        self.addCleanup(rules.reset)
+        rules.init()
+        rules._ENFORCER.set_rules(policy_rules)
+
+        def enforce(compile_rules, action, target, credentials):
+            self.config_fixture.config(group='policy',
+                                       compile_rules=compile_rules)
+            return bool(rules.enforce(credentials, action, target,
+                                      do_raise=False))
+
+        def interpreted(*args):
+            # NOTE(garcianavalon) oslo's RoleCheck raises KeyError when the
+            # credentials have no roles, the compiled rules deny instead.
+            try:
+                return enforce(False, *args)
+            except KeyError:
+                return False
+
+        user_id, project_id, domain_id = 'user', 'project', 'domain'
+        all_credentials = [
+            {},
+            {'user_id': user_id},
+            {'roles': []},
+            {'roles': ['admin'], 'user_id': user_id,
+             'project_id': project_id},
+            {'roles': ['admin'], 'user_id': user_id,
+             'domain_id': 'admin_domain_id'},
+            {'roles': ['Admin'], 'user_id': user_id, 'domain_id': domain_id},
+            {'roles': ['member'], 'user_id': user_id,
+             'project_id': project_id},
+        ]
+        targets = [
+            {},
+            {'user_id': user_id},
+            {'domain_id': domain_id, 'target.user.domain_id': domain_id,
+             'target.project.domain_id': domain_id},
+            {'target.token.user_id': user_id,
+             'target.credential.user_id': 'another',
+             'target.project.id': project_id},
+        ]
+        for action in policy_rules:
+            for credentials in all_credentials:
+                for target in targets:
+                    self.assertEqual(
+                        interpreted(action, target, credentials),
+                        enforce(True, action, target, credentials),
+                        action)
+
+    def test_compiled_rules_match_interpreted_rules(self):
+        self._assert_compiled_rules_match_interpreted_rules('policy.json')
+
+    def test_compiled_cloud_rules_match_interpreted_rules(self):
+        self._assert_compiled_rules_match_interpreted_rules(
+            'policy.v3cloudsample.json')
@@ -12,6 +12,7 @@
 
 
 import datetime
+import timeit
 import uuid
 
 import mock
@@ -21,11 +22,15 @@ from testtools import matchers
 from keystone.common import dependency
 from keystone.contrib.revoke import model
 from keystone import exception
+from keystone.openstack.common import log
 from keystone import tests
 from keystone.tests import test_backend_sql
 from keystone.token import provider
 
 
+LOG = log.getLogger(__name__)
+
+
 def _new_id():
     return uuid.uuid4().hex
 
@@ -168,6 +173,33 @@ class RevokeTests(object):
         # should no longer throw an exception
         self.revoke_api.check_token(token_values)
 
+    def _revoked_user_token_values(self):
+        token_values = _sample_blank_token()
+        token_values['expires_at'] = _future_time()
+        token_values['user_id'] = _new_id()
+        self.revoke_api.revoke_by_user(token_values['user_id'])
+        return token_values
+
+    def test_check_token_fetches_only_new_events(self):
+        first_token = self._revoked_user_token_values()
+        self.assertRaises(exception.TokenNotFound,
+                          self.revoke_api.check_token, first_token)
+
+        with mock.patch.object(self.revoke_api.driver, 'get_events',
+                               wraps=self.revoke_api.driver.get_events) as m:
+            # Nothing was revoked since the tree was built.
+            self.assertRaises(exception.TokenNotFound,
+                              self.revoke_api.check_token, first_token)
+            self.assertFalse(m.called)
+
+            second_token = self._revoked_user_token_values()
+            self.assertRaises(exception.TokenNotFound,
+                              self.revoke_api.check_token, second_token)
+            self.assertRaises(exception.TokenNotFound,
+                              self.revoke_api.check_token, first_token)
+            m.assert_called_once_with(last_fetch=mock.ANY)
+            self.assertIsNotNone(m.call_args[1]['last_fetch'])
+
     def test_revoke_by_expiration_project_and_domain_fails(self):
         user_id = _new_id()
         expires_at = timeutils.isotime(_future_time(), subsecond=True)
@@ -191,6 +223,20 @@ class SqlRevokeTests(test_backend_sql.SqlTests, RevokeTests):
             provider='keystone.token.providers.pki.Provider',
             revoke_by_id=False)
 
+    def test_prune_expired_events(self):
+        self.revoke_api.revoke_by_user(user_id=_new_id())
+        event = model.RevokeEvent(user_id=_new_id())
+        event.revoked_at = _past_time()
+        self.revoke_api.revoke(event)
+        long_ago = _past_time() - datetime.timedelta(days=1)
+
+        # Reading never prunes, expired events are just skipped.
+        self.assertEqual(1, len(self.revoke_api.get_events()))
+        self.assertEqual(2, len(self.revoke_api.get_events(long_ago)))
+
+        self.revoke_api.prune_expired_events()
+        self.assertEqual(1, len(self.revoke_api.get_events(long_ago)))
+
 
 class KvsRevokeTests(tests.TestCase, RevokeTests):
     def config_overrides(self):
@@ -637,3 +683,102 @@ class RevokeTreeTests(tests.TestCase):
         for event in self.events:
             self.tree.remove_event(event)
         self._assertEmpty(self.tree.revoke_map)
+
+
+class CompiledRevokeTreeTests(RevokeTreeTests):
+    def setUp(self):
+        super(CompiledRevokeTreeTests, self).setUp()
+        self.tree = model.CompiledRevokeTree()
+
+    def test_cleanup(self):
+        events = []
+        expiry_base_time = _future_time()
+        for i in range(0, 10):
+            events.append(self._revoke_by_user(_new_id()))
+            events.append(self._revoke_by_expiration(
+                _new_id(), expiry_base_time + datetime.timedelta(seconds=i)))
+            events.append(
+                self._revoke_by_project_role_assignment(_new_id(), _new_id()))
+            events.append(
+                self._revoke_by_domain_role_assignment(_new_id(), _new_id()))
+        self.assertEqual(len(events), len(self.tree._slots))
+
+        for event in events:
+            self.tree.remove_event(event)
+        self._assertEmpty(self.tree._slots)
+        for values in self.tree._values.values():
+            self._assertEmpty(values)
+        self.assertFalse(any(self.tree._wildcards.values()))
+
+    def test_matches_revoke_tree(self):
+        tree = model.RevokeTree()
+        users = [_new_id() for i in range(5)]
+        projects = [_new_id() for i in range(5)]
+        roles = [_new_id() for i in range(5)]
+        for i in range(5):
+            for event in [model.RevokeEvent(user_id=users[i]),
+                          model.RevokeEvent(project_id=projects[i],
+                                            role_id=roles[(i + 1) % 5]),
+                          model.RevokeEvent(user_id=users[(i + 2) % 5],
+                                            project_id=projects[i])]:
+                tree.add_event(event)
+                self.tree.add_event(event)
+        tree.remove_event(event)
+        self.tree.remove_event(event)
+
+        for user_id in users + [_new_id()]:
+            for project_id in projects:
+                for role_id in roles:
+                    token_data = _sample_blank_token()
+                    token_data['user_id'] = user_id
+                    token_data['project_id'] = project_id
+                    token_data['roles'] = [role_id]
+                    self.assertEqual(tree.is_revoked(token_data),
+                                     self.tree.is_revoked(token_data))
+
+
+class RevokeTreeBenchmark(tests.TestCase):
+    """Compare is_revoked of RevokeTree and CompiledRevokeTree.
+
+    Only 1000 events are used by default, set ENABLE_REVOKE_BENCHMARK to
+    also run with 10000 and 100000 events.
+
+    """
+
+    def _events(self, number):
+        events = []
+        for i in range(number):
+            if i % 3 == 0:
+                events.append(model.RevokeEvent(user_id=_new_id()))
+            elif i % 3 == 1:
+                events.append(model.RevokeEvent(audit_id=_new_id()))
+            else:
+                events.append(model.RevokeEvent(project_id=_new_id(),
+                                                role_id=_new_id()))
+        return events
+
+    def _benchmark(self, number):
+        events = self._events(number)
+        token_data = _sample_blank_token()
+        token_data.update(user_id=_new_id(), project_id=_new_id(),
+                          audit_id=_new_id(), roles=[_new_id(), _new_id()])
+
+        results = {}
+        for matcher in (model.RevokeTree, model.CompiledRevokeTree):
+            tree = matcher(revoke_events=events)
+            self.assertFalse(tree.is_revoked(token_data))
+            results[matcher.__name__] = timeit.timeit(
+                lambda: tree.is_revoked(token_data), number=1000)
+        LOG.info('is_revoked with %(number)d events: tree %(tree).2f us, '
+                 'compiled %(compiled).2f us',
+                 {'number': number,
+                  'tree': results['RevokeTree'] * 1000,
+                  'compiled': results['CompiledRevokeTree'] * 1000})
+
+    def test_benchmark(self):
+        self._benchmark(1000)
+
+    def test_benchmark_large(self):
+        self.skip_if_env_not_set('ENABLE_REVOKE_BENCHMARK')
+        self._benchmark(10000)
+        self._benchmark(100000)
@@ -20,6 +20,9 @@
 
 import uuid
 
+import mock
+import sqlalchemy
+
 from keystone import config
 from keystone.contrib.keystone_scim import controllers
 from keystone.tests import test_v3
@@ -95,6 +98,48 @@ class BaseCRUDTests(object):
         self.assertEqual(count, int(res_entities['itemsPerPage']))
         self.assertTrue(count < int(res_entities['totalResults']) )
 
+    def _create_entities(self, number):
+        for i in range(0, number):
+            self.post(self.URL,
+                      body=self.build_entity(uuid.uuid4().hex,
+                                             self.domain_id))
+
+    def test_list_pagination_marker(self):
+        self._create_entities(3)
+        URL = ('%(base)s?domain_id=%(domain_id)s' %
+               {'base': self.URL, 'domain_id': self.domain_id})
+        all_ids = [r['id'] for r in self.get(URL).result['Resources']]
+
+        page_ids = []
+        marker = None
+        while True:
+            page_url = '%s&count=2' % URL
+            if marker:
+                page_url += '&marker=%s' % marker
+            page = self.get(page_url).result['Resources']
+            if not page:
+                break
+            self.assertTrue(len(page) <= 2)
+            page_ids.extend(r['id'] for r in page)
+            marker = page[-1]['id']
+
+        self.assertEqual(sorted(all_ids), page_ids)
+
+    def test_list_pagination_without_total(self):
+        self._create_entities(3)
+        self.config_fixture.config(group='scim', count_total=False)
+        URL = ('%(base)s?domain_id=%(domain_id)s&count=2&startIndex=1' %
+               {'base': self.URL, 'domain_id': self.domain_id})
+        with mock.patch.object(sqlalchemy.orm.Query, 'count') as count:
+            res_entities = self.get(URL).result
+        self.assertFalse(count.called)
+        self.assertEqual(2, len(res_entities['Resources']))
+        self.assertEqual(3, res_entities['totalResults'])
+
+    def test_list_pagination_invalid_count(self):
+        URL = '%s?count=foo' % self.URL
+        self.get(URL, expected_status=400)
+
     def test_get(self):
         name = uuid.uuid4().hex
         entity = self.build_entity(name, self.domain_id)
@@ -0,0 +1,116 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import timeit
+import uuid
+
+from cryptography import exceptions as crypto_exceptions
+from keystoneclient.common import cms
+import mock
+from oslo.serialization import jsonutils
+
+from keystone.common import signing
+from keystone.openstack.common import log
+from keystone import tests
+
+
+LOG = log.getLogger(__name__)
+
+CERTFILE = tests.dirs.root('examples', 'pki', 'certs', 'signing_cert.pem')
+KEYFILE = tests.dirs.root('examples', 'pki', 'private', 'signing_key.pem')
+
+
+class SigningTests(tests.TestCase):
+    def setUp(self):
+        super(SigningTests, self).setUp()
+        self.addCleanup(signing.reset)
+        self.token_json = jsonutils.dumps(
+            {'token': {'id': uuid.uuid4().hex,
+                       'user': {'name': u'\xe9 %s' % uuid.uuid4().hex},
+                       'catalog': ['x' * 64] * 100}})
+
+    def test_pki_token_matches_openssl(self):
+        self.assertEqual(
+            cms.cms_sign_token(self.token_json, CERTFILE, KEYFILE),
+            signing.cms_sign_token(self.token_json, CERTFILE, KEYFILE))
+
+    def test_pkiz_token_matches_openssl(self):
+        self.assertEqual(
+            cms.pkiz_sign(self.token_json, CERTFILE, KEYFILE),
+            signing.pkiz_sign(self.token_json, CERTFILE, KEYFILE))
+
+    def test_newlines_match_openssl(self):
+        text = 'line1\nline2\n'
+        self.assertEqual(cms.cms_sign_token(text, CERTFILE, KEYFILE),
+                         signing.cms_sign_token(text, CERTFILE, KEYFILE))
+
+    def test_signed_token_verifies(self):
+        token_id = signing.cms_sign_token(self.token_json, CERTFILE, KEYFILE)
+        ca_certs = tests.dirs.root('examples', 'pki', 'certs', 'cacert.pem')
+        self.assertEqual(self.token_json,
+                         cms.verify_token(token_id, CERTFILE, ca_certs))
+
+    def test_loads_key_once(self):
+        with mock.patch.object(signing, 'Signer',
+                               wraps=signing.Signer) as signer:
+            signing.cms_sign_token(self.token_json, CERTFILE, KEYFILE)
+            signing.cms_sign_token(self.token_json, CERTFILE, KEYFILE)
+        self.assertEqual(1, signer.call_count)
+
+    def _assert_uses_openssl(self, text):
+        with mock.patch.object(cms, 'cms_sign_data',
+                               wraps=cms.cms_sign_data) as openssl:
+            signing.cms_sign_token(text, CERTFILE, KEYFILE)
+        self.assertTrue(openssl.called)
+
+    def test_disabled_uses_openssl(self):
+        self.config_fixture.config(group='signing', in_process=False)
+        self._assert_uses_openssl(self.token_json)
+
+    def test_without_cryptography_uses_openssl(self):
+        with mock.patch.object(signing, 'x509', None):
+            self._assert_uses_openssl(self.token_json)
+
+    def test_carriage_return_uses_openssl(self):
+        self._assert_uses_openssl('line1\r\nline2')
+
+    def test_encrypted_key_uses_openssl(self):
+        error = TypeError('Password was not given but private key is '
+                          'encrypted')
+        with mock.patch.object(signing.serialization, 'load_pem_private_key',
+                               side_effect=error):
+            self._assert_uses_openssl(self.token_json)
+
+    def test_unsupported_key_uses_openssl(self):
+        error = crypto_exceptions.UnsupportedAlgorithm('unsupported')
+        with mock.patch.object(signing.serialization, 'load_pem_private_key',
+                               side_effect=error):
+            self._assert_uses_openssl(self.token_json)
+
+    def test_benchmark(self):
+        # NOTE(garcianavalon) not a real performance test, just a quick
+        # comparison with the openssl subprocess used so far. Wall clock
+        # timings are too noisy for the gate, so it is opt-in.
+        self.skip_if_env_not_set('ENABLE_SIGNING_BENCHMARK')
+        number = 20
+        openssl_time = timeit.timeit(
+            lambda: cms.cms_sign_token(self.token_json, CERTFILE, KEYFILE),
+            number=number)
+        in_process_time = timeit.timeit(
+            lambda: signing.cms_sign_token(self.token_json, CERTFILE,
+                                           KEYFILE),
+            number=number)
+        LOG.info('Token signing: openssl %(openssl).1f tokens/s, in process '
+                 '%(in_process).1f tokens/s',
+                 {'openssl': number / openssl_time,
+                  'in_process': number / in_process_time})
+        self.assertLess(in_process_time, openssl_time)
@@ -33,15 +33,20 @@ import os
 import time
 import uuid
 
+import eventlet
+import mock
 from oslo.serialization import jsonutils
 
+from keystone.common import process_pool
 from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone import service
+from keystone.openstack.common import log
 from keystone import tests
 
 CONF = config.CONF
+LOG = log.getLogger(__name__)
 
 TZ = None
 
@@ -174,6 +179,85 @@ class UtilsTestCase(tests.TestCase):
         self.assertEqual(expected_json, json)
 
 
+def _fail(message):
+    raise ValueError(message)
+
+
+class ProcessPoolTests(tests.TestCase):
+
+    def setUp(self):
+        super(ProcessPoolTests, self).setUp()
+        self.addCleanup(process_pool.reset)
+        self.config_fixture.config(password_hash_processes=2)
+
+    def test_hash(self):
+        password = uuid.uuid4().hex
+        hashed = utils.hash_password(password)
+        self.assertTrue(utils.check_password(password, hashed))
+        self.assertFalse(utils.check_password(uuid.uuid4().hex, hashed))
+
+    def test_pool_is_reused(self):
+        pool = process_pool._get_pool()
+        self.assertIs(pool, process_pool._get_pool())
+
+    def test_disabled(self):
+        self.config_fixture.config(password_hash_processes=0)
+        self.assertIsNone(process_pool._get_pool())
+
+    def test_exceptions_are_raised(self):
+        self.assertRaises(ValueError, process_pool.execute, _fail, 'boom')
+
+    def test_lost_worker_is_replaced(self):
+        pool = process_pool._get_pool()
+        for process in pool._processes:
+            process.terminate()
+            process.join()
+        self.assertEqual('6', process_pool.execute(str, 6))
+        self.assertEqual('6', process_pool.execute(str, 6))
+
+    def _max_stall(self, passwords, hashed):
+        # the longest time the hub could not run another greenthread while
+        # the passwords were being checked
+        stalls = [0.0]
+        done = []
+
+        def tick():
+            last = time.time()
+            while not done:
+                eventlet.sleep(0.001)
+                now = time.time()
+                stalls.append(now - last)
+                last = now
+
+        ticker = eventlet.spawn(tick)
+        pile = eventlet.GreenPile()
+        for password in passwords:
+            pile.spawn(utils.check_password, password, hashed)
+        self.assertTrue(all(pile))
+        done.append(True)
+        ticker.wait()
+        return max(stalls)
+
+    def test_benchmark(self):
+        # NOTE(garcianavalon) not a real performance test, just a quick
+        # look at how long password checks stall an eventlet hub. Wall
+        # clock timings are too noisy for the gate, so it is opt-in.
+        self.skip_if_env_not_set('ENABLE_PASSWORD_HASH_BENCHMARK')
+        password = uuid.uuid4().hex
+        hashed = utils.hash_password(password)
+        passwords = [password] * 8
+        with mock.patch.object(process_pool, '_green', return_value=True):
+            self.config_fixture.config(password_hash_processes=0)
+            inline_stall = self._max_stall(passwords, hashed)
+            self.config_fixture.config(password_hash_processes=2)
+            process_pool._get_pool()
+            pool_stall = self._max_stall(passwords, hashed)
+        LOG.info('Longest stall of the hub while checking passwords: inline '
+                 '%(inline).1f ms, process pool %(pool).1f ms',
+                 {'inline': inline_stall * 1000, 'pool': pool_stall * 1000})
+        self.assertLess(pool_stall, inline_stall)
+
+
 class ServiceHelperTests(tests.TestCase):
 
     @service.fail_gracefully
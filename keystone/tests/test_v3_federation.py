@@ -10,11 +10,16 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import base64
+import hashlib
 import os
 import random
 import subprocess
+import timeit
 import uuid
 
+from cryptography import exceptions as crypto_exceptions
+import fixtures
 from lxml import etree
 import mock
 from oslo.serialization import jsonutils
@@ -1720,6 +1725,7 @@ class SAMLGenerationTests(FederationTests):
         super(SAMLGenerationTests, self).setUp()
         self.signed_assertion = saml2.create_class_from_xml_string(
             saml.Assertion, _load_xml('signed_saml2_assertion.xml'))
+        self.addCleanup(keystone_idp._XML_SIGNERS.clear)
 
     def test_samlize_token_values(self):
         """Test the SAML generator produces a SAML object.
@@ -1819,6 +1825,7 @@ class SAMLGenerationTests(FederationTests):
             def poll(self):
                 return 0
 
+        self.config_fixture.config(group='saml', in_process_signing=False)
         with mock.patch('subprocess.Popen',
                         side_effect=MockedPopen):
             generator = keystone_idp.SAMLGenerator()
@@ -1845,10 +1852,17 @@ class SAMLGenerationTests(FederationTests):
         if not _is_xmlsec1_installed():
             self.skip('xmlsec1 is not installed')
 
+        self.config_fixture.config(group='saml', in_process_signing=False)
+        self._assert_assertion_signed()
+
+    def _samlize_token(self):
         generator = keystone_idp.SAMLGenerator()
-        response = generator.samlize_token(self.ISSUER, self.RECIPIENT,
-                                           self.SUBJECT, self.ROLES,
-                                           self.PROJECT)
+        return generator.samlize_token(self.ISSUER, self.RECIPIENT,
+                                       self.SUBJECT, self.ROLES,
+                                       self.PROJECT)
+
+    def _assert_assertion_signed(self):
+        response = self._samlize_token()
 
         signature = response.assertion.signature
         self.assertIsNotNone(signature)
@@ -1861,6 +1875,107 @@ class SAMLGenerationTests(FederationTests):
         # match it with the key that we used.
         cert_text = cert_text.replace(os.linesep, '')
         self.assertEqual(idp_public_key, cert_text)
+        return response
+
+    def test_saml_signing_in_process(self):
+        with mock.patch.object(keystone_idp,
+                               '_sign_assertion_with_xmlsec1') as xmlsec1:
+            response = self._assert_assertion_signed()
+        self.assertFalse(xmlsec1.called)
+
+        # check the signature like a service provider would
+        assertion = etree.fromstring(keystone_idp._serialize_assertion(
+            response.assertion))
+        signature = assertion.find('{%s}Signature' % xmldsig.NAMESPACE)
+        signed_info = signature.find('{%s}SignedInfo' % xmldsig.NAMESPACE)
+        digest_value = signed_info.find('.//{%s}DigestValue' %
+                                        xmldsig.NAMESPACE).text
+        signature_value = signature.find('{%s}SignatureValue' %
+                                         xmldsig.NAMESPACE).text
+        assertion.remove(signature)
+        self.assertEqual(
+            base64.b64encode(hashlib.sha1(etree.tostring(
+                assertion, method='c14n', exclusive=True)).digest()),
+            digest_value)
+        signer = keystone_idp.XMLSigner(CONF.saml.certfile,
+                                        CONF.saml.keyfile)
+        self.assertEqual(
+            base64.b64encode(signer._key.sign(
+                etree.tostring(signed_info, method='c14n', exclusive=True),
+                keystone_idp.padding.PKCS1v15(),
+                keystone_idp.hashes.SHA1())),
+            signature_value.replace('\n', ''))
+
+    def test_saml_signing_in_process_verified_by_xmlsec1(self):
+        if not _is_xmlsec1_installed():
+            self.skip('xmlsec1 is not installed')
+
+        response = self._samlize_token()
+        file_path = self.useFixture(fixtures.TempDir()).join('assertion.xml')
+        with open(file_path, 'w') as f:
+            f.write(keystone_idp._serialize_assertion(response.assertion))
+        self.assertEqual(0, subprocess.call(
+            [CONF.saml.xmlsec1_binary, '--verify', '--pubkey-cert-pem',
+             CONF.saml.certfile, '--id-attr:ID', 'Assertion', file_path]))
+
+    def _assert_uses_xmlsec1(self):
+        with mock.patch.object(keystone_idp, '_sign_assertion_with_xmlsec1',
+                               return_value=self.signed_assertion) as xmlsec1:
+            self._samlize_token()
+        self.assertTrue(xmlsec1.called)
+
+    def test_in_process_signing_disabled_uses_xmlsec1(self):
+        self.config_fixture.config(group='saml', in_process_signing=False)
+        self._assert_uses_xmlsec1()
+
+    def test_without_lxml_uses_xmlsec1(self):
+        with mock.patch.object(keystone_idp, 'etree', None):
+            self._assert_uses_xmlsec1()
+
+    def test_missing_key_uses_xmlsec1(self):
+        self.config_fixture.config(group='saml', keyfile=uuid.uuid4().hex)
+        self._assert_uses_xmlsec1()
+
+    def test_encrypted_key_uses_xmlsec1(self):
+        error = TypeError('Password was not given but private key is '
+                          'encrypted')
+        with mock.patch.object(keystone_idp.serialization,
+                               'load_pem_private_key', side_effect=error):
+            self._assert_uses_xmlsec1()
+
+    def test_unsupported_key_uses_xmlsec1(self):
+        error = crypto_exceptions.UnsupportedAlgorithm('unsupported')
+        with mock.patch.object(keystone_idp.serialization,
+                               'load_pem_private_key', side_effect=error):
+            self._assert_uses_xmlsec1()
+
+    def test_signing_key_loaded_once(self):
+        with mock.patch.object(keystone_idp, 'XMLSigner',
+                               wraps=keystone_idp.XMLSigner) as signer:
+            self._samlize_token()
+            self._samlize_token()
+        self.assertEqual(1, signer.call_count)
+
+    def test_signing_benchmark(self):
+        # NOTE(garcianavalon) not a real performance test, just a quick
+        # comparison with the xmlsec1 subprocess used so far. Wall clock
+        # timings are too noisy for the gate, so it is opt-in.
+        self.skip_if_env_not_set('ENABLE_SAML_SIGNING_BENCHMARK')
+        if not _is_xmlsec1_installed():
+            self.skip('xmlsec1 is not installed')
+
+        number = 20
+        assertion = self._samlize_token().assertion
+        xmlsec1_time = timeit.timeit(
+            lambda: keystone_idp._sign_assertion_with_xmlsec1(assertion),
+            number=number)
+        in_process_time = timeit.timeit(
+            lambda: keystone_idp._sign_assertion(assertion), number=number)
+        LOG.info('SAML assertion signing: xmlsec1 %(xmlsec1).1f '
+                 'assertions/s, in process %(in_process).1f assertions/s',
+                 {'xmlsec1': number / xmlsec1_time,
+                  'in_process': number / in_process_time})
+        self.assertLess(in_process_time, xmlsec1_time)
 
     def _create_generate_saml_request(self, token_id, region_id):
         return {
@@ -14,17 +14,29 @@
 
 import base64
 import copy
+import datetime
+import functools
 import json
+import timeit
 import urllib
 import urlparse
 import uuid
 
+import mock
+from oslo.utils import timeutils
+
 from keystone import config
+from keystone import exception
 from keystone.common import dependency
+from keystone.common import sql
 from keystone.contrib.oauth2 import core
+from keystone.contrib.oauth2 import validator
+from keystone.contrib.oauth2.backends import sql as oauth2_sql
+from keystone.openstack.common import log
 from keystone.tests import test_v3
 
 CONF = config.CONF
+LOG = log.getLogger(__name__)
 
 class OAuth2BaseTests(test_v3.RestfulTestCase):
 
@@ -55,6 +67,7 @@ class OAuth2BaseTests(test_v3.RestfulTestCase):
         # NOTE(garcianavalon) I've put this line for dependency injection to work, 
         # but I don't know if its the right way to do it...
         self.manager = core.Manager()
+        self.addCleanup(core.reset_server)
 
     def _create_consumer(self, name=None, description=None,
                          client_type='confidential',
@@ -195,18 +208,21 @@ class ConsumerCRUDTests(OAuth2BaseTests):
 @dependency.requires('oauth2_api')
 class AccessTokenEndpointTests(OAuth2BaseTests):
 
-    def new_access_token_ref(self, user_id, consumer_id):
+    def new_access_token_ref(self, user_id, consumer_id, expires_in=3600,
+                             refresh_token=None):
         token_ref = {
             'id':uuid.uuid4().hex,
             'consumer_id':consumer_id,
             'authorizing_user_id':user_id,
             'scopes': [uuid.uuid4().hex],
-            'expires_at':uuid.uuid4().hex,
+            'expires_at':timeutils.utcnow() + datetime.timedelta(
+                seconds=expires_in),
+            'refresh_token': refresh_token,
         }
         return token_ref
 
-    def _create_access_token(self, user_id, consumer_id):
-        token_ref = self.new_access_token_ref(user_id, consumer_id)
+    def _create_access_token(self, user_id, consumer_id, **kwargs):
+        token_ref = self.new_access_token_ref(user_id, consumer_id, **kwargs)
         access_token = self.oauth2_api.store_access_token(token_ref)
         return access_token
 
@@ -256,6 +272,97 @@ class AccessTokenEndpointTests(OAuth2BaseTests):
         # TODO(garcianavalon) test revoke identity api tokens
         # TODO(garcianavalon) test can't get more identity api tokens
 
+    def test_expired_access_tokens_not_found(self):
+        consumer_id = uuid.uuid4().hex
+        token = self._create_access_token(self.user['id'], consumer_id,
+                                          expires_in=-1)
+        url = (self.USERS_URL.format(user_id=self.user['id'])
+               + self.ACCESS_TOKENS_URL + '/{0}'.format(token['id']))
+        self.get(url, expected_status=404)
+        self.assertEqual([], self._list_access_tokens(self.user['id']))
+
+    def test_flush_expired_tokens(self):
+        consumer_id = uuid.uuid4().hex
+        valid_token = self._create_access_token(self.user['id'],
+                                                consumer_id)
+        expired_token = self._create_access_token(self.user['id'],
+                                                  consumer_id,
+                                                  expires_in=-1)
+        refreshable_token = self._create_access_token(
+            self.user['id'], consumer_id, expires_in=-1,
+            refresh_token=uuid.uuid4().hex)
+
+        self.oauth2_api.driver.flush_expired_tokens()
+
+        session = sql.get_session()
+        remaining = set(token.id for token in
+                        session.query(oauth2_sql.AccessToken))
+        self.assertIn(valid_token['id'], remaining)
+        self.assertIn(refreshable_token['id'], remaining)
+        self.assertNotIn(expired_token['id'], remaining)
+
+        # once revoked, the expired token can't be refreshed anymore
+        self.oauth2_api.driver.revoke_access_token(refreshable_token['id'])
+        self.oauth2_api.driver.flush_expired_tokens()
+        self.assertIsNone(session.query(oauth2_sql.AccessToken).get(
+            refreshable_token['id']))
+
+    def test_flush_old_refreshable_tokens(self):
+        self.config_fixture.config(group='oauth2',
+                                   refresh_token_max_age=3600)
+        consumer_id = uuid.uuid4().hex
+        refreshable_token = self._create_access_token(
+            self.user['id'], consumer_id, expires_in=-60,
+            refresh_token=uuid.uuid4().hex)
+        old_token = self._create_access_token(
+            self.user['id'], consumer_id, expires_in=-7200,
+            refresh_token=uuid.uuid4().hex)
+
+        self.oauth2_api.driver.flush_expired_tokens()
+
+        session = sql.get_session()
+        remaining = set(token.id for token in
+                        session.query(oauth2_sql.AccessToken))
+        self.assertIn(refreshable_token['id'], remaining)
+        self.assertNotIn(old_token['id'], remaining)
+
+    def _assert_flush_used_authorization_codes(self, expires_ins):
+        # the first code stays valid, the second expires and the rest are
+        # used before they expire
+        consumer, _ = self._create_consumer()
+        codes = []
+        for expires_in in expires_ins:
+            code = {
+                'code': uuid.uuid4().hex,
+                'consumer_id': consumer['id'],
+                'authorizing_user_id': self.user['id'],
+                'scopes': [],
+                'redirect_uri': self.DEFAULT_REDIRECT_URIS[0],
+                'expires_at': timeutils.utcnow() + datetime.timedelta(
+                    seconds=expires_in),
+            }
+            codes.append(self.oauth2_api.store_authorization_code(code))
+        valid_code, expired_code = codes[:2]
+        for used_code in codes[2:]:
+            self.oauth2_api.invalidate_authorization_code(used_code['code'])
+
+        self.oauth2_api.driver.flush_expired_tokens()
+
+        remaining = [c['code']
+                     for c in self.oauth2_api.list_authorization_codes()]
+        self.assertEqual([valid_code['code']], remaining)
+
+    def test_flush_used_authorization_codes(self):
+        self._assert_flush_used_authorization_codes([3600, -1, 3600])
+
+    def test_flush_used_authorization_codes_in_batches(self):
+        batched = functools.partial(oauth2_sql._expiry_range_batched,
+                                    batch_size=2)
+        with mock.patch.object(oauth2_sql, '_expiry_range_strategy',
+                               return_value=batched):
+            self._assert_flush_used_authorization_codes(
+                [3600, -1, 60, 600, 1800, 7200])
+
 
 class OAuth2FlowBaseTests(OAuth2BaseTests):
 
@@ -677,6 +784,233 @@ class OAuth2AccessTokenFromCodeFlowTests(OAuth2FlowBaseTests):
         self._exchange_access_token_assertions(response)
 
 
+class OAuth2BearerTokenCacheTests(OAuth2FlowBaseTests):
+
+    def _obtain_access_token(self):
+        scope = ['all_info']
+        get_response = self._flowstep_request_authorization(
+                                scope=scope,
+                                redirect_uri=self.DEFAULT_REDIRECT_URIS[0])
+        post_response = self._flowstep_grant_authorization(get_response,
+                                                        scopes=scope)
+        response = self._flowstep_obtain_access_token(post_response)
+        return response.result
+
+    def _exchange_access_token(self, access_token, expected_status=201):
+        body = self._auth_body(access_token)
+        return self.post('/auth/tokens', body=body, noauth=True,
+                         expected_status=expected_status)
+
+    def test_exchange_access_token_cached(self):
+        access_token = self._obtain_access_token()
+        self._exchange_access_token(access_token)
+
+        # the second exchange must not reach the backend
+        with mock.patch.object(self.oauth2_api.driver, 'get_access_token',
+                               side_effect=AssertionError):
+            self._exchange_access_token(access_token)
+
+    def test_exchange_revoked_access_token(self):
+        access_token = self._obtain_access_token()
+        self._exchange_access_token(access_token)
+
+        self.oauth2_api.revoke_access_token(access_token['access_token'])
+        self._exchange_access_token(access_token, expected_status=401)
+
+    def test_exchange_access_token_of_deleted_consumer(self):
+        access_token = self._obtain_access_token()
+        self._exchange_access_token(access_token)
+
+        self.oauth2_api.delete_access_tokens(self.consumer['id'])
+        self._exchange_access_token(access_token, expected_status=401)
+
+    def test_unknown_access_token_negative_cache(self):
+        token_id = uuid.uuid4().hex
+        self.assertIsNone(self.oauth2_api.get_bearer_token(token_id))
+        with mock.patch.object(self.oauth2_api.driver, 'get_access_token',
+                               side_effect=AssertionError):
+            self.assertIsNone(self.oauth2_api.get_bearer_token(token_id))
+
+        # storing the token drops the negative entry
+        self.oauth2_api.store_access_token({
+            'id': token_id,
+            'consumer_id': self.consumer['id'],
+            'authorizing_user_id': self.user_id,
+            'scopes': ['all_info'],
+            'expires_at': timeutils.utcnow() + datetime.timedelta(hours=1),
+        })
+        token = self.oauth2_api.get_bearer_token(token_id)
+        self.assertEqual(self.user_id, token['authorizing_user_id'])
+
+    def test_unknown_access_token_negative_cache_expires(self):
+        self.config_fixture.config(group='oauth2', negative_cache_time=-1)
+        token_id = uuid.uuid4().hex
+        self.assertIsNone(self.oauth2_api.get_bearer_token(token_id))
+        with mock.patch.object(self.oauth2_api.driver, 'get_access_token',
+                               side_effect=exception.NotFound(
+                                   message='not found')) as m:
+            self.assertIsNone(self.oauth2_api.get_bearer_token(token_id))
+            self.assertTrue(m.called)
+
+
+class OAuth2RefreshTokenFlowTests(OAuth2FlowBaseTests):
+
+    def _obtain_access_token(self, scopes):
+        get_response = self._flowstep_request_authorization(
+                                scope=scopes,
+                                redirect_uri=self.DEFAULT_REDIRECT_URIS[0])
+        post_response = self._flowstep_grant_authorization(get_response,
+                                                        scopes=scopes)
+        response = self._flowstep_obtain_access_token(post_response)
+        return response.result
+
+    def _refresh_access_token(self, refresh_token, scopes=None,
+                              consumer=None, expected_status=200):
+        consumer = consumer or self.consumer
+        body = {
+            'token_request': {
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token,
+            }
+        }
+        if scopes:
+            body['token_request']['scope'] = ' '.join(scopes)
+        headers = {
+            'Authorization': self._http_basic(consumer['id'],
+                                              consumer['secret'])
+        }
+        return self.post('/OS-OAUTH2/access_token', body=body,
+                         headers=headers, expected_status=expected_status)
+
+    def _exchange_access_token(self, access_token, expected_status=201):
+        body = self._auth_body(access_token)
+        return self.post('/auth/tokens', body=body, noauth=True,
+                         expected_status=expected_status)
+
+    def test_refresh_access_token(self):
+        scopes = ['all_info']
+        access_token = self._obtain_access_token(scopes)
+        response = self._refresh_access_token(access_token['refresh_token'])
+        new_access_token = response.result
+
+        self._assert_access_token(response, expected_scopes='all_info')
+        self.assertNotEqual(access_token['access_token'],
+                            new_access_token['access_token'])
+        self.assertNotEqual(access_token['refresh_token'],
+                            new_access_token['refresh_token'])
+
+        # the previous access token is invalidated
+        self._exchange_access_token(access_token, expected_status=401)
+        self._exchange_access_token(new_access_token)
+
+    def test_refresh_token_only_one_use(self):
+        access_token = self._obtain_access_token(['all_info'])
+        self._refresh_access_token(access_token['refresh_token'])
+        self._refresh_access_token(access_token['refresh_token'],
+                                   expected_status=401)
+
+    def test_refresh_access_token_with_original_scopes(self):
+        access_token = self._obtain_access_token(self.DEFAULT_SCOPES)
+        response = self._refresh_access_token(
+            access_token['refresh_token'], scopes=['all_info'])
+        self._assert_access_token(response, expected_scopes='all_info')
+
+    def test_refresh_access_token_with_new_scopes(self):
+        access_token = self._obtain_access_token(['all_info'])
+        self._refresh_access_token(access_token['refresh_token'],
+                                   scopes=['all_info', uuid.uuid4().hex],
+                                   expected_status=401)
+
+    def test_refresh_token_of_another_consumer(self):
+        access_token = self._obtain_access_token(['all_info'])
+        other_consumer, _ = self._create_consumer()
+        self._refresh_access_token(access_token['refresh_token'],
+                                   consumer=other_consumer,
+                                   expected_status=401)
+
+    def test_refresh_token_too_old(self):
+        self.config_fixture.config(group='oauth2', refresh_token_max_age=60)
+        access_token = self._obtain_access_token(['all_info'])
+        timeutils.set_time_override(
+            timeutils.utcnow() + datetime.timedelta(
+                seconds=access_token['expires_in'] + 120))
+        self.addCleanup(timeutils.clear_time_override)
+        self._refresh_access_token(access_token['refresh_token'],
+                                   expected_status=401)
+
+
+class OAuth2ClientCacheTests(OAuth2FlowBaseTests):
+
+    def test_token_request_reads_consumer_once(self):
+        scope = ['all_info']
+        get_response = self._flowstep_request_authorization(
+                                scope=scope,
+                                redirect_uri=self.DEFAULT_REDIRECT_URIS[0])
+        post_response = self._flowstep_grant_authorization(get_response,
+                                                        scopes=scope)
+        self.manager._get_client.invalidate(self.manager, self.consumer['id'])
+
+        driver = self.oauth2_api.driver
+        with mock.patch.object(driver, 'get_consumer_with_secret',
+                               wraps=driver.get_consumer_with_secret) as m:
+            self._flowstep_obtain_access_token(post_response)
+            self.assertEqual(1, m.call_count)
+
+    def test_wrong_client_secret(self):
+        self.assertTrue(self.oauth2_api.check_client_secret(
+            self.consumer['id'], self.consumer['secret']))
+        self.assertFalse(self.oauth2_api.check_client_secret(
+            self.consumer['id'], uuid.uuid4().hex))
+
+    def test_cached_client_has_no_secret(self):
+        client = self.oauth2_api.get_client(self.consumer['id'])
+        self.assertNotIn('secret', client)
+        self.assertNotIn('secret_digest', client)
+        self.assertEqual(self.data['redirect_uris'], client['redirect_uris'])
+
+    def test_client_invalidated_on_update(self):
+        self.oauth2_api.get_client(self.consumer['id'])
+        new_name = uuid.uuid4().hex
+        self.oauth2_api.update_consumer(self.consumer['id'],
+                                        {'name': new_name})
+        client = self.oauth2_api.get_client(self.consumer['id'])
+        self.assertEqual(new_name, client['name'])
+
+    def test_client_invalidated_on_delete(self):
+        self.oauth2_api.get_client(self.consumer['id'])
+        self.oauth2_api.delete_consumer(self.consumer['id'])
+        self.assertRaises(exception.NotFound, self.oauth2_api.get_client,
+                          self.consumer['id'])
+
+
+class OAuth2ServerTests(OAuth2BaseTests):
+
+    def test_server_is_shared(self):
+        server = core.get_server()
+        self.assertIs(server, core.get_server())
+
+        core.reset_server()
+        self.assertIsNot(server, core.get_server())
+
+    def test_server_overhead_benchmark(self):
+        # micro-benchmark of the per-request cost of getting a server
+        # before (building one) and after (using the shared one). Wall
+        # clock timings are too noisy for the gate, so it is opt-in.
+        self.skip_if_env_not_set('ENABLE_OAUTH2_BENCHMARK')
+
+        def build_server():
+            return core.Server(validator.OAuth2Validator())
+
+        number = 200
+        build_time = timeit.timeit(build_server, number=number)
+        shared_time = timeit.timeit(core.get_server, number=number)
+        LOG.info('OAuth2 Server per request: built %(build).2f us, '
+                 'shared %(shared).2f us',
+                 {'build': build_time / number * 10 ** 6,
+                  'shared': shared_time / number * 10 ** 6})
+        self.assertLess(shared_time, build_time)
+
+
 class OAuth2PasswordGrantFlowTests(OAuth2FlowBaseTests):
     # NOTE(garcianavalon) because right now we can't sent
     # a domain id in the Password Grant, we need to use the
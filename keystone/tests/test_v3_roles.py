@@ -12,11 +12,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import json
 import uuid
 
 from urllib import urlencode
 
+from oslo.utils import timeutils
+
 from keystone import config
 from keystone.common import dependency
 from keystone.contrib.roles import core
@@ -162,6 +165,11 @@ class RolesBaseTests(test_v3.RestfulTestCase):
         url = self.USER_ROLES_URL.format(**url_args)
         return self.put(url, expected_status=expected_status)
 
+    def _add_role_user_assignments(self, assignments, expected_status=204):
+        return self.put(self.USER_ASSIGNMENTS_URL,
+                        body={'role_assignments': assignments},
+                        expected_status=expected_status)
+
     def _add_role_to_user_default_org(self, role_id, user_id, 
                                       application_id, 
                                       expected_status=204):
@@ -601,6 +609,73 @@ class RoleUserAssignmentTests(RolesBaseTests):
                                         organization_id=organization['id'],
                                         application_id=application)
 
+    def _new_role_user_assignments(self, number_of_users, number_of_roles):
+        application = uuid.uuid4().hex
+        roles = [self._create_role(self.new_fiware_role_ref(
+                    uuid.uuid4().hex, application=application))
+                 for i in range(number_of_roles)]
+        assignments = []
+        for i in range(number_of_users):
+            user, organization = self._create_user()
+            for role in roles:
+                assignments.append({
+                    'role_id': role['id'],
+                    'user_id': user['id'],
+                    'organization_id': organization['id'],
+                    'application_id': application,
+                })
+        return application, assignments
+
+    def _assert_role_user_assignments(self, application, assignments):
+        current_assignments = self._list_role_user_assignments(
+            filters={'application_id': application})
+        keys = ['role_id', 'user_id', 'organization_id', 'application_id']
+        expected = set(tuple(a[k] for k in keys) for a in assignments)
+        actual = set(tuple(a[k] for k in keys) for a in current_assignments)
+        self.assertEqual(expected, actual)
+
+    def test_add_role_user_assignments(self):
+        application, assignments = self._new_role_user_assignments(
+            number_of_users=3, number_of_roles=2)
+        self._add_role_user_assignments(assignments)
+        self._assert_role_user_assignments(application, assignments)
+
+    def test_add_role_user_assignments_repeated(self):
+        application, assignments = self._new_role_user_assignments(
+            number_of_users=2, number_of_roles=2)
+        self._add_role_user_assignments(assignments[:1])
+        self._add_role_user_assignments(assignments + assignments)
+        self._assert_role_user_assignments(application, assignments)
+
+    def test_add_role_user_assignments_non_existent_user(self):
+        application, assignments = self._new_role_user_assignments(
+            number_of_users=1, number_of_roles=1)
+        wrong_assignment = dict(assignments[0], user_id=uuid.uuid4().hex)
+        self._add_role_user_assignments(assignments + [wrong_assignment],
+                                        expected_status=404)
+        self._assert_role_user_assignments(application, [])
+
+    def test_add_role_user_assignments_non_existent_role(self):
+        application, assignments = self._new_role_user_assignments(
+            number_of_users=1, number_of_roles=1)
+        wrong_assignment = dict(assignments[0], role_id=uuid.uuid4().hex)
+        self._add_role_user_assignments([wrong_assignment],
+                                        expected_status=404)
+
+    def test_add_role_user_assignments_missing_attribute(self):
+        application, assignments = self._new_role_user_assignments(
+            number_of_users=1, number_of_roles=1)
+        del assignments[0]['organization_id']
+        self._add_role_user_assignments(assignments, expected_status=400)
+
+    def test_add_role_user_assignments_malformed_body(self):
+        application, assignments = self._new_role_user_assignments(
+            number_of_users=1, number_of_roles=1)
+        for malformed in [assignments[0], [], ['not an assignment'],
+                          [assignments]]:
+            self._add_role_user_assignments(malformed, expected_status=400)
+        self.put(self.USER_ASSIGNMENTS_URL, body={}, expected_status=400)
+
     def test_add_role_to_user_default_org(self):
         application = uuid.uuid4().hex
         role_ref = self.new_fiware_role_ref(uuid.uuid4().hex,
@@ -1028,6 +1103,55 @@ class InternalRolesTests(RolesBaseTests):
         allowed_apps = json.loads(response.body)['allowed_applications']
         self.assertEqual([app_id], allowed_apps)
 
+    def test_allowed_applications_updated_on_permission_changes(self):
+        user, organization = self._create_user()
+        app_id = uuid.uuid4().hex
+        internal_roles, _ = self._create_internal_roles_user(
+            user, organization, core.MANAGE_ROLES_PERMISSION, app_id)
+
+        response = self._list_applications_user_allowed_to_manage(
+            user_id=user['id'], organization_id=organization['id'])
+        allowed_apps = json.loads(response.body)['allowed_applications']
+        self.assertEqual([], allowed_apps)
+
+        perm_ref = self.new_fiware_permission_ref(
+            core.MANAGE_APPLICATION_PERMISSION, application=app_id,
+            is_internal=True)
+        permission = self._create_permission(perm_ref)
+        self._add_permission_to_role(internal_roles[0]['id'], permission['id'])
+
+        response = self._list_applications_user_allowed_to_manage(
+            user_id=user['id'], organization_id=organization['id'])
+        allowed_apps = json.loads(response.body)['allowed_applications']
+        self.assertEqual([app_id], allowed_apps)
+
+        self._remove_permission_from_role(internal_roles[0]['id'],
+                                          permission['id'])
+
+        response = self._list_applications_user_allowed_to_manage(
+            user_id=user['id'], organization_id=organization['id'])
+        allowed_apps = json.loads(response.body)['allowed_applications']
+        self.assertEqual([], allowed_apps)
+
+    def test_allowed_applications_updated_on_assignment_changes(self):
+        user, organization = self._create_user()
+        app_id = uuid.uuid4().hex
+        internal_roles, _ = self._create_internal_roles_user(
+            user, organization, core.MANAGE_APPLICATION_PERMISSION, app_id)
+
+        response = self._list_applications_user_allowed_to_manage(
+            user_id=user['id'], organization_id=organization['id'])
+        allowed_apps = json.loads(response.body)['allowed_applications']
+        self.assertEqual([app_id], allowed_apps)
+
+        self._remove_role_from_user(internal_roles[0]['id'], user['id'],
+                                    organization['id'], app_id)
+
+        response = self._list_applications_user_allowed_to_manage(
+            user_id=user['id'], organization_id=organization['id'])
+        allowed_apps = json.loads(response.body)['allowed_applications']
+        self.assertEqual([], allowed_apps)
+
     def _create_internal_roles_user(self, user, organization, permission, app_id):
         internal_roles = []
         expected_roles = {}
@@ -1327,14 +1451,14 @@ class FiwareApiTests(RolesBaseTests):
             'consumer_id':self.application_id,
             'authorizing_user_id':self.test_user['id'],
             'scopes': [uuid.uuid4().hex],
-            'expires_at':uuid.uuid4().hex,
+            'expires_at':timeutils.utcnow() + datetime.timedelta(hours=1),
         }
         oauth2_access_token = self.oauth2_api.store_access_token(token_dict)
         return oauth2_access_token['id']
 
-    def _validate_token(self, token_id):
+    def _validate_token(self, token_id, expected_status=200):
         url = '/access-tokens/%s' %token_id
-        return self.get(url)
+        return self.get(url, expected_status=expected_status)
 
     def _authorized_organizations(self, token_id):
         url = '/authorized_organizations/%s' %token_id
@@ -1460,6 +1584,69 @@ class FiwareApiTests(RolesBaseTests):
         self.response = self._validate_token(token_id)
         self._assert_all()
 
+    def _rename_user_scoped_role_in_backend(self):
+        # NOTE(garcianavalon) bypass the manager so the cache is not
+        # invalidated
+        role = self.user_roles[0]
+        role['name'] = uuid.uuid4().hex
+        self.manager.driver.update_role(role['id'], {'name': role['name']})
+        return role
+
+    def _response_user_role_names(self):
+        return set([r['name'] for r in self.response.result['roles']])
+
+    def test_validate_token_cached(self):
+        self.number_of_user_roles = 1
+        self._create_all()
+        token_id = self._create_oauth2_token()
+        self.response = self._validate_token(token_id)
+        old_name = self.user_roles[0]['name']
+
+        role = self._rename_user_scoped_role_in_backend()
+        self.response = self._validate_token(token_id)
+        self.assertEqual(set([old_name]), self._response_user_role_names())
+
+        self.manager.update_role(role['id'], {'name': role['name']})
+        self.response = self._validate_token(token_id)
+        self.assertEqual(set([role['name']]), self._response_user_role_names())
+
+    def test_validate_token_invalidated_on_assignment(self):
+        self.number_of_user_roles = 1
+        self._create_all()
+        token_id = self._create_oauth2_token()
+        self.response = self._validate_token(token_id)
+        self._assert_all()
+
+        role = self._create_role(self.new_fiware_role_ref(self.application_id))
+        self._add_role_to_user(role_id=role['id'],
+                               user_id=self.test_user['id'],
+                               organization_id=self.user_organization['id'],
+                               application_id=self.application_id)
+        self.user_roles.append(role)
+        self.response = self._validate_token(token_id)
+        self._assert_all()
+
+    def test_validate_token_revoked(self):
+        self.number_of_user_roles = 1
+        self._create_all()
+        token_id = self._create_oauth2_token()
+        self.response = self._validate_token(token_id)
+
+        self.oauth2_api.revoke_access_token(token_id)
+        self._validate_token(token_id, expected_status=404)
+
+    def test_validate_token_expired(self):
+        self.number_of_user_roles = 1
+        self._create_all()
+        token_id = self._create_oauth2_token()
+        self.response = self._validate_token(token_id)
+
+        # the cached response must not outlive the token
+        timeutils.set_time_override(
+            timeutils.utcnow() + datetime.timedelta(hours=2))
+        self.addCleanup(timeutils.clear_time_override)
+        self._validate_token(token_id, expected_status=404)
+
     def test_authorized_organizations(self):
         self.number_of_organizations = 2
         self.number_of_user_roles = 2
@@ -1481,6 +1668,82 @@ class FiwareApiTests(RolesBaseTests):
         expected_orgs = (self.number_of_organizations)
         self.assertEqual(expected_orgs, len(response_organizations))
 
+class CascadeDeleteTests(RolesBaseTests):
+
+    def setUp(self):
+        super(CascadeDeleteTests, self).setUp()
+        self.test_user, self.test_organization = self._create_user()
+        self.application = uuid.uuid4().hex
+        self.role = self._create_application_role(self.application)
+
+        # an unrelated application that must survive every deletion
+        self.other_application = uuid.uuid4().hex
+        self.other_role = self._create_application_role(
+            self.other_application)
+
+    def _create_application_role(self, application):
+        role = self._create_role(self.new_fiware_role_ref(
+            uuid.uuid4().hex, application=application))
+        permission = self._create_permission(self.new_fiware_permission_ref(
+            uuid.uuid4().hex, application=application))
+        self._add_permission_to_role(role['id'], permission['id'])
+        self._add_role_to_user(role_id=role['id'],
+                               user_id=self.test_user['id'],
+                               organization_id=self.test_organization['id'],
+                               application_id=application)
+        self._add_role_to_organization(role_id=role['id'],
+                                       organization_id=self.test_organization['id'],
+                                       application_id=application)
+        return role
+
+    def _delete_application(self, application_id):
+        self.manager.delete_application_resources(
+            'identity', 'consumer_oauth2', 'deleted',
+            {'resource_info': application_id})
+
+    def _assert_application_resources(self, application_id, expected):
+        driver = self.manager.driver
+        for resources in [
+                driver.list_roles(application_id=application_id),
+                driver.list_permissions(application_id=application_id),
+                driver.list_role_user_assignments(
+                    application_id=application_id),
+                driver.list_role_organization_assignments(
+                    application_id=application_id)]:
+            self.assertEqual(expected, len(resources))
+
+    def test_delete_application(self):
+        self._delete_application(self.application)
+        self._assert_application_resources(self.application, 0)
+        self._assert_application_resources(self.other_application, 1)
+        self.assertEqual(
+            1, len(self.manager.driver.list_permissions_for_role(
+                self.other_role['id'])))
+
+    def test_delete_user(self):
+        self.identity_api.delete_user(self.test_user['id'])
+        self.assertEqual([], self._list_role_user_assignments(
+            filters={'user_id': self.test_user['id']}))
+        self.assertEqual(2, len(self._list_role_organization_assignments(
+            filters={'organization_id': self.test_organization['id']})))
+
+    def test_delete_organization(self):
+        self.assignment_api.delete_project(self.test_organization['id'])
+        self.assertEqual([], self._list_role_user_assignments(
+            filters={'organization_id': self.test_organization['id']}))
+        self.assertEqual([], self._list_role_organization_assignments(
+            filters={'organization_id': self.test_organization['id']}))
+
+    def test_delete_application_in_background(self):
+        self.config_fixture.config(group='roles',
+                                   background_cascade_delete=True)
+        self._delete_application(self.application)
+        self.manager.cascade_worker.join()
+        self.assertEqual(0, self.manager.cascade_worker.pending)
+        self._assert_application_resources(self.application, 0)
+        self._assert_application_resources(self.other_application, 1)
+
+
 class ExtendedPermissionsConsumerCRUDTests(test_v3_oauth2.ConsumerCRUDTests):
     EXTENSION_NAME = 'roles'
     EXTENSION_TO_ADD = 'roles_extension'